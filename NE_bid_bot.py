@@ -1,9 +1,36 @@
 import random
 from cards import Cards
-from copy import deepcopy
-import treelib
+from array import array
+from concurrent.futures import FIRST_COMPLETED, wait
+import os
 import time
 
+try:
+    import treelib
+except ImportError:  # treelib is only needed to export trees for printing
+    treelib = None
+
+from card_core import (
+    CARD_INDEX,
+    NO_SUIT,
+    beating_mask,
+    beats,
+    cards_to_mask,
+    int_to_card,
+    legal_mask,
+    lowest_card,
+    suit_to_int,
+    trick_winner
+)
+from NE_solver import (
+    canonical_key,
+    collapse_equivalent,
+    equivalence_groups,
+    refine_mask,
+    root_trick_state,
+    solve
+)
+
 def valid_card_finder(hand, starting_suit, excluded_cards=None):
     """
     Find valid cards to play based on the starting suit and excluded cards.
@@ -18,18 +45,12 @@ def valid_card_finder(hand, starting_suit, excluded_cards=None):
     """
     if excluded_cards is None:
         excluded_cards = []
-    
+
     # Flatten the excluded_cards list
-    flat_excluded_cards = [card for sublist in excluded_cards for card in sublist]
-    
-    # Find valid cards of the starting suit
-    valid_cards = [card for card in hand if card[-1] == starting_suit and card not in flat_excluded_cards]
-    
-    # If no valid cards of the starting suit, allow any card
-    if not valid_cards:
-        valid_cards = [card for card in hand if card not in flat_excluded_cards]
-    
-    return valid_cards
+    excluded_mask = cards_to_mask(card for sublist in excluded_cards for card in sublist)
+
+    valid_mask = legal_mask(cards_to_mask(hand) & ~excluded_mask, suit_to_int(starting_suit))
+    return [card for card in hand if valid_mask >> CARD_INDEX[card] & 1]
 
 def pick_winner_of_hand(played_cards, trump):
     """
@@ -42,18 +63,7 @@ def pick_winner_of_hand(played_cards, trump):
     Returns:
     int: Index of the winning card in played_cards.
     """
-    current_winner = played_cards[0]
-    values = {"2":2, "3":3, "4":4, "5":5, "6":6, "7":7, "8":8, "9":9, "10":10, "J":11, "Q":12, "K":13, "A":14}
-
-    for card in played_cards[1:]:
-        # Compare cards of the same suit
-        if card[-1] == current_winner[-1] and values[card[:-1]] > values[current_winner[:-1]]:
-            current_winner = card
-        # Trump card beats non-trump
-        elif current_winner[-1] != trump and card[-1] == trump:
-            current_winner = card
-    
-    return played_cards.index(current_winner)
+    return trick_winner([CARD_INDEX[card] for card in played_cards], suit_to_int(trump))
 
 def refine_choices(played_cards, valid_cards, trump):
     """
@@ -67,92 +77,280 @@ def refine_choices(played_cards, valid_cards, trump):
     Returns:
     list: Refined list of cards to choose from.
     """
-    values = {"2":2, "3":3, "4":4, "5":5, "6":6, "7":7, "8":8, "9":9, "10":10, "J":11, "Q":12, "K":13, "A":14}
-    
     if not played_cards or len(valid_cards) == 1:
         return valid_cards
     else:
-        current_winner = played_cards[pick_winner_of_hand(played_cards, trump)]
-        
+        current_winner = CARD_INDEX[played_cards[pick_winner_of_hand(played_cards, trump)]]
+        valid_mask = cards_to_mask(valid_cards)
+
         # If we can't win, play the lowest card
-        if pick_winner_of_hand([current_winner] + valid_cards, trump) == 0:
-            card_values = [values[card[:-1]] for card in valid_cards]
-            min_value = card_values.index(min(card_values))
-            return [valid_cards[min_value]]
+        if not valid_mask & beating_mask(current_winner, suit_to_int(trump)):
+            return [int_to_card(lowest_card(valid_mask))]
         else:
             # We might win, so keep all options open
             return valid_cards
 
-def create_full_tree(max_depth, n_players, hands, trump, root_properties):
+class GameTree(object):
+    """
+    Compact game tree stored as a struct of arrays.
+
+    Node 0 is the root. The children of node i are the contiguous block of nodes
+    first_child[i] .. first_child[i] + child_count[i] - 1. Per-player vectors are
+    stored flat, so the score of player p at node i is score[i * n_players + p].
+    Cards are stored as card_core ints (-1 for the root).
+
+    Only one card of every group of equivalent cards is expanded (see
+    NE_solver.collapse_equivalent); root_equivalents maps each card expanded at
+    the root to the cards it stands for.
+
+    When the tree is built with memoization, a trick boundary that repeats an
+    earlier subgame is not expanded. Instead link[i] holds the index of the node
+    where that subgame was expanded (link[i] is -1 for every other node).
+    """
+
+    def __init__(self, n_players, capacity=1024, memoize=None):
+        """
+        Initialise an empty tree with room for capacity nodes.
+
+        Args:
+        n_players (int): Number of players in the game.
+        capacity (int): Number of nodes to preallocate.
+        memoize (str): How subgames were shared while building, see create_full_tree.
+        """
+        self.n_players = n_players
+        self.memoize = memoize
+        self.root_equivalents = {}
+        self.size = 0
+        self.capacity = 0
+        self.parent = array('i')
+        self.first_child = array('i')
+        self.child_count = array('i')
+        self.player = array('b')
+        self.card = array('b')
+        self.depth = array('b')
+        self.link = array('i')
+        self.score = array('h')
+        self.minmax_score = array('h')
+        # Nodes in the order their subtrees were completed, children before parents
+        self.postorder = array('i')
+        self._grow(capacity)
+
+    def _grow(self, extra):
+        for name in ('parent', 'first_child', 'child_count', 'player', 'card', 'depth'):
+            values = getattr(self, name)
+            values.extend(array(values.typecode, [0]) * extra)
+        self.link.extend(array('i', [-1]) * extra)
+        self.score.extend(array('h', [0]) * (extra * self.n_players))
+        self.minmax_score.extend(array('h', [0]) * (extra * self.n_players))
+        self.capacity += extra
+
+    def allocate(self, count):
+        """
+        Reserve a contiguous block of nodes, growing the arrays if needed.
+
+        Args:
+        count (int): Number of nodes to reserve.
+
+        Returns:
+        int: Index of the first reserved node.
+        """
+        if self.size + count > self.capacity:
+            self._grow(max(self.capacity, count))
+        first = self.size
+        self.size += count
+        return first
+
+    def children(self, node):
+        """
+        Args:
+        node (int): Index of a node.
+
+        Returns:
+        range: Indices of the children of the node.
+        """
+        first = self.first_child[node]
+        return range(first, first + self.child_count[node])
+
+    def card_name(self, node):
+        """
+        Args:
+        node (int): Index of a node.
+
+        Returns:
+        str: The card played to reach the node ('Root' for the root).
+        """
+        return 'Root' if self.card[node] < 0 else int_to_card(self.card[node])
+
+    def get_score(self, node):
+        """
+        Args:
+        node (int): Index of a node.
+
+        Returns:
+        list: Tricks won by each player at the node.
+        """
+        n = self.n_players
+        return list(self.score[node * n:(node + 1) * n])
+
+    def get_minmax_score(self, node):
+        """
+        Args:
+        node (int): Index of a node.
+
+        Returns:
+        list: The backed up minmax score vector of the node.
+        """
+        n = self.n_players
+        return list(self.minmax_score[node * n:(node + 1) * n])
+
+    def set_minmax_score(self, node, source):
+        """
+        Copy the minmax score vector of one node onto another.
+
+        Args:
+        node (int): Index of the node to update.
+        source (int): Index of the node to copy from.
+        """
+        n = self.n_players
+        self.minmax_score[node * n:(node + 1) * n] = self.minmax_score[source * n:(source + 1) * n]
+
+    def to_treelib(self):
+        """
+        Export the tree as a treelib.Tree, mainly so it can be printed.
+
+        Returns:
+        treelib.Tree: A copy of the tree with one treelib node per node.
+        """
+        if treelib is None:
+            raise ImportError("treelib is required to export a GameTree")
+        tree = treelib.Tree()
+        for node in range(self.size):
+            data = {
+                'player_id': self.player[node],
+                'depth': self.depth[node],
+                'score': self.get_score(node),
+                'minmax_score': self.get_minmax_score(node),
+                'link': self.link[node]
+            }
+            parent = self.parent[node] if node else None
+            tree.create_node(self.card_name(node), node, parent=parent, data=data)
+        return tree
+
+def create_full_tree(max_depth, n_players, hands, trump, root_properties, memoize=None):
     """
     Create a full game tree for the current game state.
 
+    The play from a trick boundary onwards only depends on the remaining hands
+    and the player on lead, up to relabelling suits and ranks (see
+    NE_solver.canonical_key), so with memoize='bids' a repeated subgame is linked
+    to its first expansion rather than expanded again. find_nash_scores scores
+    leaves non-linearly, so memoize='scores' also requires the tricks won so far
+    to match before linking.
+
     Args:
     max_depth (int): Maximum depth of the tree.
     n_players (int): Number of players in the game.
     hands (Cards): Current hands of all players.
     trump (str): The trump suit.
     root_properties (dict): Properties of the root node.
+    memoize (str): None, 'bids' or 'scores'.
 
     Returns:
-    treelib.Tree: The full game tree.
+    GameTree: The full game tree.
     """
-    player_ids = list(range(n_players))
-    
-    def build_tree(tree, parent_id, current_depth):
-        if current_depth >= max_depth:
+    if memoize not in (None, 'bids', 'scores'):
+        raise ValueError("memoize must be None, 'bids' or 'scores', not {!r}".format(memoize))
+    tree = GameTree(n_players, memoize=memoize)
+    memo = {}
+    trump = suit_to_int(trump)
+    # State of the game along the path currently being expanded, cards are
+    # removed from the hands as they are played and put back afterwards
+    played_mask = cards_to_mask(card for trick in root_properties['cards_played'] for card in trick)
+    hand_masks = [mask & ~played_mask for mask in hands.hand_masks()]
+    score = list(root_properties['score'])
+
+    def build_tree(node, depth, player_id, trick_size, starting_suit, winning_card, winning_player, table):
+        if depth >= max_depth:
+            tree.postorder.append(node)
             return
-        
-        node = tree.get_node(parent_id)
-        
-        # Determine the next player
-        player_id = (node.data["player_id"] + 1) % n_players if node.data["trick_end"] == 0 else node.data["previous_trick_winner"]
-        
-        hand = hands.hands[player_ids[player_id]]
-
-        possible_children = valid_card_finder(hand, node.data['starting_suit'], excluded_cards=node.data["cards_played"])
-        refined_possible_children = refine_choices(node.data["cards_played_in_trick"], possible_children, trump)
-
-        for child_value in refined_possible_children:
-            child_properties = deepcopy(node.data)
-            child_properties.update({
-                'name': child_value,
-                'player_id': player_id,
-                'depth': node.data['depth'] + 1
-            })
-
-            child_identifer = node.identifier + child_value
-
-            # Handle new trick
-            if child_properties['trick_end'] == 1:
-                child_properties.update({
-                    'starting_suit': child_value[-1],
-                    'trick_end': 0,
-                    'cards_played_in_trick': []
-                })
-            
-            child_properties['cards_played_in_trick'].append(child_value)
+
+        # The previous trick is over once it holds a card from every player
+        if trick_size == n_players:
+            trick_size = 0
+            starting_suit = NO_SUIT
+            table = 0
+
+            if memoize is not None:
+                key = canonical_key(hand_masks, trump, player_id)
+                if memoize == 'scores':
+                    key += tuple(score)
+                if key in memo:
+                    tree.link[node] = memo[key]
+                    tree.postorder.append(node)
+                    return
+                memo[key] = node
+
+        hand = hand_masks[player_id]
+        choices = refine_mask(hand, starting_suit, winning_card, trump, hand_masks, table)
+        # Only expand one card of every group of equivalent cards
+        held = 0
+        for other in hand_masks:
+            held |= other
+        if node == 0:
+            tree.root_equivalents = equivalence_groups(choices, (held ^ hand) | table)
+        choices = collapse_equivalent(choices, (held ^ hand) | table)
+        count = bin(choices).count('1')
+
+        first = tree.allocate(count)
+        tree.first_child[node] = first
+        tree.child_count[node] = count
+
+        child = first
+        while choices:
+            bit = choices & -choices
+            choices ^= bit
+            card = bit.bit_length() - 1
+
+            if trick_size == 0:
+                child_suit, child_winning_card, child_winner = card // 13, card, player_id
+            elif beats(card, winning_card, trump):
+                child_suit, child_winning_card, child_winner = starting_suit, card, player_id
+            else:
+                child_suit, child_winning_card, child_winner = starting_suit, winning_card, winning_player
 
             # Handle end of trick
-            if len(child_properties['cards_played_in_trick']) == n_players:
-                child_properties['trick_end'] = 1
-                child_properties['cards_played'].append(child_properties['cards_played_in_trick'])
-
-                # Determine trick winner and update scores
-                winning_position = pick_winner_of_hand(child_properties['cards_played_in_trick'], trump)
-                winning_player = (child_properties['player_id'] + winning_position + 1) % n_players
-                child_properties['score'][winning_player] += 1
-                child_properties['previous_trick_winner'] = winning_player
-
-            if child_properties['depth'] == max_depth:
-                child_properties['minmax_score'] = deepcopy(child_properties['score'])
-            
-            tree.create_node(child_properties['name'], child_identifer, parent=node.identifier, data=child_properties)
-            build_tree(tree, child_identifer, current_depth + 1)
+            trick_over = trick_size + 1 == n_players
+            if trick_over:
+                next_player = child_winner
+                score[child_winner] += 1
+            else:
+                next_player = (player_id + 1) % n_players
+
+            tree.parent[child] = node
+            tree.player[child] = player_id
+            tree.card[child] = card
+            tree.depth[child] = depth + 1
+            tree.score[child * n_players:(child + 1) * n_players] = array('h', score)
+
+            hand_masks[player_id] = hand ^ bit
+            build_tree(child, depth + 1, next_player, trick_size + 1,
+                       child_suit, child_winning_card, child_winner, table | bit)
+            hand_masks[player_id] = hand
+
+            if trick_over:
+                score[child_winner] -= 1
+            child += 1
+
+        tree.postorder.append(node)
 
-    tree = treelib.Tree()
-    tree.create_node("Root", "root", data=root_properties)
-    build_tree(tree, "root", root_properties['depth'])
+    root = tree.allocate(1)
+    tree.parent[root] = -1
+    tree.player[root] = root_properties['player_id']
+    tree.card[root] = -1
+    tree.depth[root] = root_properties['depth']
+    tree.score[0:n_players] = array('h', score)
+
+    build_tree(root, root_properties['depth'], *root_trick_state(root_properties, n_players, trump))
     return tree
 
 def print_tree(tree):
@@ -160,9 +358,9 @@ def print_tree(tree):
     Print the tree structure.
 
     Args:
-    tree (treelib.Tree): The tree to be printed.
+    tree (GameTree): The tree to be printed.
     """
-    output = tree.show(stdout=False)
+    output = tree.to_treelib().show(stdout=False)
     print(output.decode('utf-8') if isinstance(output, bytes) else output)
 
 def find_nash_bids(tree):
@@ -170,39 +368,74 @@ def find_nash_bids(tree):
     Find Nash equilibrium bids in the game tree.
 
     Args:
-    tree (treelib.Tree): The game tree.
+    tree (GameTree): The game tree.
 
     Returns:
-    treelib.Tree: The tree with Nash equilibrium bids.
-    """
-    max_depth = max(node.data["depth"] for node in tree.all_nodes())
-    
-    # Process nodes from bottom to top
-    for depth in range(max_depth, -1, -1):
-        nodes_at_depth = [node for node in tree.all_nodes() if node.data["depth"] == depth]
-        
-        for node in nodes_at_depth:
-            parent = tree.parent(node.identifier)
-            if parent is None:
-                continue
-            
-            siblings = tree.children(parent.identifier)
-            
-            if len(siblings) == 1:
-                parent.data["minmax_score"] = node.data["minmax_score"]
-            else:
-                player_id = siblings[0].data["player_id"]
-                best_value = max(sibling.data["minmax_score"][player_id] for sibling in siblings)
-                
-                # Find all children with the best value
-                best_children = [sibling for sibling in siblings 
-                                 if sibling.data["minmax_score"][player_id] == best_value]
-                
-                # Randomly choose among best children
-                chosen_child = random.choice(best_children)
-                parent.data["minmax_score"] = chosen_child.data["minmax_score"]
+    GameTree: The tree with Nash equilibrium bids.
+    """
+    n_players = tree.n_players
+    minmax_score = tree.minmax_score
+    score = tree.score
+
+    # Children always come before their parent in postorder, so every sibling set
+    # is evaluated exactly once
+    for node in tree.postorder:
+        count = tree.child_count[node]
+        link = tree.link[node]
+        if link >= 0:
+            # The tricks still to come are those of the linked subgame
+            for p in range(n_players):
+                minmax_score[node * n_players + p] = (minmax_score[link * n_players + p]
+                                                      - score[link * n_players + p]
+                                                      + score[node * n_players + p])
+        elif count == 0:
+            tree.minmax_score[node * n_players:(node + 1) * n_players] = \
+                tree.score[node * n_players:(node + 1) * n_players]
+        elif count == 1:
+            tree.set_minmax_score(node, tree.first_child[node])
+        else:
+            siblings = tree.children(node)
+            player_id = tree.player[siblings[0]]
+            values = [tree.minmax_score[sibling * n_players + player_id] for sibling in siblings]
+            best_value = max(values)
+
+            # Find all children with the best value
+            best_children = [sibling for sibling, value in zip(siblings, values)
+                             if value == best_value]
+
+            # Randomly choose among best children
+            chosen_child = random.choice(best_children)
+            tree.set_minmax_score(node, chosen_child)
     return tree
 
+def solve_nash_bids(max_depth, n_players, hands, trump, root_properties, mode='exact',
+                    perspective=None, stats=None, cache=None):
+    """
+    Find the Nash equilibrium trick counts without building a game tree.
+
+    Gives the same result as backing up create_full_tree(..., memoize='bids')
+    with find_nash_bids under the same random seed, see NE_solver.solve.
+
+    Args:
+    max_depth (int): Maximum depth of the game.
+    n_players (int): Number of players in the game.
+    hands (Cards): Current hands of all players.
+    trump (str): The trump suit.
+    root_properties (dict): Properties of the root node.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    perspective (int): The player a paranoid search plays for.
+    stats (dict): Counters the number of positions searched is added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, or None.
+
+    Returns:
+    list: The Nash equilibrium number of tricks won by each player.
+    """
+    played_mask = cards_to_mask(card for trick in root_properties['cards_played'] for card in trick)
+    hand_masks = [mask & ~played_mask for mask in hands.hand_masks()]
+    minmax_score, _ = solve(max_depth, n_players, hand_masks, suit_to_int(trump), root_properties,
+                            mode=mode, perspective=perspective, stats=stats, cache=cache)
+    return minmax_score
+
 def modify_list(input_list, p):
     """
     Modify a list of bids to introduce some randomness.
@@ -229,9 +462,321 @@ def modify_list(input_list, p):
                 result.append(item)
     return result
 
-def find_bid(player_hand, previous_bids, trump, player_id, root_properties, p=0.2, nreps=1000):
+def bid_likelihood(bids, tricks, p):
     """
-    Find the optimal bid for the current player.
+    Probability that a deal passes the bid consistency check, which compares
+    bids modified by modify_list with the tricks each player wins in the deal.
+
+    Args:
+    bids (list): Bids made by players, '' for those not checked.
+    tricks (list): Tricks each player wins in the deal.
+    p (float): Probability of modifying each bid, see modify_list.
+
+    Returns:
+    float: The probability that modify_list(bids, p) matches tricks for every
+    checked player.
+    """
+    likelihood = 1.0
+    for index, (bid, won) in enumerate(zip(bids, tricks)):
+        if bid == '':
+            continue
+        current_p = 2 * p if index == len(bids) - 1 else p
+        # Kept with probability 1 - p, moved one up or (at least to 0) one down with p / 2 each
+        likelihood *= ((1 - current_p) * (won == bid) + current_p / 2 * (won == bid + 1)
+                       + current_p / 2 * (won == max(0, bid - 1)))
+    return likelihood
+
+def merge_counts(dictionaries):
+    """
+    Add up dictionaries of counts (or scores) key by key.
+
+    Args:
+    dictionaries (iterable): Dictionaries mapping keys to numbers, or None.
+
+    Returns:
+    dict: A dictionary with the totals for every key, in order of first appearance.
+    """
+    totals = {}
+    for d in dictionaries:
+        if not d:
+            continue
+        for key, value in d.items():
+            totals[key] = totals.get(key, 0) + value
+    return totals
+
+def add_sample_stats(stats, solve_seconds, accepted):
+    """
+    Count one Monte Carlo sample in a dictionary of counters.
+
+    Args:
+    stats (dict): Counters to update, or None.
+    solve_seconds (float): Time spent solving the sample.
+    accepted (bool): Whether the sample was consistent with the bids.
+    """
+    if stats is None:
+        return
+    stats['samples'] = stats.get('samples', 0) + 1
+    stats['accepted'] = stats.get('accepted', 0) + accepted
+    stats['solve_seconds'] = stats.get('solve_seconds', 0) + solve_seconds
+
+def _run_seeded(seed, sample_function, args, nreps, deadline=None, strata=None):
+    # Run a chunk of samples on its own random stream, leaving the global stream as it was.
+    # Returns the result of the chunk and the counters of its searches.
+    state = random.getstate()
+    random.seed(seed)
+    stats = {}
+    # The strata of the chunk's samples, when they were allocated for all the chunks at once
+    settings = {} if strata is None else {'strata': strata}
+    try:
+        return sample_function(*args, nreps=nreps, stats=stats, deadline=deadline,
+                               **settings), stats
+    finally:
+        random.setstate(state)
+
+def leader_margin(results, strata=None):
+    """
+    Find how far the leading key of merged results is ahead of the runner-up,
+    treating every result as one independent observation of the difference
+    between them.
+
+    Args:
+    results (list): Dictionaries of counts or scores, e.g. one per sample or
+        one per chunk of samples. None counts as an empty dictionary.
+    strata (list): The stratum every result was drawn from, or None. The
+        variance is then measured within strata, as for stratified sampling
+        with proportional allocation.
+
+    Returns:
+    tuple: The lead of the leader over the runner-up in the merged results and
+    its standard error, None if there are fewer than two results.
+    """
+    results = [result or {} for result in results]
+    totals = merge_counts(results)
+    if len(results) < 2 or not totals:
+        return None
+    ranked = sorted(totals, key=totals.get, reverse=True)
+    leader = ranked[0]
+    runner_up = ranked[1] if len(ranked) > 1 else None
+
+    differences = [result.get(leader, 0) - result.get(runner_up, 0) for result in results]
+    n = len(differences)
+    groups = {}
+    for index, difference in enumerate(differences):
+        groups.setdefault(strata[index] if strata is not None else None, []).append(difference)
+    if n <= len(groups):
+        # Not enough samples to measure the spread within strata
+        groups = {None: differences}
+    squares = 0
+    for group in groups.values():
+        mean = sum(group) / len(group)
+        squares += sum((d - mean) ** 2 for d in group)
+    variance = squares / (n - len(groups))
+    return sum(differences), (n * variance) ** 0.5
+
+def stratified_splits(cards, hand_sizes, trump, nreps, voids=None, known_cards=None,
+                      shuffle=False, rng=random):
+    """
+    Spread samples over the strata of the number of trumps each player is
+    dealt, in proportion to the probability of every stratum.
+
+    Args:
+    cards (Cards): The cards to deal.
+    hand_sizes (list): Number of cards each player is dealt.
+    trump (str): The trump suit.
+    nreps (int): Number of samples.
+    voids (list): Suits each player may not be dealt, or None.
+    known_cards (list): Cards each player is known to hold, or None.
+    shuffle (bool): Put the samples in random order, so that the first ones
+        are still spread over the strata if sampling stops early, and every
+        chunk of them is spread over the strata too.
+    rng (random.Random): Random stream to round and shuffle with.
+
+    Returns:
+    list: The split of the trumps for every sample, see Cards.suit_splits.
+    """
+    splits, weights = cards.suit_splits(hand_sizes, trump, voids, known_cards)
+    total = sum(weights)
+    # Every stratum gets its expected number of samples, rounded up or down at random
+    position = rng.random()
+    cumulative = 0
+    allocation = []
+    for split, weight in zip(splits, weights):
+        cumulative += weight * nreps / total
+        while position < cumulative and len(allocation) < nreps:
+            allocation.append(split)
+            position += 1
+    if shuffle:
+        rng.shuffle(allocation)
+    return allocation
+
+# Stats about the answer as a whole, which can't be added up over chunks
+MARGIN_STATS = ('margin', 'standard_error')
+
+def add_margin_stats(stats, results, strata=None):
+    """
+    Record how clearly the leading bid or card is ahead of the runner-up.
+
+    Args:
+    stats (dict): Counters to set margin and standard_error in, or None. They are
+        removed when there is no runner-up to compare with.
+    results (list): Dictionaries of counts or scores, one per sample.
+    strata (list): The stratum every sample was drawn from, or None.
+    """
+    if stats is None:
+        return
+    margin = leader_margin(results, strata)
+    if margin is None:
+        for key in MARGIN_STATS:
+            stats.pop(key, None)
+    else:
+        stats['margin'], stats['standard_error'] = margin
+
+def leader_separated(chunk_results, separation=3.0, min_chunks=3):
+    """
+    Check whether the leading key of merged chunk results is clearly ahead of
+    the runner-up, treating every chunk as one independent observation of the
+    difference between them (batch means).
+
+    Args:
+    chunk_results (list): Dictionaries of counts or scores, one per chunk.
+    separation (float): Number of standard errors the lead has to exceed.
+    min_chunks (int): Minimum number of chunks before any decision is made.
+
+    Returns:
+    bool: True if the leader is separated from the runner-up.
+    """
+    if len(chunk_results) < min_chunks:
+        return False
+    margin = leader_margin(chunk_results)
+    if margin is None:
+        return False
+    lead, standard_error = margin
+    if standard_error == 0:
+        return lead > 0
+    return lead > separation * standard_error
+
+def _run_until_deadline(sample_function, args, seeds, sizes, chunk_strata, executor, deadline_s,
+                        separation):
+    # Run chunks until the time budget is spent or the leader is separated, at least one chunk
+    # always finishes. Chunks stop drawing samples at the deadline too, so the last ones
+    # end at most one sample late. Returns the (result, stats) pairs that finished, in
+    # chunk order.
+    start = time.monotonic()
+    deadline = start + deadline_s
+    results = {}
+
+    def finished_results():
+        return [results[chunk] for chunk in sorted(results)]
+
+    def separated():
+        return leader_separated([result for result, _ in finished_results()], separation)
+
+    if executor is None:
+        for chunk, (chunk_seed, size) in enumerate(zip(seeds, sizes)):
+            elapsed = time.monotonic() - start
+            # Don't start a chunk that is expected to end after the deadline
+            if chunk and elapsed + elapsed / chunk > deadline_s:
+                break
+            results[chunk] = _run_seeded(chunk_seed, sample_function, args, size, deadline,
+                                         chunk_strata[chunk])
+            if separated():
+                break
+        return finished_results()
+
+    max_in_flight = os.cpu_count() or 1
+    in_flight = {}
+    next_chunk = 0
+    while next_chunk < len(seeds) or in_flight:
+        while next_chunk < len(seeds) and len(in_flight) < max_in_flight and \
+                time.monotonic() - start < deadline_s:
+            future = executor.submit(_run_seeded, seeds[next_chunk], sample_function, args,
+                                     sizes[next_chunk], deadline, chunk_strata[next_chunk])
+            in_flight[future] = next_chunk
+            next_chunk += 1
+        if not in_flight:
+            break
+
+        remaining = deadline_s - (time.monotonic() - start)
+        timeout = max(remaining, 0) if results else None
+        finished, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not finished:
+            break
+        for future in finished:
+            results[in_flight.pop(future)] = future.result()
+        if separated():
+            break
+
+    # Chunks that have not started are dropped, running ones stop at their next sample unused
+    for future in in_flight:
+        future.cancel()
+    return finished_results()
+
+def run_sample_chunks(sample_function, args, nreps, executor=None, seed=None, chunk_size=25,
+                      deadline_s=None, separation=3.0, stats=None, strata=None):
+    """
+    Split Monte Carlo samples into chunks, run them (in parallel when an executor
+    is given) and merge the results.
+
+    Every chunk gets its own random seed drawn from seed, so for a given seed the
+    result does not depend on the executor or the number of workers. With a
+    deadline, nreps is only an upper bound: chunks stop being run once the time
+    is spent or the leading key is separated from the runner-up, and the result
+    is the best answer so far (which then also depends on timing). Chunks
+    running at the deadline stop after the sample they are drawing.
+
+    Args:
+    sample_function (function): Top level function taking *args, nreps, a
+        stats dictionary of counters and a deadline (a time.monotonic() value
+        after which no new sample is drawn, or None), returning a dictionary
+        of counts or scores.
+    args (tuple): Arguments for sample_function, must be picklable for a process pool.
+    nreps (int): Total number of Monte Carlo simulations.
+    executor (concurrent.futures.Executor): Executor to run chunks on, or None to run them here.
+    seed (int): Seed for the chunk streams, or None to draw one.
+    chunk_size (int): Number of simulations per chunk.
+    deadline_s (float): Time budget in seconds, or None to run every chunk.
+    separation (float): Number of standard errors the leader must be ahead by to stop early.
+    stats (dict): Counters the counters of every chunk are added to, or None.
+    strata (list): The stratum of every sample, allocated over all nreps at once
+        (see stratified_splits), or None. Every chunk is passed the strata of
+        its samples as strata.
+
+    Returns:
+    dict: The merged dictionary of all chunks.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    seed_stream = random.Random(seed)
+    seeds = []
+    sizes = []
+    chunk_strata = []
+    for start in range(0, nreps, chunk_size):
+        seeds.append(seed_stream.getrandbits(64))
+        sizes.append(min(chunk_size, nreps - start))
+        chunk_strata.append(None if strata is None else strata[start:start + chunk_size])
+
+    if deadline_s is not None:
+        chunks = _run_until_deadline(sample_function, args, seeds, sizes, chunk_strata, executor,
+                                     deadline_s, separation)
+    else:
+        map_function = map if executor is None else executor.map
+        chunks = list(map_function(_run_seeded, seeds, [sample_function] * len(seeds),
+                                   [args] * len(seeds), sizes, [None] * len(seeds),
+                                   chunk_strata))
+    if stats is not None:
+        # The margins of the chunks add up, their standard errors don't, so both
+        # come from the spread of the chunks' results instead (batch means)
+        stats.update(merge_counts([stats] + [
+            {key: value for key, value in chunk_stats.items() if key not in MARGIN_STATS}
+            for _, chunk_stats in chunks]))
+        add_margin_stats(stats, [result for result, _ in chunks])
+    return merge_counts(result for result, _ in chunks)
+
+def sample_bids(player_hand, previous_bids, trump, player_id, root_properties, p=0.2,
+                mode='exact', cache=None, stratify=False, nreps=1000, stats=None, deadline=None,
+                strata=None):
+    """
+    Run the Monte Carlo simulations behind find_bid.
 
     Args:
     player_hand (list): The player's hand.
@@ -240,43 +785,129 @@ def find_bid(player_hand, previous_bids, trump, player_id, root_properties, p=0.
     player_id (int): The current player's ID.
     root_properties (dict): Properties of the root node.
     p (float): Probability for bid modification.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    cache (dict): Results of earlier solves keyed by canonical position, or None.
+    stratify (bool): Spread the samples over the number of trumps each
+        opponent holds (see stratified_splits) rather than drawing them
+        independently.
     nreps (int): Number of Monte Carlo simulations.
+    stats (dict): Counters the number of samples drawn and accepted, solves,
+        positions searched and solve time are added to, or None. The lead of
+        the most common bid over the next one and its standard error are set
+        as margin and standard_error.
+    deadline (float): time.monotonic() value after which no new simulation
+        is started, the first one always is. None to run all of them.
+    strata (list): The split of the trumps for every simulation, see
+        stratified_splits, or None to allocate them here when stratify is set.
 
     Returns:
     dict: A dictionary of possible bids and their frequencies.
     """
     n_players = len(previous_bids)
     hand_size = len(player_hand)
+    player_position = sum([bid != '' for bid in previous_bids])
     outcomes_list = []
+    # The bid of every sample, none for rejected ones, for the standard error
+    sample_results = []
+
+    if strata is None and stratify and suit_to_int(trump) != NO_SUIT:
+        strata = stratified_splits(Cards(excluded_cards=player_hand), [hand_size] * (n_players - 1),
+                                   trump, nreps, shuffle=deadline is not None)
 
-    for _ in range(nreps):
+    for sample in range(nreps):
+        if sample and deadline is not None and time.monotonic() > deadline:
+            break
         # Simulate opponents' hands
         hands = Cards(excluded_cards=player_hand)
-        hands.shuffle()
-        hands.deal(n_players - 1, hand_size)
-
-        player_position = sum([bid != '' for bid in previous_bids])
+        if strata is None:
+            hands.shuffle()
+            hands.deal(n_players - 1, hand_size)
+        else:
+            hands.deal_constrained([hand_size] * (n_players - 1), suit=trump,
+                                   split=strata[sample])
         hands.hands.insert(player_id, player_hand)
 
-        # Create and analyze the game tree
-        tree = create_full_tree(n_players * hand_size, n_players, hands, trump, root_properties)
-        nash_tree = find_nash_bids(tree)
-        nash_outcome = nash_tree.get_node("root").data["minmax_score"]
+        # Solve the game
+        start = time.perf_counter()
+        nash_outcome = solve_nash_bids(n_players * hand_size, n_players, hands, trump,
+                                       root_properties, mode=mode, perspective=player_id,
+                                       stats=stats, cache=cache)
+        solve_seconds = time.perf_counter() - start
 
         # Compare with previous and modified bids
         comparison_bids = modify_list(previous_bids, p)
-        if all(a == b for a, b in zip(previous_bids, nash_outcome) if a != '') or \
-           all(a == b for a, b in zip(comparison_bids, nash_outcome) if a != ''):
+        accepted = all(a == b for a, b in zip(previous_bids, nash_outcome) if a != '') or \
+            all(a == b for a, b in zip(comparison_bids, nash_outcome) if a != '')
+        if accepted:
             outcomes_list.append(nash_outcome)
+        sample_results.append({nash_outcome[player_position]: 1} if accepted else {})
+        add_sample_stats(stats, solve_seconds, accepted)
 
     # Count bid frequencies
     player_elements = [sublist[player_position] for sublist in outcomes_list]
     element_count = {}
     for element in player_elements:
         element_count[element] = element_count.get(element, 0) + 1
-    
+
+    add_margin_stats(stats, sample_results, strata)
     return element_count
 
+def find_bid(player_hand, previous_bids, trump, player_id, root_properties, p=0.2, nreps=1000,
+             executor=None, seed=None, chunk_size=25, deadline_s=None, mode='exact', stats=None,
+             cache=None, stratify=False):
+    """
+    Find the optimal bid for the current player.
+
+    By default the simulations run one after the other on the global random
+    stream. Passing an executor (e.g. a concurrent.futures.ProcessPoolExecutor)
+    or a seed splits them into seeded chunks with run_sample_chunks, which makes
+    the result reproducible for a given seed whatever the number of workers.
+    Passing deadline_s samples in chunks until the time budget is spent or the
+    most common bid is clearly ahead, see run_sample_chunks.
+
+    Args:
+    player_hand (list): The player's hand.
+    previous_bids (list): Bids made by other players.
+    trump (str): The trump suit.
+    player_id (int): The current player's ID.
+    root_properties (dict): Properties of the root node.
+    p (float): Probability for bid modification.
+    nreps (int): Number of Monte Carlo simulations.
+    executor (concurrent.futures.Executor): Executor to run chunks of simulations on.
+    seed (int): Seed for the chunked simulations.
+    chunk_size (int): Number of simulations per chunk.
+    deadline_s (float): Time budget in seconds, nreps is then an upper bound.
+    mode (str): Search mode, see NE_solver.NashSolver. 'paranoid' plays for
+        the bidding player.
+    stats (dict): Counters the number of samples drawn and accepted, solves,
+        positions searched and solve time are added to, or None. The lead of
+        the most common bid over the next one and its standard error are set
+        as margin and standard_error.
+    cache (dict): Results of earlier solves keyed by canonical position, or
+        None. Deals that are equal up to relabelling are then solved once, so
+        they also share their tie-breaks. Process pool workers fill a copy.
+    stratify (bool): Spread the simulations over the number of trumps each
+        opponent holds instead of drawing them independently, which gives the
+        same expected frequencies with less noise, see stratified_splits.
+
+    Returns:
+    dict: A dictionary of possible bids and their frequencies.
+    """
+    args = (player_hand, previous_bids, trump, player_id, root_properties, p, mode, cache,
+            stratify)
+    if executor is None and seed is None and deadline_s is None:
+        return sample_bids(*args, nreps=nreps, stats=stats)
+    strata = None
+    if stratify and suit_to_int(trump) != NO_SUIT:
+        # Allocated over all the simulations once and split between the chunks
+        n_players = len(previous_bids)
+        strata = stratified_splits(Cards(excluded_cards=player_hand),
+                                   [len(player_hand)] * (n_players - 1), trump, nreps,
+                                   shuffle=True, rng=random if seed is None else random.Random(seed))
+    return run_sample_chunks(sample_bids, args, nreps, executor=executor, seed=seed,
+                             chunk_size=chunk_size, deadline_s=deadline_s, stats=stats,
+                             strata=strata)
+
 # Example usage (commented out)
 # player_hand = ['6D']
 # previous_bids = ['', '', '']
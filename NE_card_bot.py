@@ -1,13 +1,17 @@
 import random
 from cards import Cards
-from copy import deepcopy
+from array import array
 from NE_bid_bot import (
-    create_full_tree,
-    find_nash_bids,
+    add_margin_stats,
+    add_sample_stats,
     modify_list,
+    run_sample_chunks,
+    stratified_splits,
     valid_card_finder,
     refine_choices
 )
+from NE_solver import solve, solve_along_path, trim_tables
+from card_core import CARD_INDEX, NO_SUIT, cards_to_mask, int_to_card, suit_to_int
 import time
 
 
@@ -16,11 +20,11 @@ def find_nash_scores(tree, bids):
     Calculate Nash equilibrium scores for each node in the game tree.
 
     Args:
-    tree (treelib.Tree): The game tree.
+    tree (GameTree): The game tree.
     bids (list): List of bids made by players.
 
     Returns:
-    treelib.Tree: The tree with updated Nash equilibrium scores.
+    GameTree: The tree with updated Nash equilibrium scores.
     """
     def calculate_score_difference(scores, player_id):
         """
@@ -37,54 +41,48 @@ def find_nash_scores(tree, bids):
         return sum(player_score - score for i, score in enumerate(scores)
                    if i != player_id)
 
-    # Find the maximum depth in the tree
-    max_depth = max(node.data["depth"] for node in tree.all_nodes())
-
-    # Process nodes from bottom to top
-    for depth in range(max_depth, 0, -1):
-        # Find all nodes at the current depth
-        nodes_at_depth = [node for node in tree.all_nodes()
-                          if node.data["depth"] == depth]
-        
-        for node in nodes_at_depth:
-            if depth == max_depth:
-                # Calculate scores for leaf nodes
-                node.data["minmax_score"] = [
-                    10 + 2*b if p == b else -2*abs(b-p)
-                    for p, b in zip(node.data["minmax_score"], bids)
-                ]
-            
-            parent = tree.parent(node.identifier)
-            # Skip if node is root (has no parent)
-            if parent is None:
-                continue
-            
-            siblings = tree.children(parent.identifier)
-            if len(siblings) == 1:
-                # If the parent has only one child, copy the minmax value
-                parent.data["minmax_score"] = node.data["minmax_score"]
-            else:
-                # If there are multiple children, compare their minmax values
-                player_id = siblings[0].data["player_id"]
-                
-                # Calculate the score difference for each sibling
-                score_differences = [
-                    calculate_score_difference(sibling.data["minmax_score"], player_id)
-                    for sibling in siblings
-                ]
-                
-                # Find the maximum score difference
-                max_difference = max(score_differences)
-                
-                # Find all children with the maximum score difference
-                best_children = [
-                    sibling for sibling, diff in zip(siblings, score_differences)
-                    if diff == max_difference
-                ]
-                
-                # If there's more than one best child, choose randomly
-                chosen_child = random.choice(best_children)
-                parent.data["minmax_score"] = chosen_child.data["minmax_score"]
+    if tree.memoize == 'bids':
+        raise ValueError("find_nash_scores needs a tree built with memoize=None or 'scores'")
+    n_players = tree.n_players
+
+    # Process nodes from bottom to top, children always come before their parent
+    for node in tree.postorder:
+        count = tree.child_count[node]
+        if tree.link[node] >= 0:
+            # Linked subgames have the same tricks won so far, so the same scores
+            tree.set_minmax_score(node, tree.link[node])
+        elif count == 0:
+            # Calculate scores for leaf nodes
+            tree.minmax_score[node * n_players:(node + 1) * n_players] = array('h', [
+                10 + 2*b if p == b else -2*abs(b-p)
+                for p, b in zip(tree.get_score(node), bids)
+            ])
+        elif count == 1:
+            # If the node has only one child, copy the minmax value
+            tree.set_minmax_score(node, tree.first_child[node])
+        else:
+            # If there are multiple children, compare their minmax values
+            siblings = tree.children(node)
+            player_id = tree.player[siblings[0]]
+
+            # Calculate the score difference for each sibling
+            score_differences = [
+                calculate_score_difference(tree.get_minmax_score(sibling), player_id)
+                for sibling in siblings
+            ]
+
+            # Find the maximum score difference
+            max_difference = max(score_differences)
+
+            # Find all children with the maximum score difference
+            best_children = [
+                sibling for sibling, diff in zip(siblings, score_differences)
+                if diff == max_difference
+            ]
+
+            # If there's more than one best child, choose randomly
+            chosen_child = random.choice(best_children)
+            tree.set_minmax_score(node, chosen_child)
 
     return tree
 
@@ -94,22 +92,56 @@ def get_root_action_scores(tree):
     Extract scores for each action from the root node of the tree.
 
     Args:
-    tree (treelib.Tree): The game tree.
+    tree (GameTree): The game tree.
 
     Returns:
     dict: A dictionary mapping actions to their scores.
     """
-    root = tree.root
-    children = tree.children(root)
-    return {node.tag: node.data['minmax_score'] for node in children}
+    action_scores = {}
+    for node in tree.children(0):
+        # Every card equivalent to the one expanded gets the same score
+        for card in tree.root_equivalents.get(tree.card[node], [tree.card[node]]):
+            action_scores[int_to_card(card)] = tree.get_minmax_score(node)
+    return action_scores
 
 
-def find_best_action(dictionaries):
+def solve_nash_scores(max_depth, n_players, hands, trump, root_properties, bids, mode='exact',
+                      stats=None, cache=None):
+    """
+    Find the Nash equilibrium scores of each action without building a game tree.
+
+    Gives the same result as get_root_action_scores on find_nash_scores of
+    create_full_tree(..., memoize='scores') under the same random seed, see
+    NE_solver.solve.
+
+    Args:
+    max_depth (int): Maximum depth of the game.
+    n_players (int): Number of players in the game.
+    hands (Cards): Current hands of all players.
+    trump (str): The trump suit.
+    root_properties (dict): Properties of the root node.
+    bids (list): List of bids made by players.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    stats (dict): Counters the number of positions searched is added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, or None.
+
+    Returns:
+    dict: A dictionary mapping actions to their scores.
+    """
+    played_mask = cards_to_mask(card for trick in root_properties['cards_played'] for card in trick)
+    hand_masks = [mask & ~played_mask for mask in hands.hand_masks()]
+    _, action_scores = solve(max_depth, n_players, hand_masks, suit_to_int(trump),
+                             root_properties, bids=bids, mode=mode, stats=stats, cache=cache)
+    return {int_to_card(card): minmax_score for card, minmax_score in action_scores.items()}
+
+
+def find_best_action(dictionaries, weights=None):
     """
     Find the best action based on accumulated scores.
 
     Args:
     dictionaries (list): List of dictionaries containing action scores.
+    weights (list): Weight of each dictionary, or None to count them all once.
 
     Returns:
     dict: A dictionary of actions and their total scores.
@@ -132,9 +164,11 @@ def find_best_action(dictionaries):
     all_scores = {}
 
     # Accumulate scores for each action across all dictionaries
-    for d in dictionaries:
+    if weights is None:
+        weights = [1] * len(dictionaries)
+    for d, weight in zip(dictionaries, weights):
         for key, values in d.items():
-            score = calculate_score(values)
+            score = weight * calculate_score(values)
             if key not in all_scores:
                 all_scores[key] = score
             else:
@@ -146,38 +180,65 @@ def find_best_action(dictionaries):
     return all_scores
 
 
-def find_best_action_overall(player_hand, trump, bidtree_root_properties,
-                             history, my_bot, bots, p=0.2, nreps=1000):
+def suit_voids(history, bot_ids):
     """
-    Find the best action considering all possible scenarios.
+    Find the suits each bot is known to be out of, because they did not follow
+    the suit led in some trick.
+
+    Args:
+    history (list): History of played cards.
+    bot_ids (list): Unique ids of the bots to check.
+
+    Returns:
+    list: A tuple of suits for each bot in bot_ids.
+    """
+    voids = {bot_id: set() for bot_id in bot_ids}
+    for trick in history:
+        cards = list(trick.values())
+        if not cards:
+            continue
+        starting_suit = cards[0][-1]
+        for bot_id, card in trick.items():
+            if bot_id in voids and card[-1] != starting_suit:
+                voids[bot_id].add(starting_suit)
+    return [tuple(sorted(voids[bot_id])) for bot_id in bot_ids]
+
+
+def deal_setup(player_hand, history, my_bot, bots):
+    """
+    Work out what the cards played so far tell about the deal of the round.
 
     Args:
     player_hand (list): The player's current hand.
-    trump (str): The trump suit.
-    bidtree_root_properties (dict): Properties of the bidding tree root.
     history (list): History of played cards.
     my_bot (dict): Information about the current bot.
     bots (list): List of all bots in the game.
-    p (float): Probability for bid modification.
-    nreps (int): Number of Monte Carlo simulations.
 
     Returns:
-    dict: A dictionary of actions and their scores.
+    dict: With
+        our_hand (list): The player's cards at the start of the round.
+        hand_size (int): Number of cards dealt to each player.
+        player_id (int): The player's seat, in order of starting position.
+        other_bots (list): Unique ids of the other bots, in order of starting position.
+        known_cards (list): Cards each other bot has played.
+        voids (list): Suits each other bot has shown out of, see suit_voids.
+        unseen (Cards): The cards the player has not seen.
+        unseen_sizes (list): Number of unseen cards each other bot holds.
+        rotation (int): Seat of the first leader of the round.
+        round_bids (list): Bids in order of the round.
+        path (list): Cards played so far, as ints.
     """
-    n_players = len(bots)
-    cards_played = [list(d.values()) for d in history]
-    cards_played_list = [card for cards in cards_played for card in cards]
+    cards_played_list = [card for trick in history for card in trick.values()]
 
     # Extract relevant information from bots
-    score = [bot['hands_won'] for bot in bots]
     bot_bids = [bot['aim_hands_won'] for bot in bots]
     starting_position = [bot['start_pos'] for bot in bots]
     starting_bot_id = [bot['bot_unique_id'] for bot in bots]
 
     # Sort bots information based on starting position
-    zipped = list(zip(starting_position, bot_bids, starting_bot_id, score))
+    zipped = list(zip(starting_position, bot_bids, starting_bot_id))
     sorted_zip = sorted(zipped)
-    _, sorted_bot_bids, sorted_starting_bot_id, sorted_score = zip(*sorted_zip)
+    _, sorted_bot_bids, sorted_starting_bot_id = zip(*sorted_zip)
 
     my_bot_id = my_bot["bot_unique_id"]
     other_bots = list(sorted_starting_bot_id)
@@ -188,86 +249,241 @@ def find_best_action_overall(player_hand, trump, bidtree_root_properties,
     refined_partial_hands = [[item for item in sublist if item is not None]
                              for sublist in partial_hands]
 
-    outcomes_list = []
+    # Cards still to be dealt to opponents, who may not get suits they have shown out of
+    our_hand = player_hand + [d.get(my_bot_id) for d in history
+                              if d.get(my_bot_id) is not None]
+    hand_size = len(our_hand)
+
+    # The game is solved from the start of the round so the bid check and the
+    # card choice share one search. Seats are rotated from the order of the
+    # current trick to the order of the round, whose first leader is the first
+    # player in the history.
+    leader = next(iter(history[0]), my_bot_id) if history else my_bot_id
+    rotation = sorted_starting_bot_id.index(leader)
+    return {
+        'our_hand': our_hand,
+        'hand_size': hand_size,
+        'player_id': my_bot["start_pos"],
+        'other_bots': other_bots,
+        'known_cards': refined_partial_hands,
+        'voids': suit_voids(history, other_bots),
+        'unseen': Cards(excluded_cards=cards_played_list + player_hand),
+        'unseen_sizes': [hand_size - len(partial) for partial in refined_partial_hands],
+        'rotation': rotation,
+        'round_bids': list(sorted_bot_bids[rotation:] + sorted_bot_bids[:rotation]),
+        'path': [CARD_INDEX[card] for card in cards_played_list]
+    }
+
+
+def deal_hands(setup, suit=None, split=None):
+    """
+    Deal the unseen cards to the other bots, consistent with the cards they
+    have played and the suits they have shown out of.
 
-    for _ in range(nreps):
-        # Deal cards to all opponents
-        hands = Cards(excluded_cards=cards_played_list + player_hand)
-        hands.shuffle()
-        hands.deal(n_players - 1,
-                   len(player_hand) + len(cards_played_list) // n_players)
-        complete_hands = [a + b for a, b in zip(refined_partial_hands, hands.hands)]
+    Args:
+    setup (dict): What is known of the deal, see deal_setup.
+    suit (str): A suit whose split between the players is given, or None.
+    split (tuple): The split of suit, see Cards.suit_splits.
 
-        # Create our player's cards
-        our_hand = player_hand + [d.get(my_bot_id) for d in history
-                                  if d.get(my_bot_id) is not None]
+    Returns:
+    list: The hands of the round of every player, in order of starting position.
+    """
+    unseen = setup['unseen']
+    unseen.deal_constrained(setup['unseen_sizes'], setup['voids'],
+                            known_cards=setup['known_cards'], suit=suit, split=split)
+    complete_hands = unseen.hands
+    complete_hands.insert(setup['player_id'], setup['our_hand'])
+    return complete_hands
 
-        hand_size = len(our_hand)
-        trimmed_complete_hands = Cards()
-        trimmed_complete_hands.hands = [hand[:hand_size] for hand in complete_hands]
 
-        player_id = my_bot["start_pos"]
-        trimmed_complete_hands.hands.insert(player_id, our_hand)
+def solve_deal(hand_masks, trump, bidtree_root_properties, setup, mode='exact', stats=None,
+               cache=None, tables=None):
+    """
+    Solve a deal of the round, following the cards played so far.
 
-        # Check if randomly generated hands are likely to have generated the bids
-        tree = create_full_tree(n_players * hand_size, n_players,
-                                trimmed_complete_hands, trump,
-                                bidtree_root_properties)
-        nash_tree_ofbids = find_nash_bids(tree)
-        nash_outcome = nash_tree_ofbids.get_node("root").data["minmax_score"]
+    Args:
+    hand_masks (list): Bitmask of the hand of the round of every player, in
+        order of starting position.
+    trump (str): The trump suit.
+    bidtree_root_properties (dict): Properties of the bidding tree root.
+    setup (dict): What is known of the deal, see deal_setup.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    stats (dict): Counters the number of solves and positions searched are added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, or None.
+    tables (dict): Memo tables shared by the searches of this round, or None.
+
+    Returns:
+    tuple: The tricks each player wins in the order of the round, and a dict
+    mapping each card the player may play to the minmax scores after it, in
+    order of starting position.
+    """
+    n_players = len(hand_masks)
+    rotation = setup['rotation']
+    round_masks = hand_masks[rotation:] + hand_masks[:rotation]
+    nash_outcome, action_scores = solve_along_path(
+        n_players * setup['hand_size'], n_players, round_masks, suit_to_int(trump),
+        bidtree_root_properties, setup['path'], setup['round_bids'], mode=mode, stats=stats,
+        cache=cache, tables=tables)
+    return nash_outcome, {
+        int_to_card(card): [value[(seat - rotation) % n_players] for seat in range(n_players)]
+        for card, value in action_scores.items()
+    }
+
+
+def sample_actions(player_hand, trump, bidtree_root_properties,
+                   history, my_bot, bots, p=0.2, mode='exact', cache=None, tables=None,
+                   stratify=False, nreps=1000, stats=None, deadline=None, strata=None):
+    """
+    Run the Monte Carlo simulations behind find_best_action_overall.
+
+    Args:
+    player_hand (list): The player's current hand.
+    trump (str): The trump suit.
+    bidtree_root_properties (dict): Properties of the bidding tree root.
+    history (list): History of played cards.
+    my_bot (dict): Information about the current bot.
+    bots (list): List of all bots in the game.
+    p (float): Probability for bid modification.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    cache (dict): Results of earlier solves keyed by canonical position, or None.
+    tables (dict): Memo tables shared by the searches of this round, see
+        NE_solver.NashSolver, or None.
+    stratify (bool): Spread the samples over the number of trumps each
+        opponent holds, see NE_bid_bot.stratified_splits.
+    nreps (int): Number of Monte Carlo simulations.
+    stats (dict): Counters the number of samples drawn and accepted, solves,
+        positions searched and solve time are added to, or None. The lead of
+        the best card over the next one and its standard error are set as
+        margin and standard_error.
+    deadline (float): time.monotonic() value after which no new simulation
+        is started, the first one always is. None to run all of them.
+    strata (list): The split of the trumps for every simulation, see
+        NE_bid_bot.stratified_splits, or None to allocate them here when
+        stratify is set.
 
-        comparison_bids = modify_list(list(sorted_bot_bids), p)
+    Returns:
+    dict: A dictionary of actions and their scores.
+    """
+    setup = deal_setup(player_hand, history, my_bot, bots)
+    round_bids = setup['round_bids']
+    outcomes_list = []
+    # The scores of every sample, none for rejected ones, for the standard error
+    sample_results = []
+
+    if strata is None and stratify and suit_to_int(trump) != NO_SUIT:
+        strata = stratified_splits(setup['unseen'], setup['unseen_sizes'], trump, nreps,
+                                   setup['voids'], setup['known_cards'],
+                                   shuffle=deadline is not None)
+
+    for sample in range(nreps):
+        if sample and deadline is not None and time.monotonic() > deadline:
+            break
+        # Deal cards to all opponents, consistent with the suits they have shown out of
+        if strata is None:
+            complete_hands = deal_hands(setup)
+        else:
+            complete_hands = deal_hands(setup, trump, strata[sample])
+
+        # Solve the round, following the cards played so far
+        trim_tables(tables)
+        start = time.perf_counter()
+        nash_outcome, action_scores = solve_deal(
+            [cards_to_mask(hand) for hand in complete_hands], trump, bidtree_root_properties,
+            setup, mode=mode, stats=stats, cache=cache, tables=tables)
+        solve_seconds = time.perf_counter() - start
+
+        comparison_bids = modify_list(round_bids, p)
+        # Check if randomly generated hands are likely to have generated the bids
         # Only check modified bids as unmodified bids always sum to hand size
-        if all(a == b for a, b in zip(comparison_bids, nash_outcome) if a != ''):
-            
-            trick_end = 1 if len(cards_played[-1]) == n_players else 0
+        accepted = all(a == b for a, b in zip(comparison_bids, nash_outcome) if a != '')
+        add_sample_stats(stats, solve_seconds, accepted)
+        if accepted:
+            # Report scores in the order of the current trick
+            outcomes_list.append(action_scores)
+        sample_results.append((find_best_action([action_scores]) or {}) if accepted else {})
 
-            cards_played_path = ''.join(item for sublist in cards_played
-                                        for item in sublist)
+    add_margin_stats(stats, sample_results, strata)
+    return find_best_action(outcomes_list) or {}
 
-            depth = len(cards_played_list)
-            if depth == 0:
-                previous_winner = ''
-                starting_suit = ''
-            else:
-                if history[-1] == {}:
-                    previous_winner = my_bot_id
-                    starting_suit = ''
-                else:
-                    previous_winner = list(history[-1].keys())[0]
-                    starting_suit = cards_played[-1][0][-1]
-
-            # Set up root properties for the card tree
-            cardtree_root_properties = {
-                'name': 'root' + cards_played_path,
-                'score': list(sorted_score),
-                'trick_end': trick_end,
-                'player_id': (player_id - 1) % n_players,
-                'starting_suit': starting_suit,
-                'depth': depth,
-                'cards_played_in_trick': cards_played[-1],
-                'previous_trick_winner': previous_winner,
-                'cards_played': cards_played,
-                'minmax_score': []
-            }
-
-            # Calculate remaining cards for each player
-            remaining_cards = Cards()
-            remaining_cards.hands = [
-                [item for item in sublist if item not in cards_played_list]
-                for sublist in trimmed_complete_hands.hands
-            ]
 
-            # Create and analyze the card tree
-            card_tree = create_full_tree(n_players * hand_size, n_players,
-                                         remaining_cards, trump,
-                                         cardtree_root_properties)
-            nash_tree = find_nash_scores(card_tree, sorted_bot_bids)
+def find_best_action_overall(player_hand, trump, bidtree_root_properties,
+                             history, my_bot, bots, p=0.2, nreps=1000,
+                             executor=None, seed=None, chunk_size=25, deadline_s=None,
+                             mode='exact', stats=None, cache=None, tables=None,
+                             stratify=False):
+    """
+    Find the best action considering all possible scenarios.
+
+    By default the simulations run one after the other on the global random
+    stream. Passing an executor or a seed splits them into seeded chunks with
+    run_sample_chunks, which makes the result reproducible for a given seed
+    whatever the number of workers. Passing deadline_s samples in chunks until
+    the time budget is spent or the best card is clearly ahead, see
+    run_sample_chunks.
 
-            action_scores = get_root_action_scores(nash_tree)
-            outcomes_list.append(action_scores)
+    Every card is scored on the same deals (common random numbers), so the
+    differences between cards, which decide the choice, are much less noisy
+    than the scores themselves. stats gets the lead of the best card and its
+    standard error, see NE_bid_bot.add_margin_stats.
+
+    Args:
+    player_hand (list): The player's current hand.
+    trump (str): The trump suit.
+    bidtree_root_properties (dict): Properties of the bidding tree root.
+    history (list): History of played cards.
+    my_bot (dict): Information about the current bot.
+    bots (list): List of all bots in the game.
+    p (float): Probability for bid modification.
+    nreps (int): Number of Monte Carlo simulations.
+    executor (concurrent.futures.Executor): Executor to run chunks of simulations on.
+    seed (int): Seed for the chunked simulations.
+    chunk_size (int): Number of simulations per chunk.
+    deadline_s (float): Time budget in seconds, nreps is then an upper bound.
+    mode (str): Search mode, see NE_solver.NashSolver. 'paranoid' plays for
+        the current player.
+    stats (dict): Counters the number of samples drawn and accepted, solves,
+        positions searched and solve time are added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, see find_bid.
+    tables (dict): Memo tables shared by the searches of this round, see
+        NE_solver.NashSolver, or None. Positions met at one trick of the round
+        come back at the next ones, so passing the same tables on every call of
+        a round makes the later calls much cheaper. They are only used when the
+        simulations run in this process.
+    stratify (bool): Spread the simulations over the number of trumps each
+        opponent holds instead of drawing them independently, see
+        NE_bid_bot.stratified_splits.
 
-    return find_best_action(outcomes_list)
+    Returns:
+    dict: A dictionary of actions and their scores, None if no simulation was consistent with the bids.
+    """
+    if executor is None and seed is None and deadline_s is None:
+        all_scores = sample_actions(player_hand, trump, bidtree_root_properties,
+                                    history, my_bot, bots, p=p, mode=mode, cache=cache,
+                                    tables=tables, stratify=stratify, nreps=nreps,
+                                    stats=stats)
+    else:
+        # Bot instances do not need to travel to the workers, and read-only views
+        # from the game are turned back into dicts so they can be pickled
+        my_bot = {key: value for key, value in my_bot.items() if key != 'bot_instance'}
+        bots = [{key: value for key, value in bot.items() if key != 'bot_instance'}
+                for bot in bots]
+        history = [dict(trick) for trick in history]
+        # Copies of the tables sent to worker processes would be thrown away
+        if executor is not None:
+            tables = None
+        args = (player_hand, trump, bidtree_root_properties, history, my_bot, bots, p, mode,
+                cache, tables, stratify)
+        strata = None
+        if stratify and suit_to_int(trump) != NO_SUIT:
+            # Allocated over all the simulations once and split between the chunks
+            setup = deal_setup(player_hand, history, my_bot, bots)
+            strata = stratified_splits(setup['unseen'], setup['unseen_sizes'], trump, nreps,
+                                       setup['voids'], setup['known_cards'], shuffle=True,
+                                       rng=random if seed is None else random.Random(seed))
+        all_scores = run_sample_chunks(sample_actions, args, nreps, executor=executor,
+                                       seed=seed, chunk_size=chunk_size,
+                                       deadline_s=deadline_s, stats=stats, strata=strata)
+    return all_scores or None
 
 # The following code is commented out as it appears to be example usage
 # player_hand = ['10C', '4D']
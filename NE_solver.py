@@ -0,0 +1,1160 @@
+import random
+from functools import lru_cache
+
+from card_core import (
+    CARD_INDEX,
+    NO_SUIT,
+    SUIT_MASKS,
+    beating_mask,
+    beats,
+    legal_mask,
+    lowest_card,
+    mask_to_ints,
+    trick_winner
+)
+
+
+def refine_mask(hand, starting_suit, winning_card, trump, hand_masks=None, table=0):
+    """
+    Integer version of valid_card_finder followed by refine_choices.
+
+    Args:
+    hand (int): Bitmask of the cards still held by the player.
+    starting_suit (int): Suit of the first card in the trick, or NO_SUIT when leading.
+    winning_card (int): Card currently winning the trick, ignored when leading.
+    trump (int): The trump suit, or NO_SUIT.
+    hand_masks (list): Bitmask of the cards held by each player, or None. When
+        given, a player who can't win plays the lowest card as canonical_lowest
+        picks it, so positions sharing a canonical_key make the same choices.
+    table (int): Bitmask of the cards in the current trick.
+
+    Returns:
+    int: Bitmask of the cards worth considering.
+    """
+    valid = legal_mask(hand, starting_suit)
+    if starting_suit == NO_SUIT or not valid & (valid - 1):
+        return valid
+    # If we can't win, play the lowest card
+    if not valid & beating_mask(winning_card, trump):
+        if hand_masks is None:
+            return 1 << lowest_card(valid)
+        return 1 << canonical_lowest(valid, hand_masks, table, trump)
+    # We might win, so keep all options open
+    return valid
+
+
+def canonical_lowest(choices, hand_masks, table, trump):
+    """
+    Find the lowest card in choices the way canonical_key sees the position.
+
+    Ranks are counted among the cards still in play (held or in the current
+    trick), as canonical_key does. Cards of equal rank are told apart by
+    playing a non-trump first, then by who holds every card in play of their
+    suits, which relabelling suits doesn't change. Suits that are still tied
+    play alike, so the lowest suit is taken.
+
+    Args:
+    choices (int): A non-empty bitmask of the cards to choose from.
+    hand_masks (list): Bitmask of the cards held by each player.
+    table (int): Bitmask of the cards in the current trick.
+    trump (int): The trump suit, or NO_SUIT.
+
+    Returns:
+    int: The lowest card.
+    """
+    if not choices & (choices - 1):
+        return choices.bit_length() - 1
+    live = table
+    for hand in hand_masks:
+        live |= hand
+
+    def order(card):
+        suit_mask = SUIT_MASKS[card // 13]
+        rank = bin(live & suit_mask & ((1 << card) - 1)).count('1')
+        # Who holds every card in play of the suit, -1 for cards in the trick
+        holders = tuple(next((player for player, hand in enumerate(hand_masks) if hand >> other & 1), -1)
+                        for other in mask_to_ints(live & suit_mask))
+        return rank, card // 13 == trump, holders, card
+
+    return min((lowest_card(choices & suit_mask) for suit_mask in SUIT_MASKS
+                if choices & suit_mask), key=order)
+
+
+def collapse_equivalent(choices, others):
+    """
+    Keep only the lowest card of every group of equivalent cards in choices.
+
+    Two cards of the same suit held by one player are equivalent when no card
+    ranked between them is held by another player or lies in the current trick,
+    i.e. every card between them is either held by the same player or gone in
+    an earlier trick. Playing either leads to the same outcomes.
+
+    Args:
+    choices (int): Bitmask of the cards the player is considering.
+    others (int): Bitmask of the cards held by other players or in the current trick.
+
+    Returns:
+    int: Bitmask with one card of every group.
+    """
+    kept = 0
+    previous = -1
+    while choices:
+        bit = choices & -choices
+        choices ^= bit
+        card = bit.bit_length() - 1
+        # Cards strictly between the previous choice and this one
+        if previous < 0 or previous // 13 != card // 13 or \
+                others & ((1 << card) - (2 << previous)):
+            kept |= bit
+        previous = card
+    return kept
+
+
+def equivalence_groups(choices, others):
+    """
+    Group the cards in choices the way collapse_equivalent does.
+
+    Args:
+    choices (int): Bitmask of the cards the player is considering.
+    others (int): Bitmask of the cards held by other players or in the current trick.
+
+    Returns:
+    dict: Maps the lowest card of every group to all the cards in the group.
+    """
+    groups = {}
+    kept = collapse_equivalent(choices, others)
+    representative = -1
+    for card in mask_to_ints(choices):
+        if kept >> card & 1:
+            representative = card
+            groups[card] = []
+        groups[representative].append(card)
+    return groups
+
+
+def expand_equivalent(action_scores, groups):
+    """
+    Args:
+    action_scores (dict): Scores keyed by the lowest card of every group.
+    groups (dict): The equivalence groups, see equivalence_groups.
+
+    Returns:
+    dict: The scores keyed by every card of every group.
+    """
+    return {card: action_scores[representative]
+            for representative in action_scores for card in groups[representative]}
+
+
+@lru_cache(maxsize=1 << 16)
+def _suit_signature(suit_hands):
+    # Players holding the cards of one suit, lowest first, from each player's cards in the suit
+    live = 0
+    for hand in suit_hands:
+        live |= hand
+    signature = []
+    while live:
+        bit = live & -live
+        live ^= bit
+        for player, hand in enumerate(suit_hands):
+            if hand & bit:
+                signature.append(player)
+                break
+    return tuple(signature)
+
+
+def suit_signatures(hand_masks):
+    """
+    Args:
+    hand_masks (list): Bitmask of the cards held by each player.
+
+    Returns:
+    list: For every suit, the tuple of the players holding its cards, lowest
+    card first. Cards nobody holds are left out, so only the order of the
+    cards still in play matters.
+    """
+    return [_suit_signature(tuple(hand >> shift & 0x1fff for hand in hand_masks))
+            for shift in (0, 13, 26, 39)]
+
+
+def canonical_key(hand_masks, trump, leader):
+    """
+    Key a trick boundary so that positions equal up to relabelling share a key.
+
+    Only the order of the cards still held matters within a suit, and the
+    suits other than trumps are interchangeable, so they are sorted. A trump
+    suit nobody holds any more plays like no trumps.
+
+    The solvers give refine_mask the hands, so a player who can't win picks
+    the same card in every position sharing a key (see canonical_lowest).
+
+    Args:
+    hand_masks (list): Bitmask of the cards held by each player.
+    trump (int): The trump suit, or NO_SUIT.
+    leader (int): The player to lead the next trick.
+
+    Returns:
+    tuple: The canonical key, see position_from_key.
+    """
+    signatures = suit_signatures(hand_masks)
+    if trump != NO_SUIT and signatures[trump]:
+        trump_signature = signatures.pop(trump)
+    else:
+        trump_signature = None
+    return (leader, trump_signature) + tuple(sorted(signatures))
+
+
+def canonical_position(hand_masks, trump, leader, played_mask=0):
+    """
+    Map a position at a trick boundary to its canonical key and back.
+
+    Args:
+    hand_masks (list): Bitmask of the cards held by each player.
+    trump (int): The trump suit, or NO_SUIT.
+    leader (int): The player to lead the next trick.
+    played_mask (int): Bitmask of the cards played so far, which are removed
+        from the hands.
+
+    Returns:
+    tuple: The canonical key and a dict mapping every card of the canonical
+    position (see position_from_key) to the card it stands for.
+    """
+    hand_masks = [hand & ~played_mask for hand in hand_masks]
+    key = canonical_key(hand_masks, trump, leader)
+    live = 0
+    for hand in hand_masks:
+        live |= hand
+
+    # Canonical suits in the order of the key, each paired with an original suit
+    suits = list(range(4))
+    if key[1] is None:
+        trump = NO_SUIT
+    else:
+        suits.remove(trump)
+    signatures = suit_signatures(hand_masks)
+    suits.sort(key=lambda suit: signatures[suit])
+    if trump != NO_SUIT:
+        suits.insert(0, trump)
+
+    to_original = {}
+    for canonical_suit, suit in enumerate(suits):
+        for rank, card in enumerate(mask_to_ints(live & SUIT_MASKS[suit])):
+            to_original[canonical_suit * 13 + rank] = card
+    return key, to_original
+
+
+def position_from_key(key, n_players):
+    """
+    Args:
+    key (tuple): A canonical key, see canonical_key.
+    n_players (int): Number of players in the game.
+
+    Returns:
+    tuple: The canonical position (hand_masks, trump, leader). Trumps, if any,
+    are suit 0 and every suit holds its cards from rank 0 up.
+    """
+    leader, trump_signature = key[:2]
+    signatures = list(key[2:])
+    trump = NO_SUIT
+    if trump_signature is not None:
+        trump = 0
+        signatures.insert(0, trump_signature)
+    hand_masks = [0] * n_players
+    for suit, signature in enumerate(signatures):
+        for rank, player in enumerate(signature):
+            hand_masks[player] |= 1 << (suit * 13 + rank)
+    return hand_masks, trump, leader
+
+
+def root_trick_state(root_properties, n_players, trump):
+    """
+    Work out who plays next and the state of the current trick at the root.
+
+    Args:
+    root_properties (dict): Properties of the root node.
+    n_players (int): Number of players in the game.
+    trump (int): The trump suit, or NO_SUIT.
+
+    Returns:
+    tuple: (player_id, trick_size, starting_suit, winning_card, winning_player, table)
+    """
+    trick = [CARD_INDEX[card] for card in root_properties['cards_played_in_trick']]
+    if root_properties['trick_end'] == 1:
+        player_id = root_properties['previous_trick_winner']
+        trick = []
+    else:
+        player_id = (root_properties['player_id'] + 1) % n_players
+
+    if not trick:
+        return player_id, 0, NO_SUIT, -1, -1, 0
+    winning_position = trick_winner(trick, trump)
+    # The trick was started by the player len(trick) seats before the next player
+    winning_player = (player_id - len(trick) + winning_position) % n_players
+    table = 0
+    for card in trick:
+        table |= 1 << card
+    return player_id, len(trick), trick[0] // 13, trick[winning_position], winning_player, table
+
+
+# Search modes of NashSolver
+SOLVER_MODES = ('exact', 'pruned', 'paranoid')
+
+
+def payoff(score, bids):
+    """
+    Args:
+    score (list): Tricks won by each player.
+    bids (list): Bids made by players.
+
+    Returns:
+    list: The points each player scores for the round.
+    """
+    return [10 + 2*b if p == b else -2*abs(b-p) for p, b in zip(score, bids)]
+
+
+def share_tables(tables, bids, mode, perspective):
+    """
+    Find the memo tables a solver shares with earlier solvers of the same round.
+
+    Args:
+    tables (dict): Tables of the round, or None.
+    bids (list): The bids of the solver, or None.
+    mode (str): The search mode of the solver.
+    perspective (int): The player a paranoid search plays for.
+
+    Returns:
+    tuple: The memo, dual_memo and bound_memo dicts for the solver, new ones
+    if tables is None. Values depend on the objective and the search mode, so
+    every combination has its own dicts.
+    """
+    if tables is None:
+        return {}, {}, {}
+    key = (bids and tuple(bids), mode, perspective if mode == 'paranoid' else None)
+    return tables.setdefault(key, ({}, {}, {}))
+
+
+def trim_tables(tables, max_entries=500000):
+    """
+    Empty shared memo tables once they hold more than max_entries entries in all,
+    which bounds the memory a round's tables can take.
+
+    Args:
+    tables (dict): Tables of a round, or None.
+    max_entries (int): Largest number of entries to keep.
+    """
+    if tables is None:
+        return
+    if sum(len(table) for memos in tables.values() for table in memos) > max_entries:
+        tables.clear()
+
+
+class NashSolver(object):
+    """
+    Depth-first Nash solver that plays and undoes cards on a single game state.
+
+    Without bids every player maximises their own tricks, as find_nash_bids
+    does. With bids the leaves are scored against the bids and every player
+    maximises the difference between their score and everyone else's, as
+    find_nash_scores does. Values are backed up as the recursion returns, so
+    no tree is kept and memory grows with the depth only.
+
+    Children are searched in the same order as create_full_tree builds them and
+    ties are broken with one random.choice per sibling set, in postorder, so
+    under a fixed seed search gives the same results as building the tree with
+    memoize='bids' (or 'scores' with bids) and backing it up.
+
+    A trick state is the tuple (player_id, trick_size, starting_suit,
+    winning_card, winning_player, table) describing who plays next and the
+    trick so far, table being the bitmask of the cards in the trick.
+
+    Move generation keeps one card of every group of equivalent cards (see
+    collapse_equivalent); the action scores at the root are reported for every
+    card of every group.
+
+    The mode picks the search below the root:
+        'exact': full max^n search, as described above.
+        'pruned': max^n with immediate and shallow pruning. Every value lies
+            within bounds set by the tricks still to play, and trick counts
+            always add up to the number of tricks, so a player stops looking
+            at moves once they can't do better, or once their parent already
+            has a move the position can't beat. Likely winners are searched
+            first to make that happen early. Values are the same as 'exact',
+            but fewer ties are seen so random tie-breaking can differ.
+        'paranoid': two-sided alpha-beta where every other player plays
+            against the perspective player, an approximation for large hands.
+            The value of a position is the leaf reached by the principal
+            variation, ties go to the first move searched.
+    """
+
+    def __init__(self, max_depth, n_players, hand_masks, trump, score, bids=None,
+                 mode='exact', perspective=None, tables=None):
+        """
+        Args:
+        max_depth (int): Maximum depth of the game.
+        n_players (int): Number of players in the game.
+        hand_masks (list): Bitmask of the cards held by each player.
+        trump (int): The trump suit, or NO_SUIT.
+        score (list): Tricks won by each player so far.
+        bids (list): Bids made by players, or None to back up trick counts.
+        mode (str): One of SOLVER_MODES, see the class docstring.
+        perspective (int): The player the paranoid search plays for.
+        tables (dict): Memo tables shared with earlier solvers, or None for
+            new ones. Solvers may only share tables when they search
+            positions of the same round (same number of players and cards)
+            against the same bids, see share_tables.
+        """
+        if mode not in SOLVER_MODES:
+            raise ValueError("Unknown solver mode: %r" % (mode,))
+        self.max_depth = max_depth
+        self.n_players = n_players
+        self.hands = list(hand_masks)
+        self.trump = trump
+        self.score = list(score)
+        self.bids = bids
+        self.mode = mode
+        self.perspective = perspective
+        # Tricks still to come from a trick boundary, keyed by canonical_key.
+        # (tricks, payoff) pairs from a trick boundary, also keyed by the tricks won so far.
+        # (flag, value) pairs of the paranoid search, keyed like memo.
+        self.memo, self.dual_memo, self.bound_memo = share_tables(tables, bids, mode, perspective)
+        # Number of positions searched
+        self.nodes = 0
+
+    def moves(self, state):
+        """
+        Args:
+        state (tuple): The trick state.
+
+        Returns:
+        int: Bitmask of the cards worth considering for the next player, one per
+        group of equivalent cards.
+        """
+        return collapse_equivalent(*self.refined_moves(state))
+
+    def refined_moves(self, state):
+        """
+        Args:
+        state (tuple): The trick state.
+
+        Returns:
+        tuple: Bitmask of the cards worth considering for the next player before
+        equivalent cards are collapsed, and bitmask of the cards held by other
+        players or in the current trick.
+        """
+        player_id, trick_size, starting_suit, winning_card, _, table = state
+        if trick_size == self.n_players:
+            starting_suit = NO_SUIT
+            table = 0
+        hand = self.hands[player_id]
+        held = 0
+        for other in self.hands:
+            held |= other
+        choices = refine_mask(hand, starting_suit, winning_card, self.trump, self.hands, table)
+        return choices, (held & ~hand) | table
+
+    def move_groups(self, state):
+        """
+        Args:
+        state (tuple): The trick state.
+
+        Returns:
+        dict: The equivalence groups of the next player's moves, see equivalence_groups.
+        """
+        return equivalence_groups(*self.refined_moves(state))
+
+    def play(self, state, card):
+        """
+        Play a card for the next player, updating the hands and tricks won.
+
+        Args:
+        state (tuple): The trick state.
+        card (int): The card to play.
+
+        Returns:
+        tuple: The trick state after the card.
+        """
+        player_id, trick_size, starting_suit, winning_card, winning_player, table = state
+        # The previous trick is over once it holds a card from every player
+        if trick_size == self.n_players:
+            trick_size = 0
+            table = 0
+
+        if trick_size == 0:
+            starting_suit, winning_card, winning_player = card // 13, card, player_id
+        elif beats(card, winning_card, self.trump):
+            winning_card, winning_player = card, player_id
+
+        self.hands[player_id] ^= 1 << card
+        # Handle end of trick
+        if trick_size + 1 == self.n_players:
+            self.score[winning_player] += 1
+            next_player = winning_player
+        else:
+            next_player = (player_id + 1) % self.n_players
+        return next_player, trick_size + 1, starting_suit, winning_card, winning_player, table | 1 << card
+
+    def unplay(self, state, card, child_state):
+        """
+        Undo play(state, card), which returned child_state.
+        """
+        self.hands[state[0]] ^= 1 << card
+        if child_state[1] == self.n_players:
+            self.score[child_state[4]] -= 1
+
+    def choose(self, values, player_id, bids):
+        """
+        Pick the value the player moving prefers, breaking ties at random.
+
+        Args:
+        values (list): The value of every child, in order.
+        player_id (int): The player choosing between the children.
+        bids (list): None when values are trick counts, otherwise the bids
+            the values were scored against.
+
+        Returns:
+        list: The chosen value.
+        """
+        if len(values) == 1:
+            return values[0]
+        if bids is None:
+            ranking = [value[player_id] for value in values]
+        else:
+            # Sum of differences between the player's score and everyone else's
+            n_players = self.n_players
+            ranking = [n_players * value[player_id] - sum(value) for value in values]
+        best = max(ranking)
+        best_children = [value for value, rank in zip(values, ranking) if rank == best]
+        return random.choice(best_children)
+
+    def boundary_key(self, state):
+        # Memo key of a trick boundary, None anywhere else
+        if state[1] != self.n_players:
+            return None
+        return canonical_key(self.hands, self.trump, state[0])
+
+    def leaf(self, bids):
+        return list(self.score) if bids is None else payoff(self.score, bids)
+
+    def search(self, depth, player_id, trick_size, starting_suit, winning_card, winning_player, table):
+        """
+        Back up the value of a position under the solver's objective.
+
+        Args:
+        depth (int): Number of cards played so far.
+        player_id ... winning_player: The trick state, unpacked.
+
+        Returns:
+        list: The minmax score of the position.
+        """
+        self.nodes += 1
+        bids = self.bids
+        if depth >= self.max_depth:
+            return list(self.score) if bids is None else payoff(self.score, bids)
+
+        key = None
+        if trick_size == self.n_players:
+            key = canonical_key(self.hands, self.trump, player_id)
+            if bids is not None:
+                key += tuple(self.score)
+            future = self.memo.get(key)
+            if future is not None:
+                if bids is not None:
+                    return list(future)
+                return [s + f for s, f in zip(self.score, future)]
+
+        _, values = self.children(depth, player_id, trick_size, starting_suit,
+                                  winning_card, winning_player, table)
+        value = self.choose(values, player_id, bids)
+
+        if key is not None:
+            # Store the tricks still to come so the subgame can be reused with any score
+            self.memo[key] = tuple(value) if bids is not None else \
+                tuple(v - s for v, s in zip(value, self.score))
+        return value
+
+    def children(self, depth, player_id, trick_size, starting_suit, winning_card, winning_player, table):
+        """
+        Args:
+        depth (int): Number of cards played so far.
+        player_id ... winning_player: The trick state, unpacked.
+
+        Returns:
+        tuple: The cards worth considering (one per group of equivalent cards),
+        lowest card first, and the minmax score after each.
+        """
+        # play and unplay are inlined here as this is the hot loop of every solve
+        n_players, hands, score, trump = self.n_players, self.hands, self.score, self.trump
+        if trick_size == n_players:
+            trick_size = 0
+            starting_suit = NO_SUIT
+            table = 0
+        hand = hands[player_id]
+        choices = refine_mask(hand, starting_suit, winning_card, trump, hands, table)
+        if choices & (choices - 1):
+            held = 0
+            for other in hands:
+                held |= other
+            choices = collapse_equivalent(choices, (held ^ hand) | table)
+        cards = []
+        values = []
+
+        while choices:
+            bit = choices & -choices
+            choices ^= bit
+            card = bit.bit_length() - 1
+
+            if trick_size == 0:
+                child_suit, child_winning_card, child_winner = card // 13, card, player_id
+            elif beats(card, winning_card, trump):
+                child_suit, child_winning_card, child_winner = starting_suit, card, player_id
+            else:
+                child_suit, child_winning_card, child_winner = starting_suit, winning_card, winning_player
+
+            trick_over = trick_size + 1 == n_players
+            if trick_over:
+                next_player = child_winner
+                score[child_winner] += 1
+            else:
+                next_player = (player_id + 1) % n_players
+
+            hands[player_id] = hand ^ bit
+            cards.append(card)
+            values.append(self.search(depth + 1, next_player, trick_size + 1,
+                                      child_suit, child_winning_card, child_winner, table | bit))
+            hands[player_id] = hand
+
+            if trick_over:
+                score[child_winner] -= 1
+        return cards, values
+
+    def rank(self, value, player_id):
+        # How much player_id likes value, as compared by choose
+        if self.bids is None:
+            return value[player_id]
+        return self.n_players * value[player_id] - sum(value)
+
+    def remaining_tricks(self, depth, trick_size):
+        """
+        Args:
+        depth (int): Number of cards played so far.
+        trick_size (int): Number of cards in the current trick.
+
+        Returns:
+        int: Number of tricks still to be won, the current one included.
+        """
+        return (self.max_depth - depth + trick_size % self.n_players) // self.n_players
+
+    def bounds(self, remaining):
+        """
+        Args:
+        remaining (int): Number of tricks still to be won.
+
+        Returns:
+        tuple: Lowest and highest value every player can still end up with.
+        """
+        if self.bids is None:
+            return list(self.score), [s + remaining for s in self.score]
+        lowest, highest = [], []
+        for s, b in zip(self.score, self.bids):
+            # The payoff falls away from the bid, so the extremes are at the ends
+            top = s + remaining
+            if b < s:
+                lowest.append(-2 * (top - b))
+                highest.append(-2 * (s - b))
+            elif b > top:
+                lowest.append(-2 * (b - s))
+                highest.append(-2 * (b - top))
+            else:
+                lowest.append(10 + 2*b if remaining == 0 else -2 * max(b - s, top - b))
+                highest.append(10 + 2*b)
+        return lowest, highest
+
+    def best_rank(self, player_id, lowest, highest):
+        # Highest rank player_id can still reach, see bounds
+        if self.bids is None:
+            return highest[player_id]
+        return (self.n_players - 1) * highest[player_id] - (sum(lowest) - lowest[player_id])
+
+    def parent_cut(self, player_id, rank, parent_id, parent_rank, lowest, highest):
+        """
+        Shallow pruning test.
+
+        Args:
+        player_id (int): The player moving, who can already reach rank.
+        rank (int): The best rank player_id has found.
+        parent_id (int): The player moving at the parent.
+        parent_rank (int): The best rank parent_id has found at the parent.
+        lowest, highest (list): The bounds of the position, see bounds.
+
+        Returns:
+        bool: True when parent_id ranks whatever player_id chooses strictly below
+        parent_rank, so the position can't be chosen.
+        """
+        if self.bids is None:
+            # Trick counts add up to the number of tricks
+            return rank > sum(lowest) + highest[0] - lowest[0] - parent_rank
+        n_players = self.n_players
+        others = sum(lowest) - lowest[player_id] - lowest[parent_id]
+        # Reaching rank takes at least this much for player_id
+        least = max(lowest[player_id], (rank + lowest[parent_id] + others) / (n_players - 1))
+        return (n_players - 1) * highest[parent_id] - least - others < parent_rank
+
+    def order_moves(self, choices, trick_size, winning_card):
+        """
+        Args:
+        choices (int): Bitmask of the cards worth considering.
+        trick_size (int): Number of cards in the current trick.
+        winning_card (int): Card currently winning the trick.
+
+        Returns:
+        list: The cards in choices, likely winners first: the cards that take
+        the trick (trumps when leading), then the rest, highest first.
+        """
+        trump = self.trump
+        if trick_size % self.n_players:
+            first = choices & beating_mask(winning_card, trump)
+        else:
+            first = choices & SUIT_MASKS[trump] if trump != NO_SUIT else 0
+
+        def strength(card):
+            return card // 13 == trump, card % 13
+
+        return sorted(mask_to_ints(first), key=strength, reverse=True) + \
+            sorted(mask_to_ints(choices & ~first), key=strength, reverse=True)
+
+    def search_value(self, depth, state):
+        """
+        Args:
+        depth (int): Number of cards played so far.
+        state (tuple): The trick state.
+
+        Returns:
+        list: The value of the position under the solver's mode.
+        """
+        if self.mode == 'pruned':
+            return self.search_pruned(depth, state)[0]
+        if self.mode == 'paranoid':
+            return self.search_paranoid(depth, state, float('-inf'), float('inf'))
+        return self.search(depth, *state)
+
+    def root_children(self, depth, state):
+        """
+        Args:
+        depth (int): Number of cards played so far.
+        state (tuple): The trick state.
+
+        Returns:
+        tuple: The cards worth considering, lowest card first, and the value
+        after each under the solver's mode.
+        """
+        if self.mode == 'exact':
+            return self.children(depth, *state)
+        cards = mask_to_ints(self.moves(state))
+        values = []
+        for card in cards:
+            child_state = self.play(state, card)
+            values.append(self.search_value(depth + 1, child_state))
+            self.unplay(state, card, child_state)
+        return cards, values
+
+    def choose_root(self, values, player_id):
+        """
+        Args:
+        values (list): The value of every child of the root, see root_children.
+        player_id (int): The player moving at the root.
+
+        Returns:
+        list: The chosen value.
+        """
+        if self.mode != 'paranoid':
+            return self.choose(values, player_id, self.bids)
+        ranking = [self.rank(value, self.perspective) for value in values]
+        best = max(ranking) if player_id == self.perspective else min(ranking)
+        return values[ranking.index(best)]
+
+    def search_pruned(self, depth, state, parent_id=None, parent_rank=None):
+        """
+        Back up the value of a position with max^n pruning.
+
+        Args:
+        depth (int): Number of cards played so far.
+        state (tuple): The trick state.
+        parent_id (int): The player moving at the parent.
+        parent_rank (int): The best rank the parent has found so far, or None.
+
+        Returns:
+        tuple: The minmax score of the position and whether it is exact. A
+        position that is not exact was cut off: the parent ranks it strictly
+        below a move it already has.
+        """
+        self.nodes += 1
+        bids = self.bids
+        if depth >= self.max_depth:
+            return self.leaf(bids), True
+
+        key = self.boundary_key(state)
+        if key is not None:
+            if bids is not None:
+                key += tuple(self.score)
+            future = self.memo.get(key)
+            if future is not None:
+                if bids is not None:
+                    return list(future), True
+                return [s + f for s, f in zip(self.score, future)], True
+
+        player_id, trick_size, _, winning_card, _, _ = state
+        choices = self.moves(state)
+        if choices & (choices - 1):
+            cards = self.order_moves(choices, trick_size, winning_card)
+            lowest, highest = self.bounds(self.remaining_tricks(depth, trick_size))
+            reachable = self.best_rank(player_id, lowest, highest)
+            check_parent = parent_rank is not None and parent_id != player_id
+        else:
+            # A single move can't be pruned, it is passed on to the child instead
+            cards = [choices.bit_length() - 1]
+            reachable = float('inf')
+            check_parent = False
+
+        best = None
+        best_children = []
+        exact = True
+        for card in cards:
+            child_state = self.play(state, card)
+            value, _ = self.search_pruned(depth + 1, child_state, player_id, best)
+            self.unplay(state, card, child_state)
+
+            rank = self.rank(value, player_id)
+            if best is None or rank > best:
+                best = rank
+                best_children = [value]
+            elif rank == best:
+                best_children.append(value)
+
+            # Immediate pruning: no other move can do better
+            if best >= reachable:
+                break
+            if check_parent and self.parent_cut(player_id, best, parent_id, parent_rank,
+                                                lowest, highest):
+                exact = False
+                break
+
+        value = random.choice(best_children) if len(best_children) > 1 else best_children[0]
+        if key is not None and exact:
+            self.memo[key] = tuple(value) if bids is not None else \
+                tuple(v - s for v, s in zip(value, self.score))
+        return value, exact
+
+    def search_paranoid(self, depth, state, alpha, beta):
+        """
+        Back up the value of a position with alpha-beta, every other player
+        playing against the perspective player.
+
+        Args:
+        depth (int): Number of cards played so far.
+        state (tuple): The trick state.
+        alpha (float): Rank the perspective player is already sure of.
+        beta (float): Rank the other players can already hold them to.
+
+        Returns:
+        list: The value of the position. Its rank for the perspective player is
+        exact when strictly between alpha and beta, otherwise it is a bound on
+        the side of the window it falls.
+        """
+        self.nodes += 1
+        bids = self.bids
+        perspective = self.perspective
+        if depth >= self.max_depth:
+            return self.leaf(bids)
+
+        key = self.boundary_key(state)
+        if key is not None:
+            if bids is not None:
+                key += tuple(self.score)
+            entry = self.bound_memo.get(key)
+            if entry is not None:
+                flag, stored = entry
+                value = list(stored) if bids is not None else \
+                    [s + f for s, f in zip(self.score, stored)]
+                rank = self.rank(value, perspective)
+                if flag == 0 or (flag > 0 and rank >= beta) or (flag < 0 and rank <= alpha):
+                    return value
+
+        player_id, trick_size, _, winning_card, _, _ = state
+        maximising = player_id == perspective
+        window = alpha, beta
+        best_value = best = None
+        for card in self.order_moves(self.moves(state), trick_size, winning_card):
+            child_state = self.play(state, card)
+            value = self.search_paranoid(depth + 1, child_state, alpha, beta)
+            self.unplay(state, card, child_state)
+
+            rank = self.rank(value, perspective)
+            if maximising:
+                if best_value is None or rank > best:
+                    best_value, best = value, rank
+                    alpha = max(alpha, rank)
+            elif best_value is None or rank < best:
+                best_value, best = value, rank
+                beta = min(beta, rank)
+            if alpha >= beta:
+                break
+
+        if key is not None:
+            # -1: upper bound, 1: lower bound, 0: exact
+            flag = -1 if best <= window[0] else 1 if best >= window[1] else 0
+            self.bound_memo[key] = (flag, tuple(best_value) if bids is not None else
+                                    tuple(v - s for v, s in zip(best_value, self.score)))
+        return best_value
+
+    def search_dual(self, depth, state, bids, root=False):
+        """
+        Back up trick counts and scores against bids in a single pass.
+
+        Args:
+        depth (int): Number of cards played so far.
+        state (tuple): The trick state.
+        bids (list): Bids made by players.
+        root (bool): Whether the card scores are wanted. The memo keeps no
+            card scores, so it is not looked up.
+
+        Returns:
+        tuple: The trick count minmax score, the bid score minmax score and a
+        dict mapping each card worth considering to its bid score minmax score.
+        """
+        self.nodes += 1
+        if depth >= self.max_depth:
+            return list(self.score), payoff(self.score, bids), {}
+
+        key = self.boundary_key(state)
+        if key is not None:
+            dual_key = key + tuple(self.score)
+            if not root and dual_key in self.dual_memo:
+                tricks, scores = self.dual_memo[dual_key]
+                return list(tricks), list(scores), {}
+
+        choices = self.moves(state)
+        cards, tricks, scores = [], [], []
+        while choices:
+            bit = choices & -choices
+            choices ^= bit
+            card = bit.bit_length() - 1
+
+            child_state = self.play(state, card)
+            child_tricks, child_scores, _ = self.search_dual(depth + 1, child_state, bids)
+            self.unplay(state, card, child_state)
+            cards.append(card)
+            tricks.append(child_tricks)
+            scores.append(child_scores)
+
+        trick_value = self.choose(tricks, state[0], None)
+        score_value = self.choose(scores, state[0], bids)
+        if key is not None:
+            self.dual_memo[dual_key] = (tuple(trick_value), tuple(score_value))
+            if key not in self.memo:
+                self.memo[key] = tuple(v - s for v, s in zip(trick_value, self.score))
+        return trick_value, score_value, dict(zip(cards, scores))
+
+    def search_path(self, depth, state, path, bids):
+        """
+        Back up trick counts from a position while following the cards in path,
+        and back up scores against bids at the position the path leads to.
+
+        Cards on the path that the move generation would have pruned are still
+        followed, but they do not take part in the trick count backup.
+
+        Args:
+        depth (int): Number of cards played so far.
+        state (tuple): The trick state.
+        path (list): Cards still to be played along the path.
+        bids (list): Bids made by players.
+
+        Returns:
+        tuple: The trick count minmax score of the position and the dict of
+        bid score minmax scores for every card worth considering at the end of the path.
+        """
+        self.nodes += 1
+        if not path:
+            tricks, _, action_scores = self.search_dual(depth, state, bids, root=True)
+            return tricks, expand_equivalent(action_scores, self.move_groups(state))
+
+        choices = self.moves(state)
+        path_card = path[0]
+        values = []
+        action_scores = None
+        for card in mask_to_ints(choices | 1 << path_card):
+            child_state = self.play(state, card)
+            if card == path_card:
+                value, action_scores = self.search_path(depth + 1, child_state, path[1:], bids)
+            else:
+                value = self.search_value(depth + 1, child_state)
+            self.unplay(state, card, child_state)
+            if choices >> card & 1:
+                values.append(value)
+        return self.choose(values, state[0], None), action_scores
+
+
+def add_stats(stats, *solvers):
+    """
+    Add the work done by solvers to a dictionary of counters.
+
+    Args:
+    stats (dict): Counters to update, or None.
+    solvers (NashSolver): The solvers used for one solve.
+    """
+    if stats is None:
+        return
+    stats['solves'] = stats.get('solves', 0) + 1
+    stats['nodes'] = stats.get('nodes', 0) + sum(solver.nodes for solver in solvers)
+
+
+def _root_key(max_depth, n_players, hand_masks, trump, root_properties, state):
+    # Canonical cache key of a root at a trick boundary and the mapping back to its
+    # cards, (None, None) for a root inside a trick
+    if state[1]:
+        return None, None
+    key, to_original = canonical_position(hand_masks, trump, state[0])
+    return key + (n_players, max_depth - root_properties['depth'],
+                  tuple(root_properties['score'])), to_original
+
+
+def _to_cache(result, to_original):
+    value, action_scores = result
+    to_canonical = {card: canonical for canonical, card in to_original.items()}
+    return tuple(value), {to_canonical[card]: tuple(score) for card, score in action_scores.items()}
+
+
+def _from_cache(entry, to_original):
+    value, action_scores = entry
+    return list(value), {to_original[card]: list(score) for card, score in action_scores.items()}
+
+
+def solve(max_depth, n_players, hand_masks, trump, root_properties, bids=None,
+          mode='exact', perspective=None, stats=None, cache=None, tables=None):
+    """
+    Solve a position with a NashSolver.
+
+    Args:
+    max_depth (int): Maximum depth of the game.
+    n_players (int): Number of players in the game.
+    hand_masks (list): Bitmask of the cards held by each player.
+    trump (int): The trump suit, or NO_SUIT.
+    root_properties (dict): Properties of the root node.
+    bids (list): Bids made by players, or None to back up trick counts.
+    mode (str): One of SOLVER_MODES.
+    perspective (int): The player a paranoid search plays for, by default the
+        player moving at the root.
+    stats (dict): Counters the number of positions searched is added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, or
+        None. Roots at a trick boundary that are equal up to relabelling
+        (see canonical_key) are then solved once, ties included.
+    tables (dict): Memo tables shared with the earlier solves of the round,
+        see NashSolver, or None.
+
+    Returns:
+    tuple: The minmax score of the root and a dict mapping each card (as an
+    int) the next player may choose to the minmax score after playing it.
+    """
+    state = root_trick_state(root_properties, n_players, trump)
+    if perspective is None:
+        perspective = state[0]
+    solver = NashSolver(max_depth, n_players, hand_masks, trump, root_properties['score'], bids,
+                        mode, perspective, tables)
+    if root_properties['depth'] >= max_depth:
+        return solver.leaf(bids), {}
+
+    cache_key = None
+    if cache is not None:
+        cache_key, to_original = _root_key(max_depth, n_players, hand_masks, trump,
+                                           root_properties, state)
+        if cache_key is not None:
+            cache_key += ('solve', bids and tuple(bids), mode, perspective)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return _from_cache(entry, to_original)
+
+    cards, values = solver.root_children(root_properties['depth'], state)
+    add_stats(stats, solver)
+    action_scores = expand_equivalent(dict(zip(cards, values)), solver.move_groups(state))
+    result = solver.choose_root(values, state[0]), action_scores
+    if cache_key is not None:
+        cache[cache_key] = _to_cache(result, to_original)
+    return result
+
+
+def solve_along_path(max_depth, n_players, hand_masks, trump, root_properties, path, bids,
+                     mode='exact', perspective=None, stats=None, cache=None, tables=None):
+    """
+    Solve the trick counts of a whole round and the bid scores of the position
+    reached by path in a single search, so the bid consistency check and the
+    card choice share one solve.
+
+    In paranoid mode the two are separate searches, both played for the
+    perspective player.
+
+    Args:
+    max_depth (int): Maximum depth of the game.
+    n_players (int): Number of players in the game.
+    hand_masks (list): Bitmask of the cards held by each player at the root.
+    trump (int): The trump suit, or NO_SUIT.
+    root_properties (dict): Properties of the root node.
+    path (list): The cards played since the root, as ints.
+    bids (list): Bids made by players.
+    mode (str): One of SOLVER_MODES.
+    perspective (int): The player a paranoid search plays for, by default the
+        player moving at the end of the path.
+    stats (dict): Counters the number of positions searched is added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, see solve.
+    tables (dict): Memo tables shared with the earlier solves of the round,
+        see NashSolver, or None.
+
+    Returns:
+    tuple: The trick count minmax score of the root and a dict mapping each
+    card the player at the end of the path may choose to its bid score minmax score.
+    """
+    state = root_trick_state(root_properties, n_players, trump)
+    cache_key = None
+    if cache is not None:
+        cache_key, to_original = _root_key(max_depth, n_players, hand_masks, trump,
+                                           root_properties, state)
+        if cache_key is not None:
+            to_canonical = {card: canonical for canonical, card in to_original.items()}
+            cache_key += ('path', tuple(to_canonical[card] for card in path), tuple(bids),
+                          mode, perspective)
+            entry = cache.get(cache_key)
+            if entry is not None:
+                return _from_cache(entry, to_original)
+
+    result = _solve_along_path(max_depth, n_players, hand_masks, trump, root_properties, path,
+                               bids, mode, perspective, stats, state, tables)
+    if cache_key is not None:
+        cache[cache_key] = _to_cache(result, to_original)
+    return result
+
+
+def _solve_along_path(max_depth, n_players, hand_masks, trump, root_properties, path, bids,
+                      mode, perspective, stats, state, tables):
+    depth = root_properties['depth']
+    if mode != 'paranoid':
+        solver = NashSolver(max_depth, n_players, hand_masks, trump, root_properties['score'],
+                            mode=mode, tables=tables)
+        result = solver.search_path(depth, state, list(path), bids)
+        add_stats(stats, solver)
+        return result
+
+    solver = NashSolver(max_depth, n_players, hand_masks, trump, root_properties['score'], bids,
+                        mode, tables=tables)
+    end_state = state
+    for card in path:
+        end_state = solver.play(end_state, card)
+    if perspective is None:
+        perspective = end_state[0]
+    solver.perspective = perspective
+    # The paranoid tables belong to the perspective, known only now
+    solver.memo, solver.dual_memo, solver.bound_memo = share_tables(tables, bids, mode, perspective)
+    cards, values = solver.root_children(depth + len(path), end_state)
+    action_scores = expand_equivalent(dict(zip(cards, values)), solver.move_groups(end_state))
+
+    trick_solver = NashSolver(max_depth, n_players, hand_masks, trump, root_properties['score'],
+                              mode=mode, perspective=perspective, tables=tables)
+    tricks = trick_solver.search_paranoid(depth, state, float('-inf'), float('inf'))
+    add_stats(stats, solver, trick_solver)
+    return tricks, action_scores
@@ -0,0 +1,132 @@
+"""
+asyncio version of the game engine, so one process can host many tables.
+
+AsyncRikiki plays by the same rules as Rikiki (it runs the same game_steps) but
+awaits the bots' decisions: a bot whose get_bid and play_card are coroutine
+functions is awaited directly, and any other bot is wrapped in a SyncBotAdapter
+that runs it in an executor, off the event loop. A table waiting on a slow human
+or remote player then doesn't hold up the others:
+
+    tables = [AsyncRikiki(room=[remote_player, basic_bot_v2, NE_bot]) for _ in range(100)]
+    await asyncio.gather(*(table.run_game() for table in tables))
+
+By default sync bots run in the loop's default thread pool. Tables share the
+global random stream, so concurrent games are not reproducible from a seed.
+With decision_timeout, a bot that doesn't answer in time gets a fallback
+decision as in Rikiki, and an async bot's decision is cancelled. A sync bot's
+thread can't be stopped, so as in Rikiki the bot gets fallback decisions until
+it ends.
+"""
+import asyncio
+import functools
+import inspect
+
+from rikiki import DecisionTimeout, Rikiki
+
+
+def is_async_bot(bot_instance):
+    """
+    Args:
+    bot_instance: A bot.
+
+    Returns:
+    bool: True when the bot's get_bid and play_card are coroutine functions.
+    """
+    return (inspect.iscoroutinefunction(bot_instance.get_bid)
+            and inspect.iscoroutinefunction(bot_instance.play_card))
+
+
+class SyncBotAdapter(object):
+    """
+    Awaitable wrapper of a bot with ordinary get_bid and play_card methods,
+    which runs them in an executor.
+    """
+
+    def __init__(self, bot_instance, executor=None):
+        """
+        Args:
+        bot_instance: The bot to wrap.
+        executor (concurrent.futures.Executor): Executor to run the bot in, None
+            for the event loop's default one.
+        """
+        self.bot_instance = bot_instance
+        self.executor = executor
+        self.name = bot_instance.name
+        # Set while a call of the bot is queued or running, also after the game has
+        # stopped waiting for it
+        self.busy = False
+
+    async def get_bid(self, **info_for_bots):
+        return await self.run(self.bot_instance.get_bid, info_for_bots)
+
+    async def play_card(self, **info_for_bots):
+        return await self.run(self.bot_instance.play_card, info_for_bots)
+
+    async def run(self, method, info_for_bots):
+        loop = asyncio.get_running_loop()
+        # Busy from the moment the call is queued, as it may wait for a thread of the
+        # executor, until it ends, even if the game stops waiting for it first
+        self.busy = True
+        future = loop.run_in_executor(self.executor, functools.partial(method, **info_for_bots))
+        future.add_done_callback(self.done)
+        # Shielded, so the game timing out doesn't mark a call still running as done
+        return await asyncio.shield(future)
+
+    def done(self, future):
+        self.busy = False
+        if not future.cancelled():
+            # Retrieved, so an error raised after the game stopped waiting isn't reported as lost
+            future.exception()
+
+    def __getattr__(self, name):
+        # Anything else, such as NE_bot's last_stats, is the wrapped bot's
+        if name == "bot_instance":
+            raise AttributeError(name)
+        return getattr(self.bot_instance, name)
+
+
+class AsyncRikiki(Rikiki):
+    """
+    Runs one full rikiki game, awaiting the bots' decisions.
+    """
+
+    def __init__(self, room=[], executor=None, **settings):
+        """
+        Args:
+        room (list): Bot modules, as for Rikiki.
+        executor (concurrent.futures.Executor): Executor to run sync bots in,
+            None for the event loop's default one.
+        settings: Any other argument of Rikiki.
+        """
+        super().__init__(room=room, **settings)
+        self.executor = executor
+        for bot in self.bots:
+            if not is_async_bot(bot["bot_instance"]):
+                bot["bot_instance"] = SyncBotAdapter(bot["bot_instance"], executor)
+
+    async def run_game(self):
+        steps = self.game_steps()
+        try:
+            request = next(steps)
+            while True:
+                try:
+                    decision = await self.call_bot(*request)
+                except Exception as e:
+                    # errors are raised in the game, which decides whether to carry on
+                    request = steps.throw(e)
+                else:
+                    request = steps.send(decision)
+        except StopIteration:
+            pass
+
+    async def call_bot(self, bot, event, info_for_bots):
+        bot_instance = bot["bot_instance"]
+        if isinstance(bot_instance, SyncBotAdapter) and bot_instance.busy:
+            raise DecisionTimeout("{} is still busy with an earlier decision".format(bot["bot_unique_id"]))
+        decision = self.bot_method(bot, event)(**info_for_bots)
+        if self.decision_timeout is None:
+            return await decision
+        try:
+            return await asyncio.wait_for(decision, self.decision_timeout)
+        except asyncio.TimeoutError:
+            raise DecisionTimeout("no {} within {} seconds".format(event, self.decision_timeout))
@@ -0,0 +1,339 @@
+"""
+Batched rikiki engine that plays many games in lockstep with NumPy.
+
+Every game in a batch plays the same rounds, so bids and tricks happen at the
+same step in every game and only who plays next differs. Hands are boolean
+arrays of shape (n_games, n_players, 52) using the card numbering of card_core
+(suit * 13 + rank), and legal cards and trick winners are worked out for all
+games at once. The rules, scoring and the last bidder restriction are the same
+as in Rikiki.
+
+Example:
+    scores = play_games(10000, [basic_bot_policy, basic_bot_v2_policy], minmax_size=[1, 5])
+
+NumPy is only needed by this module.
+"""
+import numpy as np
+
+from card_core import NO_SUIT
+
+SUIT_OF = np.arange(52) // 13
+RANK_OF = np.arange(52) % 13
+# Jacks and above, the face cards and aces counted by basic_bot_v2
+FACE_CARDS = RANK_OF >= 9
+
+
+def round_order(round_movement, minmax_size):
+    """
+    Args:
+    round_movement (str): up, down or both.
+    minmax_size (list): Smallest and largest hand sizes.
+
+    Returns:
+    list: The hand size of every round, as in Rikiki.
+    """
+    order = list(range(minmax_size[0], minmax_size[1] + 1))
+    if round_movement == 'down':
+        order.reverse()
+    elif round_movement == 'both':
+        order += order[::-1][1:]
+    return order
+
+
+class BatchRikiki(object):
+    """
+    Plays n_games games of rikiki between n_players players at once.
+
+    reset() deals the first round and returns the first observation.
+    step(actions) takes one action per game for the player whose turn it is:
+    a bid during bidding, a card (as an int) during play. It returns the next
+    observation, the points scored by every player in every game during the
+    step (only non-zero when a round ends) and whether the games are over.
+
+    Player i sits in seat i. As in Rikiki the first bidder, who also leads the
+    first trick, moves one seat on every round, and the winner of a trick
+    leads the next one.
+    """
+
+    def __init__(self, n_games, n_players, round_movement='up', minmax_size=[1, 10],
+                 hell_bridge=True, rng=None):
+        """
+        Args:
+        n_games (int): Number of games played at once.
+        n_players (int): Number of players in every game.
+        round_movement (str): up, down or both.
+        minmax_size (list): Smallest and largest hand sizes.
+        hell_bridge (bool): Whether the round of one card is a hells bridge round.
+        rng (numpy.random.Generator): Random generator for dealing, or None for a new one.
+        """
+        if n_players < 2:
+            raise TypeError("You need at least two players in a game")
+        self.n_games = n_games
+        self.n_players = n_players
+        self.round_order = round_order(round_movement, minmax_size)
+        if self.round_order and n_players * max(self.round_order) > 52:
+            raise ValueError("Not enough cards for {} players with {} cards each".format(
+                n_players, max(self.round_order)))
+        self.hell_bridge = hell_bridge
+        self.rng = np.random.default_rng() if rng is None else rng
+        self.games = np.arange(n_games)
+
+    def reset(self):
+        """
+        Start new games.
+
+        Returns:
+        dict: The first observation, see observation.
+        """
+        n_games, n_players = self.n_games, self.n_players
+        self.scores = np.zeros((n_games, n_players), dtype=np.int64)
+        self.current_round = 0
+        self.done = not self.round_order
+        if not self.done:
+            self._start_round()
+        return self.observation()
+
+    def _start_round(self):
+        n_games, n_players = self.n_games, self.n_players
+        size = self.round_order[self.current_round]
+        self.round_size = size
+
+        # Shuffle a deck for every game and deal it like Cards.deal, one card each in turn
+        decks = np.argsort(self.rng.random((n_games, 52)), axis=1)
+        dealt = decks[:, :n_players * size].reshape(n_games, size, n_players)
+        self.hands = np.zeros((n_games, n_players, 52), dtype=bool)
+        self.hands[self.games[:, None, None], np.arange(n_players)[None, None, :], dealt] = True
+        if n_players * size < 52:
+            self.trump = SUIT_OF[decks[:, n_players * size]]
+        else:
+            # if all the cards have been dealt there is no trump suit
+            self.trump = np.full(n_games, NO_SUIT)
+
+        self.first_player = self.current_round % n_players
+        self.phase = 'bid'
+        self.turn = 0
+        self.bids = np.full((n_games, n_players), -1, dtype=np.int64)
+        self.tricks_won = np.zeros((n_games, n_players), dtype=np.int64)
+        self.tricks_played = 0
+        self.leader = np.full(n_games, self.first_player)
+        self._start_trick()
+
+    def _start_trick(self):
+        self.trick = np.full((self.n_games, self.n_players), -1, dtype=np.int64)
+        self.led_suit = np.full(self.n_games, NO_SUIT)
+        self.winning_card = np.full(self.n_games, -1)
+        self.winning_player = np.full(self.n_games, -1)
+
+    def players(self):
+        """
+        Returns:
+        numpy.ndarray: The player whose turn it is in every game.
+        """
+        if self.phase == 'bid':
+            return np.full(self.n_games, (self.first_player + self.turn) % self.n_players)
+        return (self.leader + self.turn) % self.n_players
+
+    def hells_bridge_round(self):
+        return self.hell_bridge and self.round_size == 1
+
+    def legal_cards(self, players):
+        """
+        Args:
+        players (numpy.ndarray): The player to play in every game.
+
+        Returns:
+        numpy.ndarray: Boolean array of shape (n_games, 52) of the cards each
+        player may play: cards of the led suit if they have any, else any card.
+        """
+        hand = self.hands[self.games, players]
+        following = hand & (SUIT_OF[None, :] == self.led_suit[:, None])
+        can_follow = following.any(axis=1)
+        return np.where(can_follow[:, None], following, hand)
+
+    def observation(self):
+        """
+        Returns:
+        dict: What the player to move can see, one row per game:
+            phase (str): 'bid', 'play' or 'done'.
+            round_size (int): Cards per player this round.
+            player (numpy.ndarray): The player to move.
+            cards (numpy.ndarray): (n_games, 52) cards the player sees for
+                their decision: their hand, or in a hells bridge bid everyone
+                else's cards.
+            hells_bridge (bool): Whether this is a hells bridge round.
+            legal (numpy.ndarray): (n_games, 52) cards that may be played,
+                None while bidding.
+            trump (numpy.ndarray): The trump suit, NO_SUIT for none.
+            bids (numpy.ndarray): (n_games, n_players) bids so far, -1 for none.
+            tricks_won (numpy.ndarray): (n_games, n_players) tricks won this round.
+            trick (numpy.ndarray): (n_games, n_players) card played by every
+                player in the current trick, -1 for none.
+            scores (numpy.ndarray): (n_games, n_players) scores so far.
+        """
+        if self.done:
+            return {'phase': 'done', 'scores': self.scores}
+        players = self.players()
+        hells_bridge = self.hells_bridge_round()
+        if self.phase == 'bid' and hells_bridge:
+            others = np.arange(self.n_players)[None, :] != players[:, None]
+            cards = (self.hands & others[:, :, None]).any(axis=1)
+        else:
+            cards = self.hands[self.games, players]
+        return {
+            'phase': self.phase,
+            'round_size': self.round_size,
+            'player': players,
+            'cards': cards,
+            'hells_bridge': hells_bridge,
+            'legal': self.legal_cards(players) if self.phase == 'play' else None,
+            'trump': self.trump,
+            'bids': self.bids,
+            'tricks_won': self.tricks_won,
+            'trick': self.trick,
+            'scores': self.scores,
+        }
+
+    def step(self, actions):
+        """
+        Args:
+        actions (numpy.ndarray): A bid or card for the player to move in every game.
+
+        Returns:
+        tuple: The next observation, the points scored in the step with shape
+        (n_games, n_players), and whether the games are over.
+        """
+        if self.done:
+            raise RuntimeError("The games are over, call reset to start new ones")
+        actions = np.asarray(actions, dtype=np.int64).reshape(self.n_games)
+        rewards = np.zeros((self.n_games, self.n_players), dtype=np.int64)
+        if self.phase == 'bid':
+            self._bid(actions)
+        else:
+            self._play(actions, rewards)
+        return self.observation(), rewards, self.done
+
+    def _bid(self, actions):
+        player = (self.first_player + self.turn) % self.n_players
+        if self.turn == self.n_players - 1:
+            # the last bot to bid can't make the bids add up to the number of cards
+            total = np.where(self.bids >= 0, self.bids, 0).sum(axis=1)
+            actions = np.where(total + actions == self.round_size,
+                               self.round_size + 1 - total, actions)
+        self.bids[:, player] = actions
+        self.turn += 1
+        if self.turn == self.n_players:
+            self.phase = 'play'
+            self.turn = 0
+
+    def _play(self, actions, rewards):
+        games = self.games
+        players = self.players()
+        if self.hells_bridge_round():
+            # the only card is played for the player, as in Rikiki
+            actions = self.hands[games, players].argmax(axis=1)
+
+        in_hand = (actions >= 0) & (actions < 52)
+        in_hand[in_hand] = self.hands[games[in_hand], players[in_hand], actions[in_hand]]
+        if not in_hand.all():
+            game = int(np.flatnonzero(~in_hand)[0])
+            raise ValueError("Player {} played {} in game {}, which is not in their hand".format(
+                players[game], actions[game], game))
+        self.hands[games, players, actions] = False
+        self.trick[games, players] = actions
+
+        suits = SUIT_OF[actions]
+        if self.turn == 0:
+            self.led_suit = suits
+            self.winning_card = actions
+            self.winning_player = players
+        else:
+            winning_suits = SUIT_OF[self.winning_card]
+            beats = np.where(suits == winning_suits, actions > self.winning_card,
+                             suits == self.trump)
+            self.winning_card = np.where(beats, actions, self.winning_card)
+            self.winning_player = np.where(beats, players, self.winning_player)
+
+        self.turn += 1
+        if self.turn < self.n_players:
+            return
+        self.tricks_won[games, self.winning_player] += 1
+        self.leader = self.winning_player
+        self.turn = 0
+        self.tricks_played += 1
+        self._start_trick()
+        if self.tricks_played < self.round_size:
+            return
+
+        exact = self.tricks_won == self.bids
+        rewards += np.where(exact, 10 + 2 * self.bids, -2 * np.abs(self.tricks_won - self.bids))
+        self.scores += rewards
+        self.current_round += 1
+        if self.current_round == len(self.round_order):
+            self.done = True
+        else:
+            self._start_round()
+
+
+def random_legal_cards(legal, rng):
+    """
+    Args:
+    legal (numpy.ndarray): (n_games, 52) cards that may be played.
+    rng (numpy.random.Generator): Random generator.
+
+    Returns:
+    numpy.ndarray: A card picked uniformly from the legal cards of every game.
+    """
+    weights = rng.random(legal.shape)
+    weights[~legal] = -1
+    return weights.argmax(axis=1)
+
+
+def basic_bot_policy(observation, rng):
+    # Vectorised basic_bot: bids 1 and plays a random valid card
+    if observation['phase'] == 'bid':
+        return np.ones(len(observation['player']), dtype=np.int64)
+    return random_legal_cards(observation['legal'], rng)
+
+
+def basic_bot_v2_policy(observation, rng):
+    # Vectorised basic_bot_v2: bids the number of trumps plus the number of face cards and aces
+    # that are not trumps, at most the number of cards in a hand, and plays a random valid card
+    if observation['phase'] != 'bid':
+        return random_legal_cards(observation['legal'], rng)
+    cards = observation['cards']
+    trumps = SUIT_OF[None, :] == observation['trump'][:, None]
+    bids = (cards & trumps).sum(axis=1) + (cards & ~trumps & FACE_CARDS[None, :]).sum(axis=1)
+    return np.minimum(np.minimum(bids, cards.sum(axis=1)), observation['round_size'])
+
+
+def play_games(n_games, policies, round_movement='up', minmax_size=[1, 10], hell_bridge=True,
+               seed=None):
+    """
+    Play games between vectorised policies.
+
+    Args:
+    n_games (int): Number of games.
+    policies (list): One function per seat taking an observation and a
+        random generator and returning an action for every game.
+    round_movement (str): up, down or both.
+    minmax_size (list): Smallest and largest hand sizes.
+    hell_bridge (bool): Whether the round of one card is a hells bridge round.
+    seed (int): Seed for the deals and the policies.
+
+    Returns:
+    numpy.ndarray: The final scores, shape (n_games, len(policies)).
+    """
+    rng = np.random.default_rng(seed)
+    engine = BatchRikiki(n_games, len(policies), round_movement=round_movement,
+                         minmax_size=minmax_size, hell_bridge=hell_bridge, rng=rng)
+    observation = engine.reset()
+    done = engine.done
+    while not done:
+        players = observation['player']
+        actions = np.zeros(n_games, dtype=np.int64)
+        for seat, policy in enumerate(policies):
+            acting = players == seat
+            if acting.any():
+                actions = np.where(acting, policy(observation, rng), actions)
+        observation, _, done = engine.step(actions)
+    return engine.scores
@@ -0,0 +1,302 @@
+"""
+Benchmarks of the NE solvers and the game engine.
+
+Every benchmark is run for every hand size and number of players on a deal
+fixed by the seed, and reports the best wall time over a few runs, the number
+of nodes searched (tree nodes for the tree functions, positions searched for
+the solvers, none for a game) and the peak memory allocated during one run.
+
+Example:
+    python benchmark.py --output baseline.json
+    python benchmark.py --compare baseline.json
+
+Runs are repeated with the same random state, so node counts only change when
+the code does. A comparison flags any growth in nodes and any growth in time or
+peak memory beyond the tolerance.
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from cards import Cards
+from rikiki import Rikiki
+from NE_bid_bot import create_full_tree, find_bid, find_nash_bids, solve_nash_bids
+from NE_card_bot import find_best_action_overall, find_nash_scores
+from bots import basic_bot_v2
+
+RESULT_FIELDS = ["benchmark", "players", "hand_size", "seconds", "nodes", "peak_bytes"]
+
+# Differences in time smaller than this are noise, whatever the tolerance
+MIN_SECONDS = 1e-3
+
+
+def root_properties(n_players):
+    # Root of a round before the first card, as set up by NE_bot
+    return {
+        'name': 'root',
+        'score': [0] * n_players,
+        'trick_end': 1,
+        'player_id': n_players - 1,
+        'starting_suit': '',
+        'depth': 0,
+        'cards_played_in_trick': [],
+        'previous_trick_winner': 0,
+        'cards_played': [],
+        'minmax_score': []
+    }
+
+
+def deal(n_players, hand_size):
+    hands = Cards()
+    hands.shuffle()
+    hands.deal(n_players, hand_size)
+    return hands
+
+
+def round_bids(n_players, hand_size, hands):
+    # Nash equilibrium trick counts of the deal, with the last bid changed as Rikiki
+    # does so that the bids don't add up to the number of cards
+    bids = solve_nash_bids(n_players * hand_size, n_players, hands, hands.trump,
+                           root_properties(n_players))
+    if sum(bids) == hand_size:
+        bids[-1] += 1
+    return bids
+
+
+def bench_create_full_tree(n_players, hand_size, nreps, mode):
+    hands = deal(n_players, hand_size)
+
+    def run():
+        tree = create_full_tree(n_players * hand_size, n_players, hands, hands.trump,
+                                root_properties(n_players), memoize='bids')
+        return len(tree.postorder)
+    return run
+
+
+def bench_find_nash_bids(n_players, hand_size, nreps, mode):
+    hands = deal(n_players, hand_size)
+    tree = create_full_tree(n_players * hand_size, n_players, hands, hands.trump,
+                            root_properties(n_players), memoize='bids')
+
+    def run():
+        find_nash_bids(tree)
+        return len(tree.postorder)
+    return run
+
+
+def bench_find_nash_scores(n_players, hand_size, nreps, mode):
+    hands = deal(n_players, hand_size)
+    bids = round_bids(n_players, hand_size, hands)
+    tree = create_full_tree(n_players * hand_size, n_players, hands, hands.trump,
+                            root_properties(n_players), memoize='scores')
+
+    def run():
+        find_nash_scores(tree, bids)
+        return len(tree.postorder)
+    return run
+
+
+def bench_find_bid(n_players, hand_size, nreps, mode):
+    # The first bid of the round
+    hands = deal(n_players, hand_size)
+
+    def run():
+        stats = {}
+        find_bid(hands.hands[0], [''] * n_players, hands.trump, 0, root_properties(n_players),
+                 nreps=nreps, mode=mode, stats=stats)
+        return stats.get('nodes', 0)
+    return run
+
+
+def bench_find_best_action_overall(n_players, hand_size, nreps, mode):
+    # The first card of the round, once everyone has bid
+    hands = deal(n_players, hand_size)
+    bids = round_bids(n_players, hand_size, hands)
+    bots = [{'bot_name': 'NE_bot', 'bot_unique_id': 'NE_bot-{}'.format(position + 1),
+             'hands_won': 0, 'aim_hands_won': bid, 'score': 0, 'start_pos': position,
+             'card_played': ''}
+            for position, bid in enumerate(bids)]
+
+    def run():
+        stats = {}
+        find_best_action_overall(hands.hands[0], hands.trump, root_properties(n_players), [{}],
+                                 bots[0], bots, nreps=nreps, mode=mode, stats=stats)
+        return stats.get('nodes', 0)
+    return run
+
+
+def bench_run_game(n_players, hand_size, nreps, mode):
+    # A game of basic_bot_v2 bots with rounds of one card up to hand_size cards
+    game = Rikiki(room=[basic_bot_v2] * n_players, minmax_size=[1, hand_size])
+
+    def run():
+        game.reset()
+        game.run_game()
+        return None
+    return run
+
+
+BENCHMARKS = {
+    "create_full_tree": bench_create_full_tree,
+    "find_nash_bids": bench_find_nash_bids,
+    "find_nash_scores": bench_find_nash_scores,
+    "find_bid": bench_find_bid,
+    "find_best_action_overall": bench_find_best_action_overall,
+    "run_game": bench_run_game,
+}
+
+
+def measure(benchmark, n_players, hand_size, seed, repeat=3, nreps=10, mode='exact'):
+    """
+    Args:
+    benchmark (str): Name of a benchmark in BENCHMARKS.
+    n_players (int): Number of players.
+    hand_size (int): Number of cards per player.
+    seed (int): Seed of the benchmarks, the deal depends on it, n_players and hand_size.
+    repeat (int): Number of timed runs.
+    nreps (int): Number of Monte Carlo simulations of find_bid and find_best_action_overall.
+    mode (str): Search mode of the solvers, see NE_solver.NashSolver.
+
+    Returns:
+    dict: The result, see RESULT_FIELDS.
+    """
+    case_seed = "{}-{}-{}".format(seed, n_players, hand_size)
+    random.seed(case_seed)
+    run = BENCHMARKS[benchmark](n_players, hand_size, nreps, mode)
+
+    times = []
+    for _ in range(repeat):
+        random.seed(case_seed)
+        start = time.perf_counter()
+        nodes = run()
+        times.append(time.perf_counter() - start)
+
+    # Memory is measured on a separate run as tracing slows everything down
+    random.seed(case_seed)
+    tracemalloc.start()
+    try:
+        run()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"benchmark": benchmark, "players": n_players, "hand_size": hand_size,
+            "seconds": min(times), "nodes": nodes, "peak_bytes": peak}
+
+
+def run_benchmarks(benchmarks=None, hand_sizes=range(1, 8), players=range(2, 6), max_cards=28,
+                   seed=0, repeat=3, nreps=10, mode='exact', progress=None):
+    """
+    Args:
+    benchmarks (list): Names of benchmarks, None for all of them.
+    hand_sizes (iterable): Hand sizes to run every benchmark with.
+    players (iterable): Numbers of players to run every benchmark with.
+    max_cards (int): Cases that deal more cards than this are skipped, None to run all.
+    seed (int): Seed of the benchmarks.
+    repeat (int): Number of timed runs of every case.
+    nreps (int): Number of Monte Carlo simulations of the sampling benchmarks.
+    mode (str): Search mode of the solvers.
+    progress (function): Called with every result as it is measured, or None.
+
+    Returns:
+    dict: The settings, a description of the machine and the list of results.
+    """
+    benchmarks = list(BENCHMARKS) if benchmarks is None else benchmarks
+    settings = {"benchmarks": benchmarks, "hand_sizes": list(hand_sizes),
+                "players": list(players), "max_cards": max_cards, "seed": seed,
+                "repeat": repeat, "nreps": nreps, "mode": mode}
+    results = []
+    for benchmark in benchmarks:
+        for n_players in settings["players"]:
+            for hand_size in settings["hand_sizes"]:
+                if max_cards is not None and n_players * hand_size > max_cards:
+                    continue
+                result = measure(benchmark, n_players, hand_size, seed, repeat=repeat,
+                                 nreps=nreps, mode=mode)
+                results.append(result)
+                if progress is not None:
+                    progress(result)
+    machine = {"python": platform.python_version(), "platform": platform.platform()}
+    return {"settings": settings, "machine": machine, "results": results}
+
+
+def compare(baseline, current, tolerance=0.2):
+    """
+    Args:
+    baseline (dict): Saved output of run_benchmarks.
+    current (dict): Output of run_benchmarks to check.
+    tolerance (float): Allowed relative growth in time and peak memory.
+
+    Returns:
+    list: (result, field, baseline value, current value) for every regression.
+    Node counts are deterministic, so any growth is a regression.
+    """
+    saved = {(result["benchmark"], result["players"], result["hand_size"]): result
+             for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        old = saved.get((result["benchmark"], result["players"], result["hand_size"]))
+        if old is None:
+            continue
+        if result["nodes"] is not None and old["nodes"] is not None and result["nodes"] > old["nodes"]:
+            regressions.append((result, "nodes", old["nodes"], result["nodes"]))
+        if (result["seconds"] > old["seconds"] * (1 + tolerance)
+                and result["seconds"] - old["seconds"] > MIN_SECONDS):
+            regressions.append((result, "seconds", old["seconds"], result["seconds"]))
+        if result["peak_bytes"] > old["peak_bytes"] * (1 + tolerance):
+            regressions.append((result, "peak_bytes", old["peak_bytes"], result["peak_bytes"]))
+    return regressions
+
+
+def print_result(result):
+    nodes = "" if result["nodes"] is None else result["nodes"]
+    print("{:<26} {:>7} {:>9} {:>12.6f} {:>10} {:>12}".format(
+        result["benchmark"], result["players"], result["hand_size"], result["seconds"], nodes,
+        result["peak_bytes"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the NE solvers and the game engine.")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), default=None)
+    parser.add_argument("--hand-sizes", type=int, nargs=2, default=[1, 7], metavar=("MIN", "MAX"))
+    parser.add_argument("--players", type=int, nargs=2, default=[2, 5], metavar=("MIN", "MAX"))
+    parser.add_argument("--max-cards", type=int, default=28,
+                        help="skip cases dealing more cards than this, 35 runs the whole grid")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--nreps", type=int, default=10)
+    parser.add_argument("--mode", default="exact", choices=["exact", "pruned", "paranoid"])
+    parser.add_argument("--output", default=None, help="json file to save the results to")
+    parser.add_argument("--compare", default=None, help="json file of baseline results")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    print("{:<26} {:>7} {:>9} {:>12} {:>10} {:>12}".format(*RESULT_FIELDS))
+    output = run_benchmarks(args.benchmarks, range(args.hand_sizes[0], args.hand_sizes[1] + 1),
+                            range(args.players[0], args.players[1] + 1), max_cards=args.max_cards,
+                            seed=args.seed, repeat=args.repeat, nreps=args.nreps, mode=args.mode,
+                            progress=print_result)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(output, output_file, indent=1)
+
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        if baseline["settings"] != output["settings"]:
+            print("\nWarning: the baseline was run with different settings")
+        regressions = compare(baseline, output, tolerance=args.tolerance)
+        print("\n{} regressions against {}".format(len(regressions), args.compare))
+        for result, field, old, new in regressions:
+            print("{} players={} hand_size={}: {} {} -> {}".format(
+                result["benchmark"], result["players"], result["hand_size"], field, old, new))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
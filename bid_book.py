@@ -0,0 +1,290 @@
+"""
+Precomputed bids of NE_bot for small hands, served from a memory-mapped file.
+
+A bidding situation is the bidder's hand, the trump suit, the bids made before
+them and the number of players. Suits other than trumps are interchangeable,
+so situations are keyed on the ranks held in trumps and the sorted ranks held
+in the other suits (see bidding_key), and a book covers every hand up to
+relabelling.
+
+The book is an open-addressing hash table: a header followed by fixed-width
+slots holding a 64-bit digest of the key and the number of simulations that
+ended in every bid, as returned by find_bid. Looking a situation up reads one
+or two slots of the mapped file, which the operating system shares between
+processes.
+
+Example:
+    python bid_book.py --hand-sizes 1 3 --players 2 4 --output bids.book
+    bot = NE_bot.Bot(bid_book=BidBook("bids.book"))
+"""
+import argparse
+import hashlib
+import itertools
+import mmap
+import os
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+from card_core import NO_SUIT, RANKS, SUITS, cards_to_mask, suit_to_int
+from NE_bid_bot import find_bid
+
+MAGIC = b"RKBB"
+VERSION = 1
+# magic, version, largest bid, number of slots, number of entries
+HEADER = struct.Struct("<4sBBQQ")
+EMPTY = 0
+
+
+def bidding_key(hand, previous_bids, trump):
+    """
+    Args:
+    hand (list): The bidder's cards.
+    previous_bids (list): The bids of every player in bidding order, '' for
+        those who have not bid yet.
+    trump (str): The trump suit.
+
+    Returns:
+    tuple: The number of players, the hand size, the bids made so far, the
+    ranks held in trumps (-1 without trumps) and the sorted ranks held in the
+    other suits, ranks as 13-bit masks.
+    """
+    mask = cards_to_mask(hand)
+    trump = suit_to_int(trump)
+    suits = [(mask >> (13 * suit)) & 0x1fff for suit in range(4)]
+    position = sum(bid != '' for bid in previous_bids)
+    return (len(previous_bids), len(hand), tuple(previous_bids[:position]),
+            suits[trump] if trump != NO_SUIT else -1,
+            tuple(sorted(suits[suit] for suit in range(4) if suit != trump)))
+
+
+def key_digest(key):
+    # 64-bit digest of a bidding key, never EMPTY
+    digest = int.from_bytes(hashlib.blake2b(repr(key).encode(), digest_size=8).digest(), "little")
+    return digest or 1
+
+
+def _rank_masks(count):
+    return [sum(1 << rank for rank in ranks) for ranks in itertools.combinations(range(13), count)]
+
+
+def _partitions(total, parts, largest):
+    # Non-increasing splits of total cards over a number of suits
+    if parts == 0:
+        if total == 0:
+            yield ()
+        return
+    for count in range(min(total, largest), -1, -1):
+        for rest in _partitions(total - count, parts - 1, count):
+            yield (count,) + rest
+
+
+def canonical_hands(hand_size):
+    """
+    Args:
+    hand_size (int): Number of cards in the hand.
+
+    Returns:
+    list: One hand of every class of hands equal up to relabelling the suits
+    other than trumps, with trumps in the first suit ('H').
+    """
+    classes = set()
+    for trumps in range(hand_size + 1):
+        for trump_ranks in _rank_masks(trumps):
+            for split in _partitions(hand_size - trumps, 3, hand_size - trumps):
+                for others in itertools.product(*[_rank_masks(count) for count in split]):
+                    classes.add((trump_ranks,) + tuple(sorted(others)))
+    hands = []
+    for ranks in sorted(classes):
+        hands.append([RANKS[rank] + SUITS[suit] for suit, suit_ranks in enumerate(ranks)
+                      for rank in range(13) if suit_ranks >> rank & 1])
+    return hands
+
+
+def bidding_situations(hand_size, n_players, positions=None):
+    """
+    Args:
+    hand_size (int): Number of cards per player.
+    n_players (int): Number of players.
+    positions (list): Bidding positions to cover, None for all of them.
+
+    Returns:
+    generator: Every (hand, previous bids) situation, with trumps in 'H'.
+    """
+    positions = range(n_players) if positions is None else positions
+    hands = canonical_hands(hand_size)
+    for position in positions:
+        for bids in itertools.product(range(hand_size + 1), repeat=position):
+            previous_bids = list(bids) + [''] * (n_players - position)
+            for hand in hands:
+                yield hand, previous_bids
+
+
+def _solve_situation(arguments):
+    hand, previous_bids, nreps, p, mode, seed = arguments
+    key = bidding_key(hand, previous_bids, SUITS[0])
+    n_players = len(previous_bids)
+    root_properties = {
+        'name': 'root',
+        'score': [0] * n_players,
+        'trick_end': 1,
+        'player_id': n_players - 1,
+        'starting_suit': '',
+        'depth': 0,
+        'cards_played_in_trick': [],
+        'previous_trick_winner': 0,
+        'cards_played': [],
+        'minmax_score': []
+    }
+    # The bidder's seat is their bidding position
+    counts = find_bid(hand, previous_bids, SUITS[0], len(key[2]), root_properties, p=p,
+                      nreps=nreps, seed=(seed + key_digest(key)) % (1 << 64), mode=mode)
+    return key, counts
+
+
+def build_book(path, hand_sizes=range(1, 4), player_counts=range(2, 5), positions=None,
+               nreps=1000, p=0.2, mode='exact', seed=0, workers=1, progress=None):
+    """
+    Run find_bid on every bidding situation and write the results to a book.
+
+    Args:
+    path (str): File to write the book to.
+    hand_sizes (iterable): Hand sizes to cover.
+    player_counts (iterable): Numbers of players to cover.
+    positions (list): Bidding positions to cover, None for all of them.
+    nreps (int): Number of Monte Carlo simulations per situation.
+    p (float): Probability for bid modification, see find_bid.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    seed (int): Seed of the simulations, every situation gets its own stream.
+    workers (int): Number of worker processes.
+    progress (function): Called with the number of situations solved so far, or None.
+
+    Returns:
+    int: The number of situations in the book.
+    """
+    situations = [(hand, previous_bids, nreps, p, mode, seed)
+                  for hand_size in hand_sizes for n_players in player_counts
+                  if n_players * hand_size < 52
+                  for hand, previous_bids in bidding_situations(hand_size, n_players, positions)]
+    entries = {}
+    if workers == 1:
+        results = map(_solve_situation, situations)
+        executor = None
+    else:
+        executor = ProcessPoolExecutor(max_workers=workers)
+        results = executor.map(_solve_situation, situations, chunksize=16)
+    try:
+        for key, counts in results:
+            entries[key] = counts
+            if progress is not None:
+                progress(len(entries))
+    finally:
+        if executor is not None:
+            executor.shutdown()
+    write_book(path, entries)
+    return len(entries)
+
+
+def write_book(path, entries):
+    """
+    Args:
+    path (str): File to write the book to.
+    entries (dict): Bid frequencies, as returned by find_bid, keyed by bidding_key.
+    """
+    max_bid = max((key[1] for key in entries), default=0)
+    slot = struct.Struct("<Q{}I".format(max_bid + 1))
+    # At most half the slots are used, so probe sequences stay short
+    n_slots = 1
+    while n_slots < 2 * len(entries):
+        n_slots *= 2
+    table = bytearray(HEADER.size + n_slots * slot.size)
+    HEADER.pack_into(table, 0, MAGIC, VERSION, max_bid, n_slots, len(entries))
+    for key, counts in entries.items():
+        digest = key_digest(key)
+        index = digest % n_slots
+        while slot.unpack_from(table, HEADER.size + index * slot.size)[0] != EMPTY:
+            index = (index + 1) % n_slots
+        slot.pack_into(table, HEADER.size + index * slot.size, digest,
+                       *[counts.get(bid, 0) for bid in range(max_bid + 1)])
+    with open(path, "wb") as book_file:
+        book_file.write(table)
+
+
+class BidBook(object):
+    """
+    Read-only view of a book written by build_book.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+        path (str): File the book was written to.
+        """
+        self.path = path
+        with open(path, "rb") as book_file:
+            self.table = mmap.mmap(book_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.max_bid, self.n_slots, self.n_entries = HEADER.unpack_from(self.table)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError("{} is not a version {} bid book".format(path, VERSION))
+        self.slot = struct.Struct("<Q{}I".format(self.max_bid + 1))
+
+    def lookup(self, hand, previous_bids, trump):
+        """
+        Args:
+        hand (list): The bidder's cards.
+        previous_bids (list): The bids of every player in bidding order, '' for
+            those who have not bid yet.
+        trump (str): The trump suit.
+
+        Returns:
+        dict: The bid frequencies of the situation, as returned by find_bid, or
+        None if the book does not cover it.
+        """
+        if len(hand) > self.max_bid or not self.n_entries:
+            return None
+        digest = key_digest(bidding_key(hand, previous_bids, trump))
+        index = digest % self.n_slots
+        while True:
+            entry = self.slot.unpack_from(self.table, HEADER.size + index * self.slot.size)
+            if entry[0] == digest:
+                return {bid: count for bid, count in enumerate(entry[1:]) if count}
+            if entry[0] == EMPTY:
+                return None
+            index = (index + 1) % self.n_slots
+
+    def close(self):
+        self.table.close()
+
+    def __getstate__(self):
+        # The mapping is reopened from the file when a book is sent to another process
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a book of NE_bot bids for small hands.")
+    parser.add_argument("--hand-sizes", type=int, nargs=2, default=[1, 3], metavar=("MIN", "MAX"))
+    parser.add_argument("--players", type=int, nargs=2, default=[2, 4], metavar=("MIN", "MAX"))
+    parser.add_argument("--positions", type=int, nargs="+", default=None,
+                        help="bidding positions to cover, all by default")
+    parser.add_argument("--nreps", type=int, default=1000)
+    parser.add_argument("--mode", default="exact", choices=["exact", "pruned", "paranoid"])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--output", default="bids.book")
+    args = parser.parse_args()
+
+    def progress(solved):
+        if solved % 1000 == 0:
+            print("{} situations solved".format(solved))
+
+    count = build_book(args.output, range(args.hand_sizes[0], args.hand_sizes[1] + 1),
+                       range(args.players[0], args.players[1] + 1), positions=args.positions,
+                       nreps=args.nreps, mode=args.mode, seed=args.seed, workers=args.workers,
+                       progress=progress)
+    print("{} situations written to {}".format(count, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,8 @@
 from NE_bid_bot import find_bid
 from NE_card_bot import find_best_action_overall
+from exact_deals import exact_actions, exact_bid, hells_bridge_bid
+from particle_belief import ParticleBelief
+from solve_cache import process_cache
 import random
 
 
@@ -10,11 +13,112 @@ class Bot(object):
     Uses a Monte Carlo method to simulate lots of possible hands to get a bid.
     """
 
-    def __init__(self):
+    def __init__(self, executor=None, deadline_s=None, solver_mode='exact',
+                 paranoid_hand_size=None, solve_cache=None, bid_book=None,
+                 reuse_search=True, particles=None, exact_cards=None, stratify=False):
         """
         Initialize the Nash Equilibrium bot.
+
+        Args:
+        executor (concurrent.futures.Executor): Optional executor, e.g. a
+            ProcessPoolExecutor, to spread the Monte Carlo simulations over.
+        deadline_s (float): Optional time budget in seconds for each bid and
+            card, the best answer found within it is used.
+        solver_mode (str): Search mode of the solver, see NE_solver.NashSolver.
+        paranoid_hand_size (int): Rounds with at least this many cards use the
+            paranoid search whatever solver_mode is, None to never switch.
+        solve_cache (dict): Optional cache of solves keyed by canonical
+            position, shared by every decision of the bot. A file name opens
+            a persistent solve_cache.SolveCache, shared by the bots of the
+            process. With a ProcessPoolExecutor, open it in the workers with
+            solve_cache.init_worker as the pool's initializer.
+        bid_book (bid_book.BidBook): Optional book of precomputed bids, looked
+            up before searching.
+        reuse_search (bool): Keep the solver's memo tables from one card to the
+            next within a round, so later tricks reuse the positions solved for
+            the earlier ones.
+        particles (int): Number of weighted deals to keep per round as the
+            belief about the other hands (see particle_belief.ParticleBelief),
+            None to draw new deals for every card. The particles are solved in
+            this process, executor then only applies to bids. The belief keeps
+            memo tables for its particles even without reuse_search.
+        exact_cards (int): Bids and cards are worked out over every deal (see
+            exact_deals) when the other players hold at most this many unknown
+            cards in all, and the hells bridge bid from the other players'
+            cards. None to always sample and bid 1 in the hells bridge round.
+        stratify (bool): Spread the Monte Carlo simulations over the number of
+            trumps each opponent holds, for steadier answers from fewer
+            simulations (see NE_bid_bot.stratified_splits).
         """
         self.name = "NE_bot"
+        self.executor = executor
+        self.deadline_s = deadline_s
+        self.solver_mode = solver_mode
+        self.paranoid_hand_size = paranoid_hand_size
+        if isinstance(solve_cache, str):
+            solve_cache = process_cache(solve_cache)
+        self.solve_cache = solve_cache
+        self.bid_book = bid_book
+        self.reuse_search = reuse_search
+        self.particles = particles
+        self.exact_cards = exact_cards
+        self.stratify = stratify
+        # Memo tables and belief of the current round, and the cards played when
+        # they were last used
+        self.round_search = None
+        # Samples drawn and accepted, solves, positions searched and solve time
+        # for the last bid or card, read by the game's instrumentation
+        self.last_stats = {}
+
+    def get_solver_mode(self, current_round_size):
+        """
+        Args:
+        current_round_size (int): The number of cards in the current round.
+
+        Returns:
+        str: The search mode to use for the round.
+        """
+        if self.paranoid_hand_size is not None and current_round_size >= self.paranoid_hand_size:
+            return 'paranoid'
+        return self.solver_mode
+
+    def round_state(self, current_round_size, bots, trump, history):
+        """
+        Find the search state kept for the current round.
+
+        The state is kept while the cards played carry on from the previous
+        call with the same bids, and starts afresh otherwise, e.g. in a new round.
+
+        Args:
+        current_round_size (int): The number of cards in the current round.
+        bots (list): List of all bots in the game.
+        trump (str): The trump suit.
+        history (list): History of played cards.
+
+        Returns:
+        dict: The memo tables of the round's searches as tables and its
+        ParticleBelief, None until the first one is needed, as belief.
+        """
+        round_key = (current_round_size, trump,
+                     tuple(sorted((bot['bot_unique_id'], bot['aim_hands_won']) for bot in bots)))
+        played = [card for trick in history for card in trick.values()]
+        search = self.round_search
+        if search is None or search['round'] != round_key or \
+                played[:len(search['played'])] != search['played']:
+            search = self.round_search = {'round': round_key, 'tables': {}, 'belief': None}
+        search['played'] = played
+        return search
+
+    def use_exact(self, unknown_cards):
+        """
+        Args:
+        unknown_cards (int): Number of cards the other players hold that the
+            bot has not seen.
+
+        Returns:
+        bool: Whether to work over every deal rather than sample.
+        """
+        return self.exact_cards is not None and unknown_cards <= self.exact_cards
 
     def get_bid(self, current_round_size, bots, trump, cards,
                 hells_bridge, my_bot_details):
@@ -32,6 +136,7 @@ class Bot(object):
         Returns:
         int: The optimal bid for the current hand.
         """
+        self.last_stats = {}
         # Extract the bids made by other bots
         aim_hands_win_list = [bot['aim_hands_won'] for bot in bots]
         
@@ -53,17 +158,40 @@ class Bot(object):
                 'minmax_score': []
             }
             
-            # Use Monte Carlo simulation to find the optimal bid
-            element_count = find_bid(cards, aim_hands_win_list, trump,
-                                     my_bot_details["start_pos"],
-                                     root_properties)
-            
+            element_count = None
+            if self.use_exact(current_round_size * (n_players - 1)):
+                element_count = exact_bid(cards, aim_hands_win_list, trump,
+                                          my_bot_details["start_pos"], root_properties,
+                                          mode=self.get_solver_mode(current_round_size),
+                                          stats=self.last_stats, cache=self.solve_cache)
+            elif self.bid_book is not None:
+                element_count = self.bid_book.lookup(cards, aim_hands_win_list, trump)
+
+            if element_count is None:
+                # Use Monte Carlo simulation to find the optimal bid
+                element_count = find_bid(cards, aim_hands_win_list, trump,
+                                         my_bot_details["start_pos"],
+                                         root_properties, executor=self.executor,
+                                         deadline_s=self.deadline_s,
+                                         mode=self.get_solver_mode(current_round_size),
+                                         stats=self.last_stats, cache=self.solve_cache,
+                                         stratify=self.stratify)
+
+            if not element_count:
+                # No simulation was consistent with the bids so far
+                return 1
+
             # Choose the most common bid from the simulations
             most_common_bid = max(element_count, key=element_count.get)
             return most_common_bid
-        else:
+        elif self.exact_cards is None:
             # In Hells Bridge mode, always bid 1
             return 1
+        else:
+            # In Hells Bridge mode the cards are everyone else's, so the
+            # chance of winning the trick can be worked out exactly
+            expected_scores = hells_bridge_bid(cards, bots, my_bot_details, trump)
+            return max(expected_scores, key=expected_scores.get)
     
     def play_card(self, current_round_size, bots, trump, cards, history,
                   total_bid, valid_cards, my_bot_details):
@@ -83,6 +211,7 @@ class Bot(object):
         Returns:
         str: The card to play.
         """
+        self.last_stats = {}
         # If there's only one valid card, play it
         if len(valid_cards) == 1:
             return valid_cards[0]
@@ -103,11 +232,36 @@ class Bot(object):
                 'minmax_score': []
             }
             
-            # Use Monte Carlo simulation to find the best action
-            action_dictionary = find_best_action_overall(
-                cards, trump, bidtree_root_properties, history,
-                my_bot_details, bots
-            )
+            mode = self.get_solver_mode(current_round_size)
+            search = self.round_state(current_round_size, bots, trump, history)
+            tables = search['tables'] if self.reuse_search else None
+
+            played = sum(len(trick) for trick in history)
+            unknown_cards = current_round_size * (n_players - 1) - \
+                (played - (current_round_size - len(cards)))
+            if self.use_exact(unknown_cards):
+                # Few enough deals to score the cards over all of them
+                action_dictionary = exact_actions(
+                    cards, trump, bidtree_root_properties, history, my_bot_details, bots,
+                    mode=mode, stats=self.last_stats, cache=self.solve_cache, tables=tables)
+            elif self.particles:
+                # Score the cards over the deals kept for the round
+                if search['belief'] is None:
+                    search['belief'] = ParticleBelief(
+                        trump, bidtree_root_properties, n_particles=self.particles, mode=mode,
+                        cache=self.solve_cache, tables=tables)
+                action_dictionary = search['belief'].action_scores(
+                    cards, history, my_bot_details, bots, stats=self.last_stats,
+                    deadline_s=self.deadline_s)
+            else:
+                # Use Monte Carlo simulation to find the best action
+                action_dictionary = find_best_action_overall(
+                    cards, trump, bidtree_root_properties, history,
+                    my_bot_details, bots, executor=self.executor,
+                    deadline_s=self.deadline_s, mode=mode,
+                    stats=self.last_stats, cache=self.solve_cache, tables=tables,
+                    stratify=self.stratify
+                )
             
             if action_dictionary is None:
                 # If no simulations were appropriate, choose a random valid card
@@ -16,7 +16,9 @@ class Bot(object):
         values = {"2":2, "3":3, "4":4, "5":5, "6":6, "7":7, "8":8, "9":9, "10":10, "J":11, "Q":12, "K":13, "A":14}
 
         bid_number=sum([suit==trump for suit in card_suits])+sum([values[card]>10 for card in card_values])
-        return min(bid_number,len(cards))
+        # in the hells bridge round the cards are the other bots' cards, so the bid is
+        # also kept to the number of cards in a hand
+        return min(bid_number,len(cards),current_round_size)
     
     def play_card(self, current_round_size, bots, trump, cards, history, total_bid, valid_cards, my_bot_details):
         return random.choice(valid_cards)
\ No newline at end of file
@@ -0,0 +1,197 @@
+"""
+Integer and bitmask representation of cards.
+
+A card is an int from 0 to 51, equal to suit * 13 + rank, where rank 0 is a two
+and rank 12 is an ace. A set of cards (a hand, the cards played so far, ...) is
+a 52-bit int with bit c set when card c is in the set. Every suit occupies a
+contiguous block of 13 bits, so follow-suit checks and "can this card be beaten"
+tests are single mask operations.
+
+Strings such as '10H' are only used at the bot API boundary.
+"""
+
+# suits are labelled according to the first letter in the suit of a standard deck of cards
+SUITS = ('H', 'S', 'C', 'D')
+RANKS = ('2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K', 'A')
+
+# No trump suit (all cards have been dealt) or no card led yet
+NO_SUIT = -1
+
+SUIT_INDEX = {suit: index for index, suit in enumerate(SUITS)}
+SUIT_MASKS = tuple(((1 << 13) - 1) << (13 * suit) for suit in range(4))
+FULL_DECK_MASK = (1 << 52) - 1
+
+CARD_NAMES = tuple(rank + suit for suit in SUITS for rank in RANKS)
+CARD_INDEX = {name: card for card, name in enumerate(CARD_NAMES)}
+
+# Cards of the same suit that rank above each card
+HIGHER_MASKS = tuple(SUIT_MASKS[card // 13] & ~((2 << card) - 1) for card in range(52))
+
+
+def card_to_int(card):
+    """
+    Args:
+    card (str): A card such as '10H'.
+
+    Returns:
+    int: The card as an int from 0 to 51.
+    """
+    return CARD_INDEX[card]
+
+
+def int_to_card(card):
+    """
+    Args:
+    card (int): A card as an int from 0 to 51.
+
+    Returns:
+    str: The card as a string such as '10H'.
+    """
+    return CARD_NAMES[card]
+
+
+def suit_to_int(suit):
+    """
+    Args:
+    suit (str): A suit letter, or '' / 'None' when there is no suit.
+
+    Returns:
+    int: The index of the suit, or NO_SUIT.
+    """
+    return SUIT_INDEX.get(suit, NO_SUIT)
+
+
+def suit_of(card):
+    return card // 13
+
+
+def rank_of(card):
+    return card % 13
+
+
+def cards_to_mask(cards):
+    """
+    Args:
+    cards (iterable): Cards as strings.
+
+    Returns:
+    int: A bitmask holding the cards.
+    """
+    mask = 0
+    for card in cards:
+        mask |= 1 << CARD_INDEX[card]
+    return mask
+
+
+def mask_to_ints(mask):
+    """
+    Args:
+    mask (int): A bitmask of cards.
+
+    Returns:
+    list: The cards in the mask as ints, lowest first.
+    """
+    cards = []
+    while mask:
+        low = mask & -mask
+        cards.append(low.bit_length() - 1)
+        mask ^= low
+    return cards
+
+
+def mask_to_cards(mask):
+    """
+    Args:
+    mask (int): A bitmask of cards.
+
+    Returns:
+    list: The cards in the mask as strings.
+    """
+    return [CARD_NAMES[card] for card in mask_to_ints(mask)]
+
+
+def lowest_card(mask):
+    """
+    Find the lowest ranked card in a mask. Ties between suits are broken by suit order.
+
+    Args:
+    mask (int): A non-empty bitmask of cards.
+
+    Returns:
+    int: The lowest ranked card.
+    """
+    best = None
+    for suit_mask in SUIT_MASKS:
+        cards = mask & suit_mask
+        if cards:
+            card = (cards & -cards).bit_length() - 1
+            if best is None or card % 13 < best % 13:
+                best = card
+    return best
+
+
+def legal_mask(hand, led_suit):
+    """
+    Find the cards of a hand that may be played to a trick.
+
+    Args:
+    hand (int): Bitmask of the cards held.
+    led_suit (int): Suit of the first card in the trick, or NO_SUIT when leading.
+
+    Returns:
+    int: Bitmask of the cards that may be played.
+    """
+    if led_suit != NO_SUIT:
+        following = hand & SUIT_MASKS[led_suit]
+        if following:
+            return following
+    return hand
+
+
+def beats(card, winning_card, trump):
+    """
+    Args:
+    card (int): The card being played.
+    winning_card (int): The card currently winning the trick.
+    trump (int): The trump suit, or NO_SUIT.
+
+    Returns:
+    bool: True when card takes the trick from winning_card.
+    """
+    suit = card // 13
+    if suit == winning_card // 13:
+        return card > winning_card
+    return suit == trump
+
+
+def beating_mask(winning_card, trump):
+    """
+    Args:
+    winning_card (int): The card currently winning the trick.
+    trump (int): The trump suit, or NO_SUIT.
+
+    Returns:
+    int: Bitmask of every card that would take the trick from winning_card.
+    """
+    mask = HIGHER_MASKS[winning_card]
+    if trump != NO_SUIT and winning_card // 13 != trump:
+        mask |= SUIT_MASKS[trump]
+    return mask
+
+
+def trick_winner(cards, trump):
+    """
+    Determine the winning card of a trick.
+
+    Args:
+    cards (list): Cards played in the trick as ints, in order of play.
+    trump (int): The trump suit, or NO_SUIT.
+
+    Returns:
+    int: Index of the winning card in cards.
+    """
+    winner = 0
+    for position in range(1, len(cards)):
+        if beats(cards[position], cards[winner], trump):
+            winner = position
+    return winner
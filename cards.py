@@ -1,17 +1,61 @@
-from random import shuffle
+from random import shuffle, choices
+from functools import lru_cache
+from math import factorial
+
+from card_core import RANKS, SUITS, CARD_INDEX, cards_to_mask
+
+def _suit_splits(n_cards, eligible, capacity):
+    # every way of splitting n_cards cards of one suit between the eligible players without
+    # going over anyone's capacity, as a tuple with the number of cards each player gets
+    if not eligible:
+        if n_cards == 0:
+            yield (0,) * len(capacity)
+        return
+    player = eligible[0]
+    for taken in range(min(n_cards, capacity[player]) + 1):
+        reduced = capacity[:player] + (capacity[player] - taken,) + capacity[player + 1:]
+        for split in _suit_splits(n_cards - taken, eligible[1:], reduced):
+            yield split[:player] + (taken,) + split[player + 1:]
+
+
+@lru_cache(maxsize=4096)
+def _weighted_splits(suit_sizes, eligible, capacity):
+    # the splits of the first remaining suit, each weighted by the number of ways to deal
+    # all remaining suits (suit_sizes cards of each, only to the players in eligible) with it,
+    # so that every player ends up with exactly capacity cards
+    splits = []
+    weights = []
+    for split in _suit_splits(suit_sizes[0], eligible[0], capacity):
+        ways = factorial(suit_sizes[0])
+        for taken in split:
+            ways //= factorial(taken)
+        remaining = tuple(c - t for c, t in zip(capacity, split))
+        ways *= _count_deals(suit_sizes[1:], eligible[1:], remaining)
+        if ways:
+            splits.append(split)
+            weights.append(ways)
+    return splits, weights
+
+
+def _count_deals(suit_sizes, eligible, capacity):
+    # number of ways to deal the remaining suits so that every player ends up with exactly capacity cards
+    if not suit_sizes:
+        return 0 if any(capacity) else 1
+    return sum(_weighted_splits(suit_sizes, eligible, capacity)[1])
+
 
 #class for shuffling and dealing a standard deck of cards
 class Cards:
     def __init__(self, excluded_cards=None):
         # suits are labelled according to the first letter in the suit of a standard deck of cards
-        values = ['A', '2', '3', '4', '5', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-        suits = ['H', 'S', 'C', 'D']
+        values = RANKS[-1:] + RANKS[:-1]
         # the + in the line below performs a concatenation of strings, hence outputs is 'AH', '4D', etc.
-        self.deck = [j + i for j in values for i in suits]
+        self.deck = [j + i for j in values for i in SUITS]
 
         # Remove excluded cards from the deck
         if excluded_cards:
-            self.deck = [card for card in self.deck if card not in excluded_cards]
+            excluded_mask = cards_to_mask(excluded_cards)
+            self.deck = [card for card in self.deck if not excluded_mask >> CARD_INDEX[card] & 1]
 
     def shuffle(self):
         shuffle(self.deck)
@@ -25,4 +69,65 @@ class Cards:
         else:
             #if all the cards have been dealt there is no trump suit
             self.trump="None"
-        
\ No newline at end of file
+
+    def hand_masks(self):
+        # the dealt hands as bitmasks of integer cards, see card_core
+        return [cards_to_mask(hand) for hand in self.hands]
+
+    def _constrained_suits(self, hand_sizes, voids, known_cards, first_suit):
+        # the cards of each suit left to deal, with first_suit (if any) first, the players
+        # eligible for each suit and the number of cards each player gets
+        n_players = len(hand_sizes)
+        voids = voids or [()] * n_players
+        known_cards = known_cards or [[] for _ in range(n_players)]
+        known_mask = cards_to_mask(card for hand in known_cards for card in hand)
+        deck = [card for card in self.deck if not known_mask >> CARD_INDEX[card] & 1]
+
+        # an extra 'player' receives the cards nobody is dealt, it can hold any suit
+        suits = list(SUITS)
+        if first_suit is not None:
+            suits.remove(first_suit)
+            suits.insert(0, first_suit)
+        suit_cards = [[card for card in deck if card[-1] == suit] for suit in suits]
+        suit_sizes = tuple(len(cards) for cards in suit_cards)
+        eligible = tuple(tuple(i for i in range(n_players) if suit not in voids[i]) + (n_players,)
+                         for suit in suits)
+        capacity = tuple(hand_sizes) + (len(deck) - sum(hand_sizes),)
+        if capacity[-1] < 0 or _count_deals(suit_sizes, eligible, capacity) == 0:
+            raise ValueError("no deal of the deck satisfies the constraints")
+        return suit_cards, suit_sizes, eligible, capacity
+
+    def suit_splits(self, hand_sizes, suit, voids=None, known_cards=None):
+        # the ways deal_constrained can split the cards of suit between the players, as tuples
+        # with the number each player gets and last the number nobody is dealt, and the number
+        # of deals that have each split
+        _, suit_sizes, eligible, capacity = self._constrained_suits(hand_sizes, voids, known_cards,
+                                                                    suit)
+        return _weighted_splits(suit_sizes, eligible, capacity)
+
+    def deal_constrained(self, hand_sizes, voids=None, known_cards=None, suit=None, split=None):
+        # deal the deck so that player i gets hand_sizes[i] cards and no card of the suits in voids[i],
+        # on top of any known_cards[i] they are known to hold. Every deal that satisfies the
+        # constraints is equally likely: the number of cards of each suit a player gets is drawn
+        # according to how many deals have that split, then the cards of each suit are shuffled.
+        # Passing a suit and one of its suit_splits deals that suit that way, and every deal with
+        # that split is equally likely. The trump is not changed.
+        n_players = len(hand_sizes)
+        known_cards = known_cards or [[] for _ in range(n_players)]
+        suit_cards, suit_sizes, eligible, capacity = self._constrained_suits(hand_sizes, voids,
+                                                                             known_cards, suit)
+
+        self.hands = [list(hand) for hand in known_cards]
+        for i, cards in enumerate(suit_cards):
+            if i == 0 and split is not None:
+                chosen = tuple(split)
+            else:
+                splits, weights = _weighted_splits(suit_sizes[i:], eligible[i:], capacity)
+                chosen = choices(splits, weights)[0]
+
+            cards = list(cards)
+            shuffle(cards)
+            for player in range(n_players):
+                self.hands[player] += cards[:chosen[player]]
+                cards = cards[chosen[player]:]
+            capacity = tuple(c - t for c, t in zip(capacity, chosen))
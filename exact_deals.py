@@ -0,0 +1,275 @@
+"""
+Exact expectations over every deal of a small round, in place of sampling.
+
+With one or two cards per player there are few enough deals of the unseen
+cards to list them all. Unseen cards of a suit with no seen card between them
+play alike, so deals are listed up to that equivalence (deal_classes) and each
+one is weighted by the number of deals it stands for. The card turned up to set
+the trump suit is one of the cards nobody was dealt, so a deal is also weighted
+by the number of undealt unseen cards of the trump suit.
+
+exact_bid and exact_actions return what find_bid and find_best_action_overall
+estimate: the distribution of the player's equilibrium tricks, and the
+expected score of every card. The random accept or reject of the bid check is
+replaced by its probability (NE_bid_bot.bid_likelihood). hells_bridge_bid
+handles the blind one-card round, in which a player sees every card but their
+own.
+"""
+import itertools
+import time
+from math import comb
+
+from card_core import (
+    CARD_INDEX,
+    FULL_DECK_MASK,
+    NO_SUIT,
+    SUIT_MASKS,
+    cards_to_mask,
+    suit_to_int,
+    trick_winner
+)
+from NE_bid_bot import add_sample_stats, bid_likelihood
+from NE_card_bot import deal_setup, find_best_action, solve_deal
+from NE_solver import solve, trim_tables
+
+
+def card_runs(pool_mask):
+    """
+    Args:
+    pool_mask (int): Bitmask of the unseen cards.
+
+    Returns:
+    list: The unseen cards of every suit, lowest first, split wherever a seen
+    card lies between them.
+    """
+    runs = []
+    for suit in range(4):
+        run = []
+        for card in range(13 * suit, 13 * suit + 13):
+            if pool_mask >> card & 1:
+                run.append(card)
+            elif run:
+                runs.append(run)
+                run = []
+        if run:
+            runs.append(run)
+    return runs
+
+
+def turn_up_weight(pool_mask, dealt_mask, trump):
+    """
+    Args:
+    pool_mask (int): Bitmask of the unseen cards.
+    dealt_mask (int): Bitmask of the unseen cards dealt to players.
+    trump (int): The trump suit, or NO_SUIT when every card is dealt.
+
+    Returns:
+    int: The number of cards that could have been turned up to set the trump suit.
+    """
+    if trump == NO_SUIT:
+        return 1
+    return bin(pool_mask & ~dealt_mask & SUIT_MASKS[trump]).count('1')
+
+
+def deal_classes(pool_mask, hand_sizes, voids=None, trump=NO_SUIT):
+    """
+    List the deals of the unseen cards up to equivalence.
+
+    Within a run (see card_runs) only the order of the players dealt its cards
+    matters, so a class deals the lowest cards of every run and stands for the
+    comb(run length, cards dealt) ways of picking them.
+
+    Args:
+    pool_mask (int): Bitmask of the unseen cards.
+    hand_sizes (list): Number of unseen cards each player gets.
+    voids (list): Suits (as ints) each player may not get, or None.
+    trump (int): The trump suit, or NO_SUIT when every card is dealt.
+
+    Returns:
+    generator: (hand_masks, weight) pairs, one deal of every class and the
+    number of deals the class stands for, times turn_up_weight.
+    """
+    n_players = len(hand_sizes)
+    voids = voids or [()] * n_players
+    runs = card_runs(pool_mask)
+    # Unseen cards in the runs from each one on
+    remaining = [sum(len(run) for run in runs[index:]) for index in range(len(runs) + 1)]
+
+    def assign(index, capacity, hands, weight):
+        if sum(capacity) > remaining[index]:
+            return
+        if index == len(runs):
+            dealt_mask = 0
+            for hand in hands:
+                dealt_mask |= hand
+            weight *= turn_up_weight(pool_mask, dealt_mask, trump)
+            if weight:
+                yield list(hands), weight
+            return
+        run = runs[index]
+        suit = run[0] // 13
+        eligible = [player for player in range(n_players)
+                    if capacity[player] and suit not in voids[player]]
+        most = min(len(run), sum(capacity[player] for player in eligible))
+        for count in range(most + 1):
+            for owners in itertools.product(eligible, repeat=count):
+                left = list(capacity)
+                dealt = list(hands)
+                for card, player in zip(run, owners):
+                    left[player] -= 1
+                    dealt[player] |= 1 << card
+                if min(left) < 0:
+                    continue
+                yield from assign(index + 1, left, dealt, weight * comb(len(run), count))
+
+    return assign(0, list(hand_sizes), [0] * n_players, 1)
+
+
+def exact_bid(player_hand, previous_bids, trump, player_id, root_properties, p=0.2,
+              mode='exact', stats=None, cache=None):
+    """
+    Find the distribution of the player's equilibrium tricks over every deal,
+    the exact counterpart of find_bid.
+
+    Args:
+    player_hand (list): The player's hand.
+    previous_bids (list): Bids made by other players.
+    trump (str): The trump suit.
+    player_id (int): The current player's ID.
+    root_properties (dict): Properties of the root node.
+    p (float): Probability for bid modification.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    stats (dict): Counters the number of deals solved and consistent with the
+        bids, solves, positions searched and solve time are added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, or None.
+
+    Returns:
+    dict: The probability of every bid, empty if no deal is consistent with
+    the bids.
+    """
+    n_players = len(previous_bids)
+    hand_size = len(player_hand)
+    player_position = sum([bid != '' for bid in previous_bids])
+    hand_mask = cards_to_mask(player_hand)
+    trump_suit = suit_to_int(trump)
+
+    probabilities = {}
+    for hand_masks, weight in deal_classes(FULL_DECK_MASK & ~hand_mask,
+                                           [hand_size] * (n_players - 1), trump=trump_suit):
+        hand_masks.insert(player_id, hand_mask)
+        start = time.perf_counter()
+        nash_outcome, _ = solve(n_players * hand_size, n_players, hand_masks, trump_suit,
+                                root_properties, mode=mode, perspective=player_id, stats=stats,
+                                cache=cache)
+        # As in sample_bids, unmodified bids that match are always accepted
+        if all(a == b for a, b in zip(previous_bids, nash_outcome) if a != ''):
+            likelihood = 1.0
+        else:
+            likelihood = bid_likelihood(previous_bids, nash_outcome, p)
+        add_sample_stats(stats, time.perf_counter() - start, likelihood > 0)
+        if likelihood:
+            bid = nash_outcome[player_position]
+            probabilities[bid] = probabilities.get(bid, 0) + weight * likelihood
+
+    total = sum(probabilities.values())
+    return {bid: weight / total for bid, weight in probabilities.items()}
+
+
+def exact_actions(player_hand, trump, bidtree_root_properties, history, my_bot, bots, p=0.2,
+                  mode='exact', stats=None, cache=None, tables=None):
+    """
+    Find the expected score of every card over every deal consistent with the
+    cards played, the exact counterpart of find_best_action_overall.
+
+    Args:
+    player_hand (list): The player's current hand.
+    trump (str): The trump suit.
+    bidtree_root_properties (dict): Properties of the bidding tree root.
+    history (list): History of played cards.
+    my_bot (dict): Information about the current bot.
+    bots (list): List of all bots in the game.
+    p (float): Probability for bid modification.
+    mode (str): Search mode, see NE_solver.NashSolver.
+    stats (dict): Counters the number of deals solved and consistent with the
+        bids, solves, positions searched and solve time are added to, or None.
+    cache (dict): Results of earlier solves keyed by canonical position, or None.
+    tables (dict): Memo tables shared by the searches of this round, see
+        NE_solver.NashSolver, or None.
+
+    Returns:
+    dict: A dictionary of actions and their expected scores, None if no deal
+    is consistent with the bids.
+    """
+    setup = deal_setup(player_hand, history, my_bot, bots)
+    pool_mask = cards_to_mask(setup['unseen'].deck)
+    known_masks = [cards_to_mask(cards) for cards in setup['known_cards']]
+    voids = [tuple(suit_to_int(suit) for suit in suits) for suits in setup['voids']]
+
+    outcomes_list = []
+    weights = []
+    for hand_masks, weight in deal_classes(pool_mask, setup['unseen_sizes'], voids,
+                                           suit_to_int(trump)):
+        hand_masks = [hand | known for hand, known in zip(hand_masks, known_masks)]
+        hand_masks.insert(setup['player_id'], cards_to_mask(setup['our_hand']))
+        trim_tables(tables)
+        start = time.perf_counter()
+        nash_outcome, action_scores = solve_deal(hand_masks, trump, bidtree_root_properties,
+                                                 setup, mode=mode, stats=stats, cache=cache,
+                                                 tables=tables)
+        likelihood = bid_likelihood(setup['round_bids'], nash_outcome, p)
+        add_sample_stats(stats, time.perf_counter() - start, likelihood > 0)
+        if likelihood:
+            outcomes_list.append(action_scores)
+            weights.append(weight * likelihood)
+
+    if not weights:
+        return None
+    total = sum(weights)
+    return find_best_action(outcomes_list, [weight / total for weight in weights])
+
+
+def hells_bridge_bid(visible_cards, bots, my_bot, trump):
+    """
+    Find the expected score of each bid in the hell's bridge round, where
+    every player holds one card and sees everyone's card but their own.
+
+    Every unseen card is equally likely to be the player's, apart from the
+    card turned up to set the trump suit, which nobody holds. What the earlier
+    bids say about the player's card is not used.
+
+    Args:
+    visible_cards (list): The other bots' cards, in the order of bots.
+    bots (list): List of all bots in the game, in order of starting position.
+    my_bot (dict): Information about the current bot.
+    trump (str): The trump suit.
+
+    Returns:
+    dict: The expected score of every bid the player may make.
+    """
+    my_bot_id = my_bot['bot_unique_id']
+    others = [bot for bot in bots if bot['bot_unique_id'] != my_bot_id]
+    owners = {bot['bot_unique_id']: CARD_INDEX[card] for bot, card in zip(others, visible_cards)}
+    order = sorted(bots, key=lambda bot: bot['start_pos'])
+    my_position = [bot['bot_unique_id'] for bot in order].index(my_bot_id)
+    trump_suit = suit_to_int(trump)
+    pool_mask = FULL_DECK_MASK & ~cards_to_mask(visible_cards)
+
+    win = total = 0
+    for card in range(52):
+        if not pool_mask >> card & 1:
+            continue
+        weight = turn_up_weight(pool_mask, 1 << card, trump_suit)
+        owners[my_bot_id] = card
+        trick = [owners[bot['bot_unique_id']] for bot in order]
+        total += weight
+        if trick_winner(trick, trump_suit) == my_position:
+            win += weight
+    p_win = win / total
+
+    # Scored as in the game: 10 + 2 * bid when made, -2 per trick off otherwise
+    expected = {0: 10 * (1 - p_win) - 2 * p_win, 1: 12 * p_win - 2 * (1 - p_win)}
+    bids = [bot['aim_hands_won'] for bot in bots]
+    if bids.count('') == 1:
+        # The last bidder may not make the bids add up to the number of tricks
+        expected.pop(1 - sum(bid for bid in bids if bid != ''), None)
+    return expected
@@ -0,0 +1,342 @@
+"""
+Compact binary log of rikiki games and a replayer for it.
+
+A log starts with a header naming the bots, followed by fixed-width event
+records: kind, round, seat (unsigned bytes) and a signed 16-bit value, so a
+record is 5 bytes. Cards are ints as in card_core and players are identified by
+their seat, i.e. their position in the room. A log can hold several games
+played by the same bots, e.g. with Rikiki.reset.
+
+    with GameLogWriter("game.rkl") as log:
+        Rikiki(room=room, event_log=log).run_game()
+
+    replay = GameReplay("game.rkl")
+    method, arguments = replay.decision_at(index)
+    getattr(NE_bot.Bot(), method)(**arguments)
+"""
+import struct
+from types import MappingProxyType
+
+from card_core import NO_SUIT, SUITS, int_to_card, legal_mask, mask_to_cards
+
+MAGIC = b"RKLG"
+VERSION = 1
+# magic, version, number of players, hells bridge, length of the bot ids
+HEADER = struct.Struct("<4sBBBH")
+# kind, round, seat, value
+RECORD = struct.Struct("<BBBh")
+
+# Event kinds, with the meaning of their seat and value
+GAME_START = 0   # value: game number in the log
+ROUND_START = 1  # value: number of cards per player
+TRUMP = 2        # value: trump suit, NO_SUIT if all the cards were dealt
+DEAL = 3         # seat: player dealt the card, value: card
+BID = 4          # seat: bidder, value: bid
+CARD = 5         # seat: player, value: card played
+TRICK = 6        # seat: winner of the trick
+SCORE = 7        # seat: player, value: score at the end of the round
+GAME_END = 8
+
+EVENT_NAMES = ("GAME_START", "ROUND_START", "TRUMP", "DEAL", "BID", "CARD", "TRICK", "SCORE",
+               "GAME_END")
+
+# Seat of events that are not about one player
+NO_SEAT = 255
+
+
+class GameLogWriter(object):
+    """
+    Buffered writer of the event records of one or more games.
+    """
+
+    def __init__(self, path, buffer_size=1 << 16):
+        """
+        Args:
+        path (str): File to write the log to.
+        buffer_size (int): Number of bytes kept in memory before writing to the file.
+        """
+        self.file = open(path, "wb")
+        self.buffer_size = buffer_size
+        self.buffer = bytearray()
+        self.bot_unique_ids = None
+        self.games = 0
+
+    def start_game(self, bot_unique_ids, hell_bridge):
+        """
+        Record the start of a game, writing the header before the first one.
+
+        Args:
+        bot_unique_ids (list): Unique ids of the bots, in seat order.
+        hell_bridge (bool): Whether the round of one card is a hells bridge round.
+        """
+        bot_unique_ids = list(bot_unique_ids)
+        if self.bot_unique_ids is None:
+            names = "\n".join(bot_unique_ids).encode("utf-8")
+            self.buffer += HEADER.pack(MAGIC, VERSION, len(bot_unique_ids), int(hell_bridge),
+                                       len(names))
+            self.buffer += names
+            self.bot_unique_ids = bot_unique_ids
+        elif bot_unique_ids != self.bot_unique_ids:
+            raise ValueError("Every game in a log must be played by the same bots")
+        self.event(GAME_START, 0, NO_SEAT, self.games)
+        self.games += 1
+
+    def event(self, kind, round_number, seat, value=0):
+        """
+        Args:
+        kind (int): The kind of event, e.g. CARD.
+        round_number (int): Index of the round in the game.
+        seat (int): Seat of the player the event is about, or NO_SEAT.
+        value (int): The value of the event, see the event kinds.
+        """
+        self.buffer += RECORD.pack(kind, round_number, seat, value)
+        if len(self.buffer) >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        self.file.write(self.buffer)
+        self.buffer.clear()
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_log(path):
+    """
+    Args:
+    path (str): File the log was written to.
+
+    Returns:
+    tuple: The bot unique ids in seat order, whether hells bridge was on and
+    the list of (kind, round, seat, value) events.
+    """
+    with open(path, "rb") as log_file:
+        data = log_file.read()
+    magic, version, n_players, hell_bridge, names_length = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("{} is not a version {} rikiki log".format(path, VERSION))
+    start = HEADER.size + names_length
+    bot_unique_ids = data[HEADER.size:start].decode("utf-8").split("\n")
+    if len(bot_unique_ids) != n_players:
+        raise ValueError("{} has a corrupt header".format(path))
+    events = list(RECORD.iter_unpack(data[start:start + (len(data) - start) // RECORD.size * RECORD.size]))
+    return bot_unique_ids, bool(hell_bridge), events
+
+
+class ReplayState(object):
+    """
+    The state of a game rebuilt from its events, mirroring what Rikiki keeps.
+    Players are indexed by seat.
+    """
+
+    def __init__(self, bot_unique_ids, hell_bridge):
+        self.bot_unique_ids = bot_unique_ids
+        self.n_players = len(bot_unique_ids)
+        self.hell_bridge = hell_bridge
+        self.start_game()
+
+    def start_game(self):
+        n_players = self.n_players
+        self.scores = [0] * n_players
+        self.round_start_pos = list(range(n_players))
+        self.start_round(0, 0)
+        self.finished = False
+
+    def start_round(self, round_number, round_size):
+        n_players = self.n_players
+        self.round_number = round_number
+        self.round_size = round_size
+        self.trump = NO_SUIT
+        self.hands = [0] * n_players
+        # Cards of every player in the order they were dealt
+        self.dealt = [[] for _ in range(n_players)]
+        self.bids = [''] * n_players
+        self.total_bid = 0
+        self.tricks_won = [0] * n_players
+        self.start_pos = list(self.round_start_pos)
+        self.card_played = [''] * n_players
+        self.history = []
+        self.trick_size = 0
+
+    def apply(self, event):
+        """
+        Args:
+        event (tuple): A (kind, round, seat, value) event.
+        """
+        kind, round_number, seat, value = event
+        if kind == GAME_START:
+            self.start_game()
+        elif kind == ROUND_START:
+            self.start_round(round_number, value)
+        elif kind == TRUMP:
+            self.trump = value
+        elif kind == DEAL:
+            self.hands[seat] |= 1 << value
+            self.dealt[seat].append(value)
+        elif kind == BID:
+            self.bids[seat] = value
+            self.total_bid += value
+        elif kind == CARD:
+            if self.trick_size == 0:
+                self.history.append({})
+            self.history[-1][self.bot_unique_ids[seat]] = mask_to_cards(1 << value)[0]
+            self.card_played[seat] = self.history[-1][self.bot_unique_ids[seat]]
+            self.hands[seat] ^= 1 << value
+            self.trick_size += 1
+        elif kind == TRICK:
+            self.tricks_won[seat] += 1
+            winner_pos = self.start_pos[seat]
+            self.start_pos = [(pos - winner_pos) % self.n_players for pos in self.start_pos]
+            self.card_played = [''] * self.n_players
+            self.trick_size = 0
+        elif kind == SCORE:
+            self.scores[seat] = value
+            self.round_start_pos[seat] = (self.round_start_pos[seat] - 1) % self.n_players
+        elif kind == GAME_END:
+            self.finished = True
+
+    def trump_name(self):
+        return SUITS[self.trump] if self.trump != NO_SUIT else "None"
+
+    def hand_cards(self, seat, mask):
+        """
+        Args:
+        seat (int): A player.
+        mask (int): Bitmask of cards of the player's hand.
+
+        Returns:
+        list: The cards in the mask, in the order they were dealt.
+        """
+        return [int_to_card(card) for card in self.dealt[seat] if mask >> card & 1]
+
+    def seats_in_play_order(self):
+        return sorted(range(self.n_players), key=lambda seat: self.start_pos[seat])
+
+    def bot_views(self):
+        """
+        Returns:
+        tuple: Read-only details of every bot as Rikiki passes them, in order of play.
+        """
+        views = []
+        for seat in self.seats_in_play_order():
+            bot_unique_id = self.bot_unique_ids[seat]
+            views.append(MappingProxyType({
+                "bot_name": bot_unique_id.rsplit("-", 1)[0],
+                "bot_unique_id": bot_unique_id,
+                "hands_won": self.tricks_won[seat],
+                "aim_hands_won": self.bids[seat],
+                "score": self.scores[seat],
+                "start_pos": self.start_pos[seat],
+                "card_played": self.card_played[seat],
+            }))
+        return tuple(views)
+
+    def bid_arguments(self, seat):
+        """
+        Args:
+        seat (int): The bidder.
+
+        Returns:
+        dict: The arguments Rikiki passes to the bot's get_bid.
+        """
+        views = self.bot_views()
+        hells_bridge = self.round_size == 1 and self.hell_bridge
+        if hells_bridge:
+            cards = [mask_to_cards(self.hands[other])[0] for other in self.seats_in_play_order()
+                     if other != seat]
+        else:
+            cards = self.hand_cards(seat, self.hands[seat])
+        return {
+            "current_round_size": self.round_size,
+            "bots": views,
+            "trump": self.trump_name(),
+            "cards": cards,
+            "hells_bridge": hells_bridge,
+            "my_bot_details": views[self.start_pos[seat]],
+        }
+
+    def play_arguments(self, seat):
+        """
+        Args:
+        seat (int): The player to play.
+
+        Returns:
+        dict: The arguments Rikiki passes to the bot's play_card.
+        """
+        views = self.bot_views()
+        history = [dict(trick) for trick in self.history]
+        if self.trick_size == 0:
+            # Rikiki starts the record of a trick before the first card is played
+            history.append({})
+        start_suit = NO_SUIT
+        if self.start_pos[seat] != 0:
+            first_card = next(iter(history[-1].values()))
+            start_suit = SUITS.index(first_card[-1])
+        return {
+            "current_round_size": self.round_size,
+            "bots": views,
+            "trump": self.trump_name(),
+            "cards": self.hand_cards(seat, self.hands[seat]),
+            "history": tuple(MappingProxyType(trick) for trick in history),
+            "total_bid": self.total_bid,
+            "valid_cards": self.hand_cards(seat, legal_mask(self.hands[seat], start_suit)),
+            "my_bot_details": views[self.start_pos[seat]],
+        }
+
+
+class GameReplay(object):
+    """
+    Rebuilds the state of logged games at any event without calling bots.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+        path (str): File the log was written to.
+        """
+        self.bot_unique_ids, self.hell_bridge, self.events = read_log(path)
+
+    def state_at(self, index):
+        """
+        Args:
+        index (int): Index of an event in the log.
+
+        Returns:
+        ReplayState: The state of the game just before the event.
+        """
+        state = ReplayState(self.bot_unique_ids, self.hell_bridge)
+        for event in self.events[:index]:
+            state.apply(event)
+        return state
+
+    def decision_at(self, index):
+        """
+        Args:
+        index (int): Index of a BID or CARD event.
+
+        Returns:
+        tuple: The name of the bot method that made the decision ('get_bid' or
+        'play_card') and the arguments it was called with.
+        """
+        kind, _, seat, _ = self.events[index]
+        state = self.state_at(index)
+        if kind == BID:
+            return "get_bid", state.bid_arguments(seat)
+        if kind == CARD and not (state.hell_bridge and state.round_size == 1):
+            return "play_card", state.play_arguments(seat)
+        raise ValueError("Event {} ({}) is not a bot decision".format(index, EVENT_NAMES[kind]))
+
+    def games(self):
+        """
+        Returns:
+        list: Index of the GAME_START event of every game in the log.
+        """
+        return [index for index, event in enumerate(self.events) if event[0] == GAME_START]
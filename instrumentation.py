@@ -0,0 +1,77 @@
+"""
+Sinks for the per-decision metrics of a game.
+
+Pass a sink to Rikiki as instrumentation and every bid and card is reported as
+a dict with:
+    event (str): 'bid' or 'card'.
+    round (int): Index of the round in the game.
+    round_size (int): Number of cards per player in the round.
+    bot (str): Unique id of the bot that decided.
+    seconds (float): Time the bot took to decide.
+    snapshot_seconds (float): Time the engine took to build the read-only
+        views of the game passed to the bot.
+    peak_bytes (int): Peak memory allocated during the decision, only when
+        tracemalloc is tracing (e.g. python -X tracemalloc).
+and the counters a bot keeps in last_stats, which for NE_bot are the samples
+drawn and accepted by the bid consistency check, solves, positions searched
+and solve_seconds, plus the distinct particles scored and their effective
+sample size (ess) when the bot keeps a particle belief, and the lead of the
+chosen bid or card over the runner-up (margin) with its standard_error when
+it samples.
+
+A sink is any object with an emit(record) method. Without one the game does
+no extra work.
+"""
+import json
+
+
+class MemorySink(object):
+    """
+    Keeps every record in memory.
+    """
+
+    def __init__(self):
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+    def summary(self):
+        """
+        Returns:
+        dict: For every (bot, event) pair, the number of decisions and the
+        total of every numeric metric.
+        """
+        totals = {}
+        for record in self.records:
+            total = totals.setdefault((record["bot"], record["event"]), {"decisions": 0})
+            total["decisions"] += 1
+            for key, value in record.items():
+                if key not in ("round", "round_size") and isinstance(value, (int, float)):
+                    total[key] = total.get(key, 0) + value
+        return totals
+
+
+class JsonLinesSink(object):
+    """
+    Writes every record to a file as one line of JSON.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+        path (str): File to write the records to.
+        """
+        self.file = open(path, "w")
+
+    def emit(self, record):
+        self.file.write(json.dumps(record) + "\n")
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,203 @@
+"""
+Belief over the other players' hands in a round, kept as weighted deals.
+
+For every card, find_best_action_overall draws new deals and solves the whole
+round for each one to check it against the bids, and most deals fail the check.
+ParticleBelief draws its deals (particles) once per round, after the bidding.
+It weights each one by the probability that it passes the check
+(NE_bid_bot.bid_likelihood), so no solve is thrown away. The cards played
+later are not weighted by how likely a player was to play them: a particle is
+kept as it is or dropped, when the cards played since rule it out (a player
+played a card they were not dealt, or still held a suit they showed out of).
+When the effective sample size of the weights falls below min_ess times the
+number of particles, new particles are drawn from the current history and the
+set is resampled to equal weights, so only the dropped particles make it fall.
+
+The particles kept are solved again at every card, through memo tables kept
+for the round, so a kept particle only has the play since its last solve
+searched again. Particles drawn to replace dropped ones are solved in full.
+
+    belief = ParticleBelief('H', root_properties, n_particles=200)
+    scores = belief.action_scores(cards, history, my_bot, bots)
+
+A belief follows one round: make a new one for every round.
+"""
+import random
+import time
+
+from card_core import SUIT_MASKS, cards_to_mask, suit_to_int
+from NE_bid_bot import add_sample_stats, bid_likelihood
+from NE_card_bot import deal_hands, deal_setup, find_best_action, solve_deal
+from NE_solver import trim_tables
+
+
+class ParticleBelief(object):
+    """
+    Deals of one round weighted by how well they agree with the bids, kept
+    while they agree with the cards played.
+    """
+
+    def __init__(self, trump, bidtree_root_properties, n_particles=200, p=0.2, min_ess=0.5,
+                 mode='exact', cache=None, tables=None):
+        """
+        Args:
+        trump (str): The trump suit.
+        bidtree_root_properties (dict): Properties of the bidding tree root.
+        n_particles (int): Number of deals drawn at a time and kept after resampling.
+        p (float): Probability for bid modification, see NE_bid_bot.modify_list.
+        min_ess (float): Fraction of n_particles the effective sample size may
+            fall to before new deals are drawn.
+        mode (str): Search mode, see NE_solver.NashSolver.
+        cache (dict): Results of earlier solves keyed by canonical position, or None.
+        tables (dict): Memo tables shared by the searches of this round, see
+            NE_solver.NashSolver, or None for tables of the belief's own.
+        """
+        self.trump = trump
+        self.bidtree_root_properties = bidtree_root_properties
+        self.n_particles = n_particles
+        self.p = p
+        self.min_ess = min_ess
+        self.mode = mode
+        self.cache = cache
+        # The particles kept are solved again at every card. The memo tables keep
+        # the positions searched for them at earlier cards, so only the part of
+        # the round played since is searched again
+        self.tables = {} if tables is None else tables
+        # [hand masks of the round in order of starting position, weight] pairs
+        self.particles = []
+
+    def effective_sample_size(self):
+        """
+        Returns:
+        float: The number of equally weighted deals the particles are worth.
+        """
+        total = sum(weight for _, weight in self.particles)
+        if not total:
+            return 0.0
+        return total ** 2 / sum(weight ** 2 for _, weight in self.particles)
+
+    def consistent(self, deal, setup):
+        """
+        Args:
+        deal (tuple): Hand masks of the round in order of starting position.
+        setup (dict): What is known of the deal, see NE_card_bot.deal_setup.
+
+        Returns:
+        bool: Whether the deal agrees with the player's hand and the cards played.
+        """
+        if deal[setup['player_id']] != cards_to_mask(setup['our_hand']):
+            return False
+        seats = [seat for seat in range(len(deal)) if seat != setup['player_id']]
+        for seat, known, voids in zip(seats, setup['known_cards'], setup['voids']):
+            played = cards_to_mask(known)
+            if played & ~deal[seat]:
+                return False
+            if any(deal[seat] & ~played & SUIT_MASKS[suit_to_int(suit)] for suit in voids):
+                return False
+        return True
+
+    def resample(self):
+        # Systematic resampling down to n_particles equally weighted deals.
+        # The total weight is kept, so deals drawn later are weighted alike.
+        total = sum(weight for _, weight in self.particles)
+        step = total / self.n_particles
+        position = random.random() * step
+        cumulative = 0
+        resampled = []
+        for deal, weight in self.particles:
+            cumulative += weight
+            while position < cumulative and len(resampled) < self.n_particles:
+                resampled.append([deal, step])
+                position += step
+        self.particles = resampled
+
+    def replenish(self, setup, outcomes, stats=None, deadline=None):
+        """
+        Draw n_particles new deals from the current history, weight them by
+        the bids and resample the set to n_particles equally weighted deals.
+
+        Args:
+        setup (dict): What is known of the deal, see NE_card_bot.deal_setup.
+        outcomes (dict): The action scores of every new deal are added to it.
+        stats (dict): Counters the number of samples drawn and accepted,
+            solves, positions searched and solve time are added to, or None.
+        deadline (float): time.monotonic() value after which no new deal is
+            drawn, the first one always is. None to draw all of them.
+        """
+        for sample in range(self.n_particles):
+            if sample and deadline is not None and time.monotonic() > deadline:
+                break
+            deal = tuple(cards_to_mask(hand) for hand in deal_hands(setup))
+            trim_tables(self.tables)
+            start = time.perf_counter()
+            tricks, outcomes[deal] = solve_deal(
+                list(deal), self.trump, self.bidtree_root_properties, setup, mode=self.mode,
+                stats=stats, cache=self.cache, tables=self.tables)
+            weight = bid_likelihood(setup['round_bids'], tricks, self.p)
+            add_sample_stats(stats, time.perf_counter() - start, weight > 0)
+            if weight > 0:
+                self.particles.append([deal, weight])
+        if self.particles:
+            self.resample()
+
+    def action_scores(self, player_hand, history, my_bot, bots, stats=None, deadline_s=None):
+        """
+        Bring the belief up to date with the history and score the player's
+        cards over it.
+
+        With a time budget, new deals stop being drawn and the deals kept stop
+        being solved once it is spent. The cards are then scored over the deals
+        solved so far.
+
+        Args:
+        player_hand (list): The player's current hand.
+        history (list): History of played cards.
+        my_bot (dict): Information about the current bot.
+        bots (list): List of all bots in the game.
+        stats (dict): Counters the number of samples drawn and accepted,
+            solves, positions searched and solve time are added to, or None.
+            The number of distinct deals scored and their effective sample
+            size are set as particles and ess.
+        deadline_s (float): Time budget in seconds, or None.
+
+        Returns:
+        dict: A dictionary of actions and their weighted scores, as
+        find_best_action_overall, or None if no deal agrees with the bids.
+        """
+        deadline = None if deadline_s is None else time.monotonic() + deadline_s
+        setup = deal_setup(player_hand, history, my_bot, bots)
+        self.particles = [particle for particle in self.particles
+                          if self.consistent(particle[0], setup)]
+        outcomes = {}
+        if not self.particles or self.effective_sample_size() < self.min_ess * self.n_particles:
+            self.replenish(setup, outcomes, stats, deadline)
+
+        # Copies left by resampling are solved once
+        weights = {}
+        for deal, weight in self.particles:
+            weights[deal] = weights.get(deal, 0) + weight
+        if stats is not None:
+            stats['particles'] = len(weights)
+            stats['ess'] = self.effective_sample_size()
+        if not weights:
+            return None
+        scored = []
+        for deal in weights:
+            if scored and deadline is not None and time.monotonic() > deadline:
+                break
+            scored.append(deal)
+            if deal not in outcomes:
+                trim_tables(self.tables)
+                start = time.perf_counter()
+                _, outcomes[deal] = solve_deal(
+                    list(deal), self.trump, self.bidtree_root_properties, setup, mode=self.mode,
+                    stats=stats, cache=self.cache, tables=self.tables)
+                if stats is not None:
+                    stats['solve_seconds'] = stats.get('solve_seconds', 0) + \
+                        time.perf_counter() - start
+
+        # Weights are scaled to add up to the number of particles, so scores
+        # are on the scale of a sum over accepted samples
+        scale = len(self.particles) / sum(weights[deal] for deal in scored)
+        return find_best_action([outcomes[deal] for deal in scored],
+                                [weights[deal] * scale for deal in scored])
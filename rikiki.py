@@ -3,8 +3,21 @@ import random
 import copy
 import datetime
 import csv
+import threading
+import tracemalloc
+from concurrent.futures import Future, TimeoutError
+from types import MappingProxyType
 
 from cards import Cards
+from card_core import CARD_INDEX, NO_SUIT, legal_mask, mask_to_cards, suit_to_int, trick_winner
+import game_log
+from bots import basic_bot_v2
+
+
+class DecisionTimeout(Exception):
+    """
+    A bot took longer than the game's decision_timeout to bid or play.
+    """
 
 
 class Rikiki(object):
@@ -20,7 +33,10 @@ class Rikiki(object):
             minmax_size=[1,10], # smallest and largest hand sizes
             hell_bridge=True,
             #output_csv_file="data/game_log.csv",
-            verbose=False # Result of every round is logged to csv
+            verbose=False, # Result of every round is logged to csv
+            event_log=None, # game_log.GameLogWriter recording every deal, bid, card and trick
+            instrumentation=None, # sink for the metrics of every decision, see instrumentation.py
+            decision_timeout=None # seconds a bot has for every bid and card, None for no limit
             ):
 
         self.round_movement=round_movement
@@ -40,10 +56,25 @@ class Rikiki(object):
         self.finished = False
         self.hell_bridge = hell_bridge
         self.cards={}
+        # the hand of every bot as dealt, so bots get their cards in the order they were dealt
+        self.dealt={}
         self.valid_cards={}
         self.round_start_pos={}
         self.round_history=[]
         self.verbose=verbose
+        # seat of every bot at the start of a game, used by reset
+        self.seats={}
+        self.event_log=event_log
+        self.instrumentation=instrumentation
+        self.decision_timeout=decision_timeout
+        # bots that time out or raise an error get a decision made for them by basic_bot_v2,
+        # the timeouts are kept as (round, bot, "bid" or "card")
+        self.fallback_bot=basic_bot_v2.Bot()
+        self.timeouts=[]
+        # calls that ran out of time, by bot. The bot isn't called again until its call ends
+        self.late_calls={}
+        # errors raised by bots, as (bot, game stage, error message)
+        self.errors=[]
 
 		# Game variables
 		
@@ -106,9 +137,36 @@ class Rikiki(object):
 
 			# Add the bot and its details to the bots array
             self.bots.append(new_bot)
-            self.cards[bot_unique_id]=[]
-            self.valid_cards[bot_unique_id]=[]
+            # hands are kept as bitmasks of integer cards (see card_core) and only
+            # converted to lists of strings when they are passed to bots
+            self.cards[bot_unique_id]=0
+            self.valid_cards[bot_unique_id]=0
             self.round_start_pos[bot_unique_id]=new_bot["start_pos"]
+            self.seats[bot_unique_id]=new_bot["start_pos"]
+
+    def reset(self):
+        # Get ready to play another game with the same bot instances, so anything the
+        # bots keep between games (caches, learnt parameters) carries over
+        self.current_round=0
+        self.finished=False
+        self.round_history=[]
+        self.timeouts=[]
+        self.errors=[]
+        # a call still running from the last game is kept, so the bot isn't called twice at once
+        self.late_calls={bot_unique_id: late for bot_unique_id, late in self.late_calls.items()
+                         if not late.done()}
+        for bot in self.bots:
+            bot_unique_id=bot["bot_unique_id"]
+            bot["hands_won"]=0
+            bot["aim_hands_won"]=''
+            bot["score"]=0
+            bot["start_pos"]=self.seats[bot_unique_id]
+            bot["card_played"]=""
+            self.cards[bot_unique_id]=0
+            self.dealt[bot_unique_id]=[]
+            self.valid_cards[bot_unique_id]=0
+            self.round_start_pos[bot_unique_id]=self.seats[bot_unique_id]
+        self.bots=sorted(self.bots, key=lambda k: k['start_pos'])
         
 
 	##########################################
@@ -116,23 +174,78 @@ class Rikiki(object):
 	##########################################
 
     def run_game(self):
+        # the game asks for every bid and card by yielding a request (see game_steps),
+        # which is answered here by calling the bot
+        steps=self.game_steps()
+        try:
+            request=next(steps)
+            while True:
+                try:
+                    decision=self.call_bot(*request)
+                except Exception as e:
+                    # errors are raised in the game, which decides whether to carry on
+                    request=steps.throw(e)
+                else:
+                    request=steps.send(decision)
+        except StopIteration:
+            pass
+
+    def bot_method(self, bot, event):
+        # the method of the bot that makes a decision of this kind
+        if event=="bid":
+            return bot["bot_instance"].get_bid
+        return bot["bot_instance"].play_card
+
+    def call_bot(self, bot, event, info_for_bots):
+        # With a time limit the bot runs in its own thread. A thread that runs out of time
+        # can't be stopped, it carries on in the background and its answer is ignored.
+        # Until it ends the bot gets fallback decisions, so it never runs twice at once
+        method=self.bot_method(bot, event)
+        if self.decision_timeout is None:
+            return method(**info_for_bots)
+
+        late=self.late_calls.get(bot["bot_unique_id"])
+        if late is not None and not late.done():
+            raise DecisionTimeout("{} is still busy with an earlier decision".format(bot["bot_unique_id"]))
+        future=Future()
+        def run():
+            try:
+                future.set_result(method(**info_for_bots))
+            except Exception as e:
+                future.set_exception(e)
+        threading.Thread(target=run, daemon=True).start()
+        try:
+            return future.result(timeout=self.decision_timeout)
+        except TimeoutError:
+            self.late_calls[bot["bot_unique_id"]]=future
+            raise DecisionTimeout("no {} within {} seconds".format(event, self.decision_timeout))
+
+    def game_steps(self):
+        # Generator that plays the game. It yields a (bot, event, info_for_bots) request
+        # whenever a bot has to decide, event being "bid" or "card", and expects to be sent
+        # the bot's get_bid or play_card answer, or to have the bot's error thrown into it.
+        if self.event_log is not None:
+            seat_order=sorted(self.seats, key=lambda k: self.seats[k])
+            self.event_log.start_game(seat_order, self.hell_bridge)
+
         while not self.finished:
             
             for round in self.round_order:
                 #functions for initialising the round (dealing cards etc.)
                 self.__start_round()
-                self.__collect_bids()
+                yield from self.__collect_bids()
                 self.round_history=[]
                 
                 #functions for playing cards
                 for hand in range(round):
-                    self.__play_trick()
+                    yield from self.__play_trick()
                     self.__pick_winner_of_the_hand()
                 
                 self.__update_scores()
                 self.current_round+=1
             
             self.finished=True
+            self.__log_event(game_log.GAME_END)
 
             if self.verbose==True:
                 lst=[bot["score"] for bot in self.bots]
@@ -156,12 +269,20 @@ class Rikiki(object):
         c.deal(len(self.bots),size)
         
         #keep a record of hands of bots
-        for i,bot in enumerate(self.bots):
-            self.cards[bot['bot_unique_id']] = c.hands[i]
+        for i,mask in enumerate(c.hand_masks()):
+            self.cards[self.bots[i]['bot_unique_id']] = mask
+            self.dealt[self.bots[i]['bot_unique_id']] = c.hands[i]
 
         #the trump suit is decided by the deal function in the cards class. 
         self.trump = c.trump
-
+        self.trump_suit = suit_to_int(c.trump)
+
+        if self.event_log is not None:
+            self.__log_event(game_log.ROUND_START, value=size)
+            self.__log_event(game_log.TRUMP, value=self.trump_suit)
+            for bot in self.bots:
+                for card in self.dealt[bot['bot_unique_id']]:
+                    self.__log_event(game_log.DEAL, bot, CARD_INDEX[card])
         
 
     def __collect_bids(self):
@@ -169,34 +290,28 @@ class Rikiki(object):
         # each bots gets sent (public) information on the current state of the game and then uses (private) information
         # on their hand to create a bid value.
         self.totbid=0
-        for bot in self.bots:
+        for position,bot in enumerate(self.bots):
+            # Read-only views of the bots, so the bot can't change the game or other bots
+            snapshot_start=time.perf_counter()
+            bot_views=self.__bot_views()
+            snapshot_seconds=time.perf_counter()-snapshot_start
         
         # Build a dictionary of the data we will pass to bots
             info_for_bots = {
     			"current_round_size":self.round_order[self.current_round],
-    			"bots":self.bots,
+    			"bots":bot_views,
                 "trump": self.trump,
-                "cards": self.cards[bot['bot_unique_id']],
+                "cards": self.__hand(bot, self.cards[bot['bot_unique_id']]),
                 "hells_bridge": False,
+                "my_bot_details": bot_views[position],
     		}
             
             if self.round_order[self.current_round]==1 and self.hell_bridge==True:
-                all_cards=[self.cards[bot['bot_unique_id']][0] for bot in self.bots]
-                all_cards.remove(self.cards[bot['bot_unique_id']][0])
-                info_for_bots["cards"]=all_cards
+                all_cards=[self.cards[other['bot_unique_id']] for other in self.bots if other is not bot]
+                info_for_bots["cards"]=[mask_to_cards(mask)[0] for mask in all_cards]
                 info_for_bots["hells_bridge"]=True
-		# Make a deep copy of the data to pass to bots, so we are not just passing the bot shared references to data
-		# Every bot gets data in completely seperate memory so there is no risk of changing data in other bots or the rikiki object
-            info_for_bots_deep_copy = copy.deepcopy(info_for_bots)
-
-			# Add this bot's details to the data to pass to the bot, but as a deep copy rather than the actual data  
-            info_for_bots_deep_copy["my_bot_details"] = copy.deepcopy(bot)
 			
-			# If the bot raises an error - catch it, log it and either stop the game or carry on with the bot bidding zero
-            try:
-                bid = int(bot["bot_instance"].get_bid(**info_for_bots_deep_copy))
-            except Exception as e:
-                print("Bidding error caught on {} - {}".format(bot["bot_unique_id"], e))
+            bid = yield from self.__decide(bot, "bid", info_for_bots, snapshot_seconds)
             
             #the last bot to bid has an extra condition to follow.
             if self.bots[-1]['bot_instance']==bot['bot_instance'] and self.totbid+bid==self.round_order[self.current_round]:
@@ -205,6 +320,7 @@ class Rikiki(object):
             bot["aim_hands_won"]=bid
             #this variable is updated and used in the condition for the final bot
             self.totbid+=bid
+            self.__log_event(game_log.BID, bot, bid)
 
         if self.verbose==True:
             print("\n")
@@ -217,54 +333,45 @@ class Rikiki(object):
         self.bots = sorted(self.bots, key=lambda k: k['start_pos'])
         self.round_history.append({})
         
-        for bot in self.bots:
+        for position,bot in enumerate(self.bots):
             if self.round_order[self.current_round]==1 and self.hell_bridge==True:
-                bot["card_played"]=self.cards[bot['bot_unique_id']][0]
+                bot["card_played"]=mask_to_cards(self.cards[bot['bot_unique_id']])[0]
             else:
-                if bot["start_pos"]==0:
-                    self.valid_cards[bot['bot_unique_id']]=self.cards[bot['bot_unique_id']]
-                elif bot["start_pos"]==1:
-                    self.__valid_card()
+                self.__valid_card(bot)
+                snapshot_start=time.perf_counter()
+                bot_views=self.__bot_views()
+                history=self.__history_view()
+                snapshot_seconds=time.perf_counter()-snapshot_start
                     
                 # (public) information to let the bot decide what card to play next.    
                 info_for_bots = {
         			"current_round_size":self.round_order[self.current_round],
-        			"bots":self.bots,
+        			"bots":bot_views,
                     "trump": self.trump,
-                    "cards": self.cards[bot['bot_unique_id']],
-                    "history": self.round_history,
+                    "cards": self.__hand(bot, self.cards[bot['bot_unique_id']]),
+                    "history": history,
                     "total_bid": self.totbid,
-                    "valid_cards":self.valid_cards[bot['bot_unique_id']]
+                    "valid_cards":self.__hand(bot, self.valid_cards[bot['bot_unique_id']]),
+                    "my_bot_details": bot_views[position],
         		}
-                
-                
-                info_for_bots_deep_copy = copy.deepcopy(info_for_bots)
-                info_for_bots_deep_copy["my_bot_details"] = copy.deepcopy(bot)
-            
 
-                bot["card_played"] = bot["bot_instance"].play_card(**info_for_bots_deep_copy)
+                bot["card_played"] = yield from self.__decide(bot, "card", info_for_bots, snapshot_seconds)
                 #need to add in that have to follow starting suit, can only play trump when can't follow suit
             self.round_history[-1][bot["bot_unique_id"]]=bot["card_played"]
             
-            self.cards[bot['bot_unique_id']].remove(bot["card_played"])
+            card_bit=1<<CARD_INDEX.get(bot["card_played"],52)
+            if not self.cards[bot['bot_unique_id']]&card_bit:
+                raise ValueError("{} played {}, which is not in their hand".format(bot["bot_unique_id"],bot["card_played"]))
+            self.cards[bot['bot_unique_id']]^=card_bit
+            self.__log_event(game_log.CARD, bot, card_bit.bit_length()-1)
 
         
     def __pick_winner_of_the_hand(self):
         #computes which player won the hand.
-        values = {"2":2, "3":3, "4":4, "5":5, "6":6, "7":7, "8":8, "9":9, "1":10, "J":11, "Q":12, "K":13, "A":14}
-        for bot in self.bots:
-            if bot["start_pos"]==0:
-                current_winner=bot["start_pos"]
-                winning_card=bot["card_played"]
-
-            else:
-                if bot["card_played"][-1]==winning_card[-1] and values[bot["card_played"][0]]>values[winning_card[0]]:
-                    current_winner=bot["start_pos"]
-                    winning_card=bot["card_played"]
-                elif winning_card[-1]!=self.trump and bot["card_played"][-1]==self.trump:
-                    current_winner=bot["start_pos"]
-                    winning_card=bot["card_played"]  
+        # bots are sorted by start_pos, so the index of the winning card is the winner's start_pos
+        current_winner=trick_winner([CARD_INDEX[bot["card_played"]] for bot in self.bots],self.trump_suit)
         self.bots[current_winner]["hands_won"]+=1
+        self.__log_event(game_log.TRICK, self.bots[current_winner])
 
         if self.verbose==True:
             print("\n")
@@ -294,6 +401,7 @@ class Rikiki(object):
                 bot["score"]+=10+2*bot["aim_hands_won"]
             else:
                 bot["score"]-=2*abs(bot["hands_won"]-bot["aim_hands_won"])
+            self.__log_event(game_log.SCORE, bot, bot["score"])
 
         #print info from round    
         if self.verbose==True:
@@ -310,18 +418,92 @@ class Rikiki(object):
             bot['hands_won']=0
             bot['aim_hands_won']=''
                 
-    def __valid_card(self):
-        #checks that the bot plays a card that is in their hand.
-        for bot in self.bots[1:]:
+    def __decide(self, bot, event, info_for_bots, snapshot_seconds):
+        # Ask a bot for its bid or card, reporting the metrics of the decision to the
+        # instrumentation sink if there is one.
+        # If the bot raises an error or runs out of time - catch it, log it and carry on
+        # with a decision made by the fallback bot
+        if self.instrumentation is not None:
+            tracing=tracemalloc.is_tracing()
+            if tracing:
+                tracemalloc.reset_peak()
+            start=time.perf_counter()
+
+        fallback=None
+        try:
+            decision=yield bot, event, info_for_bots
+            if event=="bid":
+                decision=int(decision)
+                if not 0<=decision<=self.round_order[self.current_round]:
+                    raise ValueError("{} is not a bid between 0 and {}".format(decision,self.round_order[self.current_round]))
+            elif not self.valid_cards[bot['bot_unique_id']]>>CARD_INDEX.get(decision,52)&1:
+                raise ValueError("{} is not a card {} may play".format(decision,bot["bot_unique_id"]))
+        except Exception as e:
+            fallback="timeout" if isinstance(e, DecisionTimeout) else "error"
+            decision=self.__fallback(bot, event, info_for_bots, e)
+
+        if self.instrumentation is None:
+            return decision
+        record={
+            "event":event,
+            "round":self.current_round,
+            "round_size":self.round_order[self.current_round],
+            "bot":bot["bot_unique_id"],
+            "seconds":time.perf_counter()-start,
+            "snapshot_seconds":snapshot_seconds,
+            }
+        if tracing:
+            record["peak_bytes"]=tracemalloc.get_traced_memory()[1]
+        if fallback is not None:
+            record["fallback"]=fallback
+        # counters the bot kept for the decision, such as NE_bot's samples and nodes
+        record.update(getattr(bot["bot_instance"], "last_stats", None) or {})
+        self.instrumentation.emit(record)
+        return decision
+
+    def __fallback(self, bot, event, info_for_bots, error):
+        if isinstance(error, DecisionTimeout):
+            self.timeouts.append((self.current_round, bot["bot_unique_id"], event))
+            print("Timeout on {} - {}".format(bot["bot_unique_id"], error))
+        elif event=="bid":
+            print("Bidding error caught on {} - {}".format(bot["bot_unique_id"], error))
+        else:
+            print("Card error caught on {} - {}".format(bot["bot_unique_id"], error))
+        self.__log_error(bot_name=bot["bot_unique_id"], game_stage=event, error_message=str(error))
+
+        if event=="bid":
+            return self.fallback_bot.get_bid(**info_for_bots)
+        return self.fallback_bot.play_card(**info_for_bots)
+
+    def __log_event(self, kind, bot=None, value=0):
+        # Record an event of the game in the event log, if there is one
+        if self.event_log is not None:
+            seat=game_log.NO_SEAT if bot is None else self.seats[bot["bot_unique_id"]]
+            self.event_log.event(kind, self.current_round, seat, value)
+
+    def __log_error(self, bot_name, game_stage, error_message):
+        self.errors.append((bot_name, game_stage, error_message))
+
+    def __bot_views(self):
+        # Snapshot of the public details of every bot, without the bot instances. The views
+        # are read-only and the details are immutable, so one snapshot is shared by everything
+        # passed to a bot instead of deep copying the game for every decision
+        return tuple(MappingProxyType({key: value for key, value in bot.items() if key != "bot_instance"})
+                     for bot in self.bots)
+
+    def __history_view(self):
+        # Read-only snapshot of the cards played so far this round, one view per trick
+        return tuple(MappingProxyType(dict(trick)) for trick in self.round_history)
+
+    def __hand(self, bot, mask):
+        # the cards of a bot's hand in a mask, in the order they were dealt
+        return [card for card in self.dealt[bot['bot_unique_id']] if mask>>CARD_INDEX[card]&1]
+
+    def __valid_card(self, bot):
+        #finds the cards the bot is allowed to play, it has to follow the starting suit if it can.
+        if bot["start_pos"]==0:
+            start_suit=NO_SUIT
+        else:
             start_bot=self.bots[0]["bot_unique_id"]
-            start_suit=self.round_history[-1][start_bot][-1]
-            self.valid_cards[bot['bot_unique_id']]=[]
-            
-            for card in self.cards[bot['bot_unique_id']]:
-                if card[-1]==start_suit:
-                    self.valid_cards[bot['bot_unique_id']].append(card)
-            
-            if len(self.valid_cards[bot['bot_unique_id']])==0:
-                self.valid_cards[bot['bot_unique_id']]=self.cards[bot['bot_unique_id']]
-
-
+            start_suit=CARD_INDEX[self.round_history[-1][start_bot]]//13
+        self.valid_cards[bot['bot_unique_id']]=legal_mask(self.cards[bot['bot_unique_id']],start_suit)
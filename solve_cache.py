@@ -0,0 +1,244 @@
+"""
+Persistent cache of solved positions, shared between games and processes.
+
+SolveCache is a drop-in replacement for the dict passed as cache to
+NE_solver.solve and the functions built on it (find_bid,
+find_best_action_overall, NE_bot's solve_cache). Solves are keyed by canonical
+position, so deals equal up to relabelling share an entry, and the minmax
+scores are kept in an SQLite database:
+
+    cache = SolveCache("solves.sqlite", max_entries=1000000)
+    bot = NE_bot.Bot(solve_cache=cache)
+
+Entries are read through an in-memory copy and new ones are written in
+batches, so a solve costs at most one database read. The database is in
+write-ahead logging mode: any number of processes can read it while one writes
+a batch. When it holds more than max_entries solves, the least recently used
+are evicted.
+
+Solves are stored with marshal, which holds plain data (tuples, dicts and
+numbers), so reading a shared file never runs code the way unpickling does.
+
+Every process keeps one connection and in-memory copy per file. Open it in
+the workers of a process pool with the pool initializer:
+
+    executor = ProcessPoolExecutor(initializer=solve_cache.init_worker,
+                                   initargs=("solves.sqlite",))
+
+A cache sent to a worker with a task (e.g. as find_bid's cache) is then the
+worker's own, not a new connection with an empty memory for every task. A
+worker without the initializer opens the file the first time a task uses it.
+"""
+import marshal
+import sqlite3
+from multiprocessing.util import Finalize
+import threading
+import time
+
+# Caches opened by process_cache in this process, by file
+_process_caches = {}
+
+
+class SolveCache(object):
+    """
+    Mapping from canonical positions to solves, stored in an SQLite file.
+    """
+
+    def __init__(self, path, max_entries=1000000, flush_every=256, memory_entries=100000,
+                 timeout=30.0):
+        """
+        Args:
+        path (str): File of the database, created if needed.
+        max_entries (int): Largest number of solves kept in the file.
+        flush_every (int): Number of new solves written to the file at a time,
+            and of solves read before their use is written.
+        memory_entries (int): Largest number of solves kept in memory by this process.
+        timeout (float): Seconds to wait for another process writing to the file.
+        """
+        self.path = path
+        self.max_entries = max_entries
+        self.flush_every = flush_every
+        self.memory_entries = memory_entries
+        self.timeout = timeout
+        # The connection may be used from other threads, e.g. by the chunks of
+        # simulations run on a thread pool, so it is guarded by a lock
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, timeout=timeout, isolation_level=None,
+                                          check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS solves (key BLOB PRIMARY KEY, value BLOB, used REAL)")
+        self.connection.execute("CREATE INDEX IF NOT EXISTS solves_used ON solves (used)")
+        self.memory = {}
+        # New solves not written yet, and keys read from the file since the last write
+        self.pending = {}
+        self.read_keys = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def encode_key(key):
+        # Keys are tuples of ints, strings and None, whose repr is stable
+        return repr(key).encode()
+
+    @staticmethod
+    def encode_value(value):
+        return marshal.dumps(value)
+
+    @staticmethod
+    def decode_value(data):
+        # None for data that isn't a marshalled solve, e.g. written by an older
+        # version, so it is solved again and replaced
+        try:
+            return marshal.loads(data)
+        except (EOFError, ValueError, TypeError):
+            return None
+
+    def get(self, key, default=None):
+        """
+        Args:
+        key (tuple): A cache key built by NE_solver.
+        default: Returned when the key is not in the cache.
+
+        Returns:
+        The cached solve, or default.
+        """
+        encoded = self.encode_key(key)
+        value = self.memory.get(encoded)
+        if value is None:
+            with self.lock:
+                row = self.connection.execute("SELECT value FROM solves WHERE key = ?",
+                                              (encoded,)).fetchone()
+            value = None if row is None else self.decode_value(row[0])
+            if value is None:
+                self.misses += 1
+                return default
+            self.remember(encoded, value)
+        # Reads served from memory count as uses too, or the most read solves
+        # would look the least recently used
+        self.read_keys.add(encoded)
+        if len(self.read_keys) >= self.flush_every:
+            self.flush()
+        self.hits += 1
+        return value
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __contains__(self, key):
+        # Checking for a solve is not a use of it, so it is neither a hit nor
+        # marks the solve as recently used
+        encoded = self.encode_key(key)
+        if encoded in self.memory or encoded in self.pending:
+            return True
+        with self.lock:
+            row = self.connection.execute("SELECT value FROM solves WHERE key = ?",
+                                          (encoded,)).fetchone()
+        return row is not None and self.decode_value(row[0]) is not None
+
+    def __setitem__(self, key, value):
+        encoded = self.encode_key(key)
+        self.remember(encoded, value)
+        self.pending[encoded] = value
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+
+    def __len__(self):
+        self.flush()
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM solves").fetchone()[0]
+
+    def remember(self, encoded, value):
+        if len(self.memory) >= self.memory_entries:
+            self.memory.clear()
+        self.memory[encoded] = value
+
+    def flush(self):
+        """
+        Write new solves to the file, mark the solves read since the last flush
+        as recently used and evict the least recently used solves if the file
+        is over its size.
+        """
+        if not self.pending and not self.read_keys:
+            return
+        now = time.time()
+        with self.lock, self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO solves (key, value, used) VALUES (?, ?, ?)",
+                [(encoded, self.encode_value(value), now)
+                 for encoded, value in self.pending.items()])
+            self.connection.executemany("UPDATE solves SET used = ? WHERE key = ?",
+                                        [(now, encoded) for encoded in self.read_keys])
+            if self.pending:
+                count = self.connection.execute("SELECT COUNT(*) FROM solves").fetchone()[0]
+                if count > self.max_entries:
+                    # Evict down to 90% of the size so eviction doesn't run on every flush
+                    self.connection.execute(
+                        "DELETE FROM solves WHERE key IN "
+                        "(SELECT key FROM solves ORDER BY used LIMIT ?)",
+                        (count - self.max_entries * 9 // 10,))
+        self.pending.clear()
+        self.read_keys.clear()
+
+    def close(self):
+        if self.connection is not None:
+            self.flush()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __del__(self):
+        # Caches that are never closed explicitly write their last solves when
+        # they are discarded
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def settings(self):
+        return {"max_entries": self.max_entries, "flush_every": self.flush_every,
+                "memory_entries": self.memory_entries, "timeout": self.timeout}
+
+    def __reduce__(self):
+        # Another process gets its own cache of the same file, see process_cache
+        return process_cache, (self.path, self.settings())
+
+
+def process_cache(path, settings=None):
+    """
+    Args:
+    path (str): File of the database.
+    settings (dict): Other arguments of SolveCache, used when the file is opened.
+
+    Returns:
+    SolveCache: The cache of the file opened in this process, opened the first
+    time it is asked for.
+    """
+    cache = _process_caches.get(path)
+    if cache is None:
+        cache = _process_caches[path] = SolveCache(path, **(settings or {}))
+        # Worker processes end without discarding their objects, so the last
+        # solves are written when the process exits
+        Finalize(cache, cache.close, exitpriority=0)
+    return cache
+
+
+def init_worker(path, settings=None):
+    """
+    Process pool initializer opening the cache of a file in every worker.
+
+    Args:
+    path (str): File of the database.
+    settings (dict): Other arguments of SolveCache.
+    """
+    process_cache(path, settings)
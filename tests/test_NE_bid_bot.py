@@ -0,0 +1,138 @@
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import NE_bid_bot
+import NE_card_bot
+from cards import Cards
+from NE_bid_bot import leader_margin, merge_counts
+from test_NE_solver import BOTS, HISTORY, ROOT
+
+
+def test_merge_counts_skips_missing_results():
+    assert merge_counts([{'a': 1}, None, {}, {'a': 2, 'b': 1}]) == {'a': 3, 'b': 1}
+
+
+def test_leader_margin_counts_missing_results_as_zero():
+    assert leader_margin([{'a': 2, 'b': 1}, None, {}]) == \
+        leader_margin([{'a': 2, 'b': 1}, {}, {}])
+
+
+def test_stratified_samples_without_scores(monkeypatch):
+    # Every other sample is rejected and the accepted ones come back unscored
+    outcomes = iter([[1, 1, 0], [0, 0, 0]] * 10)
+
+    def solve_deal(hand_masks, trump, root, setup, mode, stats, cache, tables):
+        return next(outcomes), {}
+
+    monkeypatch.setattr(NE_card_bot, 'solve_deal', solve_deal)
+    random.seed(0)
+    stats = {}
+    result = NE_card_bot.sample_actions(['KS', '2D'], 'C', ROOT, HISTORY, BOTS[0], BOTS, p=0,
+                                        stratify=True, nreps=20, stats=stats)
+    assert result == {}
+    assert stats['samples'] == 20
+    assert stats['accepted'] == 10
+
+
+def slow_solve(*args, **kwargs):
+    time.sleep(0.02)
+    return [1, 1, 0]
+
+
+@pytest.mark.parametrize('executor', [None, 'threads'])
+def test_find_bid_keeps_to_the_deadline(monkeypatch, executor):
+    monkeypatch.setattr(NE_bid_bot, 'solve_nash_bids', slow_solve)
+    pool = ThreadPoolExecutor(2) if executor else None
+    start = time.monotonic()
+    stats = {}
+    result = NE_bid_bot.find_bid(['KS', '2D'], ['', '', ''], 'C', 0, ROOT, nreps=1000,
+                                 executor=pool, chunk_size=100, deadline_s=0.2, stats=stats)
+    elapsed = time.monotonic() - start
+    if pool:
+        pool.shutdown()
+    # A chunk of 100 samples alone takes 2 seconds
+    assert elapsed < 0.4
+    assert result == {1: stats['accepted']}
+    assert 0 < stats['samples'] < 100
+
+
+def test_find_best_action_overall_keeps_to_the_deadline(monkeypatch):
+    def solve_deal(*args, **kwargs):
+        time.sleep(0.02)
+        return [1, 1, 0], {'KS': [1, 0, 0], '2D': [0, 1, 0]}
+
+    monkeypatch.setattr(NE_card_bot, 'solve_deal', solve_deal)
+    start = time.monotonic()
+    stats = {}
+    NE_card_bot.find_best_action_overall(['KS', '2D'], 'C', ROOT, HISTORY, BOTS[0], BOTS,
+                                         nreps=1000, chunk_size=100, deadline_s=0.2,
+                                         stratify=True, stats=stats)
+    assert time.monotonic() - start < 0.4
+    assert 0 < stats['samples'] < 100
+
+
+# The strata every chunk was run with
+CHUNK_STRATA = []
+
+
+def recording_samples(*args, nreps, stats, deadline, strata=None):
+    # Stands in for sample_bids, recording the strata of every chunk
+    CHUNK_STRATA.append(strata)
+    return {}
+
+
+@pytest.mark.parametrize('seed', [1, 2])
+def test_strata_are_allocated_over_every_chunk(monkeypatch, seed):
+    hand = ['AH', '3S', '9D']
+    cards = Cards(excluded_cards=hand)
+    splits, weights = cards.suit_splits([3, 3], 'H')
+    expected = {split: 40 * weight / sum(weights) for split, weight in zip(splits, weights)}
+
+    monkeypatch.setattr(NE_bid_bot, 'sample_bids', recording_samples)
+    del CHUNK_STRATA[:]
+    NE_bid_bot.find_bid(hand, ['', '', ''], 'H', 0, ROOT, nreps=40, seed=seed, chunk_size=5,
+                        stratify=True)
+    assert [len(strata) for strata in CHUNK_STRATA] == [5] * 8
+    allocation = [split for strata in CHUNK_STRATA for split in strata]
+    # Rounded once over the 40 simulations, not in every chunk of 5
+    for split, share in expected.items():
+        assert abs(allocation.count(split) - share) < 1
+
+    first = list(CHUNK_STRATA)
+    del CHUNK_STRATA[:]
+    NE_bid_bot.find_bid(hand, ['', '', ''], 'H', 0, ROOT, nreps=40, seed=seed, chunk_size=5,
+                        stratify=True)
+    assert CHUNK_STRATA == first
+
+
+def test_suit_splits_weights_count_the_deals():
+    # Two cards of hearts and one other left, two players dealt one card each
+    cards = Cards()
+    cards.deck = ['2H', '3H', '4S']
+    splits, weights = cards.suit_splits([1, 1], 'H')
+    # Splits give the hearts of each player and last the hearts nobody is dealt
+    assert dict(zip(splits, weights)) == {(1, 1, 0): 2, (0, 1, 1): 2, (1, 0, 1): 2}
+
+
+def margin_samples(counts, nreps, stats, deadline):
+    # Stands in for sample_bids, with margin stats of its own
+    stats.update(samples=nreps, margin=nreps, standard_error=1.0)
+    return dict(counts)
+
+
+@pytest.mark.parametrize('counts, nreps', [({}, 10), ({1: 4, 2: 1}, 5), ({1: 4, 2: 1}, 10)])
+def test_chunk_margins_are_not_added_up(counts, nreps):
+    # The stats hold a margin from an earlier call
+    stats = {'margin': 7, 'standard_error': 2.0}
+    NE_bid_bot.run_sample_chunks(margin_samples, (counts,), nreps=nreps, seed=0, chunk_size=5,
+                                 stats=stats)
+    assert stats['samples'] == nreps
+    margin = leader_margin([counts] * (nreps // 5))
+    if margin is None:
+        # No sample was accepted, or a single chunk has no spread
+        assert 'margin' not in stats and 'standard_error' not in stats
+    else:
+        assert (stats['margin'], stats['standard_error']) == margin
@@ -0,0 +1,207 @@
+import random
+
+from card_core import NO_SUIT, SUIT_MASKS, cards_to_mask, int_to_card, mask_to_ints, suit_to_int
+from cards import Cards
+from NE_bid_bot import create_full_tree, find_nash_bids
+from NE_card_bot import (
+    deal_hands,
+    deal_setup,
+    find_nash_scores,
+    get_root_action_scores,
+    solve_deal
+)
+from NE_solver import (
+    NashSolver,
+    canonical_key,
+    canonical_position,
+    payoff,
+    position_from_key,
+    solve
+)
+
+BOTS = [{'bot_unique_id': 'NE_bot-1', 'aim_hands_won': 1, 'start_pos': 0},
+        {'bot_unique_id': 'basic_bot_v2-2', 'aim_hands_won': 1, 'start_pos': 1},
+        {'bot_unique_id': 'basic_bot-3', 'aim_hands_won': 0, 'start_pos': 2}]
+ROOT = {'name': 'root', 'score': [0] * 3, 'trick_end': 1, 'player_id': 0, 'starting_suit': '',
+        'depth': 0, 'cards_played_in_trick': [], 'previous_trick_winner': 0, 'cards_played': [],
+        'minmax_score': []}
+HISTORY = [{'NE_bot-1': 'AH', 'basic_bot_v2-2': '7S', 'basic_bot-3': '10H'}, {}]
+
+
+def test_shared_tables_score_every_card():
+    # A position met again at the end of the path must still get its card scores
+    setup = deal_setup(['KS', '2D'], HISTORY, BOTS[0], BOTS)
+    random.seed(1)
+    deals = [[cards_to_mask(hand) for hand in deal_hands(setup)] for _ in range(200)]
+    tables = {}
+    for index, deal in enumerate(deals):
+        random.seed(index)
+        _, alone = solve_deal(list(deal), 'C', ROOT, setup, mode='exact', stats=None,
+                              cache=None, tables=None)
+        random.seed(index)
+        _, shared = solve_deal(list(deal), 'C', ROOT, setup, mode='exact', stats=None,
+                               cache=None, tables=tables)
+        assert sorted(shared) == ['2D', 'KS']
+        assert shared == alone
+
+
+def solve_in_order(positions, trump):
+    # Trick counts of 2-player positions, solved one after the other on shared tables
+    tables = {}
+    values = []
+    for hand_masks in positions:
+        n_cards = bin(hand_masks[0] | hand_masks[1]).count('1')
+        solver = NashSolver(n_cards, 2, list(hand_masks), trump, [0, 0], tables=tables)
+        values.append(solver.search(0, 0, 2, NO_SUIT, -1, -1, 0))
+    return values
+
+
+def relabel(hand_masks, suits):
+    # Move every suit to suits[suit] and spread its cards over new ranks
+    relabelled = [0] * len(hand_masks)
+    live = 0
+    for hand in hand_masks:
+        live |= hand
+    for suit in range(4):
+        cards = mask_to_ints(live & SUIT_MASKS[suit])
+        for card, rank in zip(cards, sorted(random.sample(range(13), len(cards)))):
+            for player, hand in enumerate(hand_masks):
+                if hand >> card & 1:
+                    relabelled[player] |= 1 << (suits[suit] * 13 + rank)
+    return relabelled
+
+
+def test_relabelled_positions_solve_alike_in_either_order():
+    # Two players only, so tied moves have equal values and can't hide a difference
+    random.seed(1)
+    for _ in range(200):
+        deck = random.sample(range(52), 8)
+        position = [sum(1 << card for card in deck[:4]), sum(1 << card for card in deck[4:])]
+        trump = random.choice([0, NO_SUIT])
+        relabelled = relabel(position, [0] + random.sample([1, 2, 3], 3))
+        assert solve_in_order([position, relabelled], trump) == \
+            solve_in_order([relabelled, position], trump)
+
+
+def root(n_players):
+    return {'name': 'root', 'score': [0] * n_players, 'trick_end': 1,
+            'player_id': n_players - 1, 'starting_suit': '', 'depth': 0,
+            'cards_played_in_trick': [], 'previous_trick_winner': 0, 'cards_played': [],
+            'minmax_score': []}
+
+
+def small_deals(count):
+    # Seeded deals of 2 to 4 players, small enough to build the full game tree of
+    for seed in range(count):
+        random.seed(seed)
+        n_players = random.randint(2, 4)
+        hand_size = random.randint(1, 4 if n_players < 4 else 3)
+        cards = Cards()
+        cards.shuffle()
+        cards.deal(n_players, hand_size)
+        bids = [random.randint(0, hand_size) for _ in range(n_players)]
+        yield n_players, hand_size, cards, bids
+
+
+def test_solver_matches_the_game_tree(monkeypatch):
+    # Ties go to the first child in both, so the values must match exactly
+    monkeypatch.setattr(random, 'choice', lambda values: values[0])
+    for n_players, hand_size, cards, bids in small_deals(40):
+        depth = n_players * hand_size
+        trump = suit_to_int(cards.trump)
+        tree = create_full_tree(depth, n_players, cards, cards.trump, root(n_players))
+        find_nash_bids(tree)
+        tricks, _ = solve(depth, n_players, cards.hand_masks(), trump, root(n_players))
+        assert list(tricks) == list(tree.get_minmax_score(0))
+
+        tree = create_full_tree(depth, n_players, cards, cards.trump, root(n_players))
+        find_nash_scores(tree, bids)
+        scores, action_scores = solve(depth, n_players, cards.hand_masks(), trump,
+                                      root(n_players), bids)
+        assert list(scores) == list(tree.get_minmax_score(0))
+        assert {int_to_card(card): list(value) for card, value in action_scores.items()} == \
+            {card: list(value) for card, value in get_root_action_scores(tree).items()}
+
+
+def rank(value, player_id, bids):
+    # How the player moving ranks a value, as NashSolver.choose does
+    return value[player_id] if bids is None else len(value) * value[player_id] - sum(value)
+
+
+def leaf_value(tree, node, bids):
+    score = list(tree.get_score(node))
+    return score if bids is None else payoff(score, bids)
+
+
+def maxn_values(tree, node, bids):
+    # Every value plain max^n can give the node, whichever way ties are broken
+    children = list(tree.children(node))
+    if not children:
+        return {tuple(leaf_value(tree, node, bids))}
+    player_id = tree.player[children[0]]
+    child_values = [maxn_values(tree, child, bids) for child in children]
+    worst = [min(rank(value, player_id, bids) for value in values) for values in child_values]
+    result = set()
+    for index, values in enumerate(child_values):
+        # A value is chosen if it is as good as the worst the other children can give
+        floor = max(worst[:index] + worst[index + 1:], default=float('-inf'))
+        result |= {value for value in values if rank(value, player_id, bids) >= floor}
+    return result
+
+
+def paranoid_rank(tree, node, bids, perspective):
+    # Plain minimax of the perspective player's rank against everyone else
+    children = list(tree.children(node))
+    if not children:
+        return rank(leaf_value(tree, node, bids), perspective, bids)
+    ranks = [paranoid_rank(tree, child, bids, perspective) for child in children]
+    return max(ranks) if tree.player[children[0]] == perspective else min(ranks)
+
+
+def test_pruned_and_paranoid_match_plain_search():
+    for n_players, hand_size, cards, bids in small_deals(120):
+        depth = n_players * hand_size
+        trump = suit_to_int(cards.trump)
+        tree = create_full_tree(depth, n_players, cards, cards.trump, root(n_players))
+        children = list(tree.children(0))
+        perspective = tree.player[children[0]]
+        for objective in (None, bids):
+            # Pruning only skips moves that can't be chosen, so the value is one
+            # plain max^n gives with some tie-breaking
+            pruned, _ = solve(depth, n_players, cards.hand_masks(), trump, root(n_players),
+                              objective, mode='pruned')
+            assert tuple(pruned) in maxn_values(tree, 0, objective)
+
+            paranoid, action_scores = solve(depth, n_players, cards.hand_masks(), trump,
+                                            root(n_players), objective, mode='paranoid')
+            assert rank(paranoid, perspective, objective) == \
+                paranoid_rank(tree, 0, objective, perspective)
+            for child in children:
+                assert rank(action_scores[tree.card[child]], perspective, objective) == \
+                    paranoid_rank(tree, child, objective, perspective)
+
+
+def test_canonical_position_maps_back_to_the_position():
+    random.seed(2)
+    for _ in range(200):
+        n_players = random.randint(2, 4)
+        deck = random.sample(range(52), 3 * n_players)
+        hand_masks = [sum(1 << card for card in deck[player::n_players])
+                      for player in range(n_players)]
+        trump = random.choice([NO_SUIT, 0, 1, 2, 3])
+        key, to_original = canonical_position(hand_masks, trump, 1)
+        canonical_hands, canonical_trump, leader = position_from_key(key, n_players)
+        assert leader == 1
+        assert [sum(1 << to_original[card] for card in mask_to_ints(hand))
+                for hand in canonical_hands] == hand_masks
+        if canonical_trump != NO_SUIT:
+            assert to_original[0] // 13 == trump
+        # Any relabelling of the position shares its key
+        suits = [0, 1, 2, 3]
+        if trump == NO_SUIT:
+            random.shuffle(suits)
+        else:
+            others = random.sample([suit for suit in suits if suit != trump], 3)
+            suits = [trump if suit == trump else others.pop() for suit in suits]
+        relabelled = relabel(hand_masks, suits)
+        assert canonical_key(relabelled, suits[trump] if trump != NO_SUIT else NO_SUIT, 1) == key
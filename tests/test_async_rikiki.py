@@ -0,0 +1,75 @@
+import asyncio
+import random
+import types
+
+import pytest
+
+from async_rikiki import AsyncRikiki, SyncBotAdapter, is_async_bot
+from bots import basic_bot, basic_bot_v2
+import game_log
+from rikiki import Rikiki
+
+
+class AsyncBot(basic_bot_v2.Bot):
+    # basic_bot_v2 with coroutine methods
+    async def get_bid(self, **info_for_bots):
+        await asyncio.sleep(0)
+        return super().get_bid(**info_for_bots)
+
+    async def play_card(self, **info_for_bots):
+        await asyncio.sleep(0)
+        return super().play_card(**info_for_bots)
+
+
+ASYNC_BOT = types.SimpleNamespace(Bot=AsyncBot)
+
+
+def logged_game(engine, room, path, seed, **settings):
+    with game_log.GameLogWriter(str(path)) as log:
+        game = engine(room=room, round_movement='both', minmax_size=[1, 5], event_log=log, **settings)
+        # The game reseeds the random stream when it is made
+        random.seed(seed)
+        if engine is AsyncRikiki:
+            asyncio.run(game.run_game())
+        else:
+            game.run_game()
+    return game, game_log.read_log(str(path))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_async_game_plays_like_the_sync_one(tmp_path, seed):
+    room = [basic_bot, basic_bot_v2, basic_bot_v2, basic_bot]
+    sync_game, sync_log = logged_game(Rikiki, room, tmp_path / 'sync.rkl', seed)
+    async_game, async_log = logged_game(AsyncRikiki, room, tmp_path / 'async.rkl', seed)
+    assert async_game.finished
+    assert async_log == sync_log
+    assert [bot['score'] for bot in async_game.bots] == [bot['score'] for bot in sync_game.bots]
+
+
+def test_async_bots_are_awaited(tmp_path):
+    room = [ASYNC_BOT, basic_bot_v2, ASYNC_BOT]
+    sync_room = [basic_bot_v2] * 3
+    sync_game, sync_log = logged_game(Rikiki, sync_room, tmp_path / 'sync.rkl', 1)
+    async_game, async_log = logged_game(AsyncRikiki, room, tmp_path / 'async.rkl', 1)
+    wrapped = [isinstance(bot['bot_instance'], SyncBotAdapter) for bot in
+               sorted(async_game.bots, key=lambda bot: bot['bot_unique_id'])]
+    assert wrapped == [False, True, False]
+    assert async_log[2] == sync_log[2]
+    assert not async_game.errors
+
+
+def test_tables_run_concurrently():
+    async def play(tables):
+        await asyncio.gather(*(table.run_game() for table in tables))
+
+    tables = [AsyncRikiki(room=[ASYNC_BOT, basic_bot_v2], minmax_size=[1, 3]) for _ in range(5)]
+    asyncio.run(play(tables))
+    assert all(table.finished and not table.errors for table in tables)
+
+
+def test_only_coroutine_bots_are_async():
+    assert is_async_bot(AsyncBot())
+    assert not is_async_bot(basic_bot_v2.Bot())
+    adapter = SyncBotAdapter(basic_bot_v2.Bot())
+    assert adapter.name == 'basic_bot_v2'
+    assert not adapter.busy
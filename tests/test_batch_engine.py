@@ -0,0 +1,109 @@
+import random
+
+import numpy as np
+import pytest
+
+import batch_engine
+from batch_engine import BatchRikiki
+from card_core import CARD_NAMES, SUITS, cards_to_mask
+import rikiki
+from rikiki import Rikiki
+
+
+def record_games(n_games, n_players, round_movement, minmax_size, hell_bridge, seed):
+    # Play batch games with basic bot policies and random bids, recording the deals and decisions
+    rng = np.random.default_rng(seed)
+    engine = BatchRikiki(n_games, n_players, round_movement, minmax_size, hell_bridge, rng)
+    observation = engine.reset()
+    policies = [batch_engine.basic_bot_v2_policy, batch_engine.basic_bot_policy] * 3
+    deals = []
+    decisions = [{} for _ in range(n_games)]
+    done = False
+    while not done:
+        if engine.phase == 'bid' and engine.turn == 0:
+            deals.append((engine.hands.copy(), engine.trump.copy()))
+        actions = np.zeros(n_games, dtype=np.int64)
+        for seat in range(n_players):
+            actions = np.where(observation['player'] == seat, policies[seat](observation, rng), actions)
+        if engine.phase == 'bid':
+            # bids that may add up to the number of cards, to check the last bidder's restriction
+            random_bids = rng.integers(0, engine.round_size + 1, n_games)
+            actions = np.where(rng.random(n_games) < 0.5, random_bids, actions)
+        for game in range(n_games):
+            key = (engine.current_round, engine.phase, engine.tricks_played, int(observation['player'][game]))
+            decisions[game][key] = int(actions[game])
+        observation, _, done = engine.step(actions)
+    return engine.scores, deals, decisions
+
+
+def replay_game(monkeypatch, game, n_players, deals, decisions, **settings):
+    # Play one recorded batch game with Rikiki, dealing the same hands and making the same decisions
+    state = {'round': -1}
+
+    class RecordedCards(object):
+        def shuffle(self):
+            pass
+
+        def deal(self, n_players, size):
+            state['round'] += 1
+            hands, trump = deals[state['round']]
+            # the batch engine deals by seat, Rikiki by position in the round
+            seats = [(position + state['round']) % n_players for position in range(n_players)]
+            self.hands = [[CARD_NAMES[card] for card in np.flatnonzero(hands[game, seat])]
+                          for seat in seats]
+            self.trump = SUITS[trump[game]] if trump[game] >= 0 else "None"
+
+        def hand_masks(self):
+            return [cards_to_mask(hand) for hand in self.hands]
+
+    monkeypatch.setattr(rikiki, 'Cards', RecordedCards)
+
+    def bot_module(seat):
+        class Bot(object):
+            name = 'recorded'
+
+            def get_bid(self, **info_for_bots):
+                self.tricks = 0
+                return decisions[game][(state['round'], 'bid', 0, seat)]
+
+            def play_card(self, **info_for_bots):
+                card = decisions[game][(state['round'], 'play', self.tricks, seat)]
+                self.tricks += 1
+                return CARD_NAMES[card]
+
+        return type('module', (), {'Bot': Bot})
+
+    reference = Rikiki(room=[bot_module(seat) for seat in range(n_players)], **settings)
+    reference.run_game()
+    assert not reference.errors
+    scores = {bot['bot_unique_id']: bot['score'] for bot in reference.bots}
+    return [scores['recorded-{}'.format(seat + 1)] for seat in range(n_players)]
+
+
+@pytest.mark.parametrize('seed', range(12))
+def test_batch_games_score_like_rikiki(monkeypatch, seed):
+    settings = random.Random(seed)
+    n_players = settings.randint(2, 5)
+    largest = settings.randint(1, min(10, 52 // n_players))
+    minmax_size = [settings.randint(1, largest), largest]
+    round_movement = settings.choice(['up', 'down', 'both'])
+    hell_bridge = settings.random() < 0.5
+    scores, deals, decisions = record_games(3, n_players, round_movement, minmax_size, hell_bridge, seed)
+    for game in range(3):
+        reference = replay_game(monkeypatch, game, n_players, deals, decisions,
+                                round_movement=round_movement, minmax_size=minmax_size,
+                                hell_bridge=hell_bridge)
+        assert reference == list(scores[game])
+
+
+def test_full_deck_has_no_trump():
+    engine = BatchRikiki(4, 4, minmax_size=[13, 13], rng=np.random.default_rng(0))
+    observation = engine.reset()
+    assert (observation['trump'] == -1).all()
+    assert engine.hands.sum(axis=(1, 2)).tolist() == [52] * 4
+
+
+def test_play_games_is_reproducible():
+    policies = [batch_engine.basic_bot_v2_policy, batch_engine.basic_bot_policy, batch_engine.basic_bot_policy]
+    first = batch_engine.play_games(8, policies, minmax_size=[1, 5], seed=3)
+    assert (first == batch_engine.play_games(8, policies, minmax_size=[1, 5], seed=3)).all()
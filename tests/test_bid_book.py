@@ -0,0 +1,85 @@
+import itertools
+import pickle
+import random
+
+from bid_book import BidBook, _solve_situation, bidding_key, bidding_situations, build_book, canonical_hands, write_book
+from card_core import FULL_DECK_MASK, SUITS, mask_to_cards
+
+DECK = mask_to_cards(FULL_DECK_MASK)
+
+
+def relabel_others(hand, trump, rng):
+    # The hand with the suits other than trumps relabelled at random
+    others = [suit for suit in SUITS if suit != trump]
+    relabelled = dict(zip(others, rng.sample(others, len(others))))
+    relabelled[trump] = trump
+    return [card[:-1] + relabelled[card[-1]] for card in hand]
+
+
+def test_bidding_key_ignores_the_labels_of_other_suits():
+    rng = random.Random(0)
+    for _ in range(200):
+        hand = rng.sample(DECK, rng.randint(1, 6))
+        trump = rng.choice(SUITS)
+        bids = [rng.randint(0, 3) for _ in range(rng.randint(0, 3))] + ['']
+        assert bidding_key(hand, bids, trump) == bidding_key(relabel_others(hand, trump, rng), bids, trump)
+        assert bidding_key(hand, bids, trump) == bidding_key(hand[::-1], bids, trump)
+
+
+def test_canonical_hands_cover_every_hand_once():
+    for hand_size in range(1, 4):
+        keys = {bidding_key(list(hand), [''], 'H') for hand in itertools.combinations(DECK, hand_size)}
+        hands = canonical_hands(hand_size)
+        assert len(hands) == len(keys)
+        assert {bidding_key(hand, [''], 'H') for hand in hands} == keys
+
+
+def test_lookup_returns_what_was_written(tmp_path):
+    rng = random.Random(1)
+    entries = {}
+    for _ in range(300):
+        n_players = rng.randint(2, 5)
+        hand = rng.sample(DECK, rng.randint(1, 4))
+        position = rng.randrange(n_players)
+        bids = [rng.randint(0, len(hand)) for _ in range(position)] + [''] * (n_players - position)
+        entries[bidding_key(hand, bids, 'S')] = (hand, bids, {bid: rng.randint(1, 100) for bid in
+                                                              rng.sample(range(len(hand) + 1), 2)})
+    path = str(tmp_path / 'bids.book')
+    write_book(path, {key: counts for key, (_, _, counts) in entries.items()})
+    book = BidBook(path)
+    assert book.n_entries == len(entries)
+    for hand, bids, counts in entries.values():
+        assert book.lookup(hand, bids, 'S') == counts
+        assert book.lookup(relabel_others(hand, 'S', rng), bids, 'S') == counts
+    assert book.lookup(['2H', '3H', '4H', '5H', '6H'], ['', ''], 'S') is None
+    copy = pickle.loads(pickle.dumps(book))
+    hand, bids, counts = next(iter(entries.values()))
+    assert copy.lookup(hand, bids, 'S') == counts
+    book.close()
+    copy.close()
+
+
+def test_empty_book_covers_nothing(tmp_path):
+    path = str(tmp_path / 'empty.book')
+    write_book(path, {})
+    assert BidBook(path).lookup(['AH'], ['', ''], 'H') is None
+
+
+def test_built_book_covers_every_situation(tmp_path):
+    path = str(tmp_path / 'bids.book')
+    count = build_book(path, hand_sizes=[1], player_counts=[2], nreps=5)
+    situations = list(bidding_situations(1, 2))
+    assert count == len(situations)
+    book = BidBook(path)
+    for hand, bids in situations:
+        # samples inconsistent with the bids made before are rejected, so there may be fewer
+        counts = book.lookup(hand, bids, 'H')
+        assert counts is not None
+        assert sum(counts.values()) <= 5
+        assert set(counts) <= {0, 1}
+        assert counts == _solve_situation((hand, bids, 5, 0.2, 'exact', 0))[1]
+    # the same seed solves every situation the same way
+    again = str(tmp_path / 'again.book')
+    build_book(again, hand_sizes=[1], player_counts=[2], nreps=5)
+    with open(path, 'rb') as first, open(again, 'rb') as second:
+        assert first.read() == second.read()
@@ -0,0 +1,74 @@
+import random
+
+import pytest
+
+from card_core import (
+    CARD_NAMES,
+    FULL_DECK_MASK,
+    NO_SUIT,
+    SUIT_MASKS,
+    beating_mask,
+    beats,
+    card_to_int,
+    cards_to_mask,
+    int_to_card,
+    legal_mask,
+    lowest_card,
+    mask_to_cards,
+    mask_to_ints,
+    suit_to_int,
+    trick_winner
+)
+
+VALUES = {'2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7, '8': 8, '9': 9, '10': 10, 'J': 11,
+          'Q': 12, 'K': 13, 'A': 14}
+
+
+def string_trick_winner(played_cards, trump):
+    # The string version the engine used before cards were ints
+    current_winner = played_cards[0]
+    for card in played_cards[1:]:
+        if card[-1] == current_winner[-1] and VALUES[card[:-1]] > VALUES[current_winner[:-1]]:
+            current_winner = card
+        elif current_winner[-1] != trump and card[-1] == trump:
+            current_winner = card
+    return played_cards.index(current_winner)
+
+
+def test_conversions_round_trip():
+    for card, name in enumerate(CARD_NAMES):
+        assert card_to_int(name) == card
+        assert int_to_card(card) == name
+    cards = ['10H', 'AS', '2C', 'QD']
+    assert sorted(mask_to_cards(cards_to_mask(cards))) == sorted(cards)
+    assert mask_to_ints(FULL_DECK_MASK) == list(range(52))
+    assert suit_to_int('') == NO_SUIT
+
+
+def test_legal_mask_follows_suit_when_it_can():
+    hand = cards_to_mask(['2H', 'KH', '5S'])
+    assert legal_mask(hand, suit_to_int('H')) == cards_to_mask(['2H', 'KH'])
+    assert legal_mask(hand, suit_to_int('C')) == hand
+    assert legal_mask(hand, NO_SUIT) == hand
+
+
+@pytest.mark.parametrize('trump', [NO_SUIT, 0, 1, 2, 3])
+def test_beating_mask_matches_beats(trump):
+    for winning_card in range(52):
+        mask = beating_mask(winning_card, trump)
+        assert [card for card in range(52) if beats(card, winning_card, trump)] == \
+            mask_to_ints(mask)
+
+
+def test_trick_winner_matches_the_string_rules():
+    random.seed(0)
+    for _ in range(2000):
+        trick = random.sample(CARD_NAMES, random.randint(2, 5))
+        trump = random.choice(['H', 'S', 'C', 'D', ''])
+        assert trick_winner([card_to_int(card) for card in trick], suit_to_int(trump)) == \
+            string_trick_winner(trick, trump)
+
+
+def test_lowest_card_breaks_rank_ties_by_suit():
+    assert int_to_card(lowest_card(cards_to_mask(['9H', '4S', '4C', 'AD']))) == '4S'
+    assert lowest_card(SUIT_MASKS[3]) == 39
@@ -0,0 +1,69 @@
+import itertools
+import random
+from collections import Counter
+
+import pytest
+
+from cards import Cards
+from NE_card_bot import suit_voids
+
+# Eight cards in play: the hearts and spades from jack up
+SMALL_DECK = [rank + suit for suit in 'HS' for rank in ('J', 'Q', 'K', 'A')]
+EXCLUDED = [card for card in Cards().deck if card not in SMALL_DECK]
+
+
+def constrained_deals(hand_sizes, voids, known_cards):
+    # Every deal of SMALL_DECK that deal_constrained may give, as hands of sorted cards
+    free = [card for card in SMALL_DECK if not any(card in hand for hand in known_cards)]
+    deals = set()
+    for order in itertools.permutations(free):
+        hands, start = [], 0
+        for player, size in enumerate(hand_sizes):
+            hand = list(order[start:start + size]) + list(known_cards[player])
+            start += size
+            if any(card[-1] in voids[player] for card in order[start - size:start]):
+                break
+            hands.append(tuple(sorted(hand)))
+        else:
+            deals.add(tuple(hands))
+    return deals
+
+
+def test_deal_constrained_keeps_to_the_constraints():
+    random.seed(0)
+    voids = [('H',), (), ('S',)]
+    known_cards = [['AH'], [], []]
+    for _ in range(200):
+        cards = Cards(excluded_cards=EXCLUDED)
+        cards.deal_constrained([2, 3, 2], voids, known_cards)
+        dealt = [card for hand in cards.hands for card in hand]
+        assert sorted(dealt) == sorted(SMALL_DECK)
+        assert [len(hand) for hand in cards.hands] == [3, 3, 2]
+        assert 'AH' in cards.hands[0]
+        for hand, void in zip(cards.hands, voids):
+            assert not any(card[-1] in void for card in hand if card != 'AH')
+
+
+def test_deal_constrained_deals_every_deal_alike():
+    random.seed(1)
+    hand_sizes, voids, known_cards = [2, 2], [('H',), ()], [[], ['AS']]
+    deals = constrained_deals(hand_sizes, voids, known_cards)
+    counts = Counter()
+    n_draws = 200 * len(deals)
+    for _ in range(n_draws):
+        cards = Cards(excluded_cards=EXCLUDED)
+        cards.deal_constrained(hand_sizes, voids, known_cards)
+        counts[tuple(tuple(sorted(hand)) for hand in cards.hands)] += 1
+    assert set(counts) == deals
+    # Each count is about 200, binomial with a standard deviation of about 14
+    assert all(130 < count < 270 for count in counts.values())
+
+
+def test_deal_constrained_fails_without_a_deal():
+    with pytest.raises(ValueError):
+        Cards(excluded_cards=EXCLUDED).deal_constrained([3, 3], [('H',), ('H',)])
+
+
+def test_suit_voids_from_the_history():
+    history = [{'a': 'KH', 'b': '2S', 'c': '5H'}, {'c': '3D', 'a': '4D', 'b': 'JC'}]
+    assert suit_voids(history, ['a', 'b', 'c']) == [(), ('D', 'H'), ()]
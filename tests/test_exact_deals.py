@@ -0,0 +1,120 @@
+import itertools
+
+import pytest
+
+from bots import NE_bot
+from card_core import CARD_INDEX, FULL_DECK_MASK, NO_SUIT, cards_to_mask, trick_winner
+from exact_deals import card_runs, deal_classes, exact_bid, hells_bridge_bid, turn_up_weight
+from NE_solver import solve
+
+POOL = ['2H', '5H', '9H', 'KH', '3S', '7S', 'AD', '4C', 'JC']
+
+
+def root(n_players):
+    return {'name': 'root', 'score': [0] * n_players, 'trick_end': 1, 'player_id': n_players - 1,
+            'starting_suit': '', 'depth': 0, 'cards_played_in_trick': [], 'previous_trick_winner': 0,
+            'cards_played': [], 'minmax_score': []}
+
+
+def every_deal(pool_mask, hand_sizes, voids=None):
+    # Every deal of the pool as hand masks, by brute force
+    cards = [card for card in range(52) if pool_mask >> card & 1]
+    voids = voids or [()] * len(hand_sizes)
+
+    def deal(cards, player):
+        if player == len(hand_sizes):
+            yield []
+            return
+        for hand in itertools.combinations(cards, hand_sizes[player]):
+            if any(card // 13 in voids[player] for card in hand):
+                continue
+            rest = [card for card in cards if card not in hand]
+            for hands in deal(rest, player + 1):
+                yield [sum(1 << card for card in hand)] + hands
+
+    return deal(cards, 0)
+
+
+def test_card_runs_split_at_seen_cards():
+    pool_mask = cards_to_mask(POOL)
+    runs = card_runs(pool_mask)
+    assert sorted(card for run in runs for card in run) == [CARD_INDEX[card] for card in
+                                                            sorted(POOL, key=CARD_INDEX.get)]
+    # 2H and 5H are split by 3H and 4H, which are seen
+    assert [CARD_INDEX['2H']] in runs
+
+
+@pytest.mark.parametrize('hand_sizes, voids', [([1, 1], None), ([2, 2], None), ([2, 1], [(0,), ()]),
+                                               ([1, 1, 2], None), ([3, 2], [(), (1, 3)])])
+@pytest.mark.parametrize('trump', [0, 1, NO_SUIT])
+def test_class_weights_count_every_deal(hand_sizes, voids, trump):
+    pool_mask = cards_to_mask(POOL)
+    classes = list(deal_classes(pool_mask, hand_sizes, voids, trump))
+    deals = list(every_deal(pool_mask, hand_sizes, voids))
+    total = sum(turn_up_weight(pool_mask, sum(hands), trump) for hands in deals)
+    assert sum(weight for _, weight in classes) == total
+    # every class is a different deal satisfying the constraints
+    assert len({tuple(hands) for hands, _ in classes}) == len(classes)
+    assert all(hands in deals for hands, _ in classes)
+
+
+def test_exact_bid_averages_every_deal():
+    hand = ['QH']
+    hand_mask = cards_to_mask(hand)
+    pool_mask = FULL_DECK_MASK & ~hand_mask
+    expected = {}
+    for hands in every_deal(pool_mask, [1, 1]):
+        hand_masks = [hand_mask] + hands
+        outcome, _ = solve(3, 3, hand_masks, 1, root(3), perspective=0)
+        weight = turn_up_weight(pool_mask, sum(hands), 1)
+        expected[outcome[0]] = expected.get(outcome[0], 0) + weight
+    total = sum(expected.values())
+    probabilities = exact_bid(hand, ['', '', ''], 'S', 0, root(3))
+    assert probabilities.keys() == expected.keys()
+    for bid, weight in expected.items():
+        assert probabilities[bid] == pytest.approx(weight / total)
+
+
+def bots(bids):
+    return [{'bot_unique_id': name, 'aim_hands_won': bid, 'start_pos': position}
+            for position, (name, bid) in enumerate(zip('abc', bids))]
+
+
+@pytest.mark.parametrize('visible, position, trump', [(['AH', '2C'], 0, 'H'), (['2S', '3C'], 0, 'H'),
+                                                      (['2S', '3C'], 2, 'D'), (['KD', '10D'], 1, 'D')])
+def test_hells_bridge_bid_counts_every_card(visible, position, trump):
+    players = bots(['', '', ''])
+    my_bot = players[position]
+    others = [bot for bot in players if bot is not my_bot]
+    owners = {bot['bot_unique_id']: CARD_INDEX[card] for bot, card in zip(others, visible)}
+    seen = cards_to_mask(visible)
+    win = total = 0
+    # every card the player may hold and every card that may have been turned up
+    for card, turned_up in itertools.permutations(range(52), 2):
+        if seen >> card & 1 or seen >> turned_up & 1 or turned_up // 13 != CARD_INDEX['2' + trump] // 13:
+            continue
+        owners[my_bot['bot_unique_id']] = card
+        trick = [owners[bot['bot_unique_id']] for bot in players]
+        total += 1
+        win += trick_winner(trick, CARD_INDEX['2' + trump] // 13) == position
+    p_win = win / total
+    expected = hells_bridge_bid(visible, players, my_bot, trump)
+    assert expected[0] == pytest.approx(10 * (1 - p_win) - 2 * p_win)
+    assert expected[1] == pytest.approx(12 * p_win - 2 * (1 - p_win))
+
+
+def test_last_hells_bridge_bidder_may_not_match_the_tricks():
+    players = bots([1, 0, ''])
+    assert list(hells_bridge_bid(['2S', '3C'], players, players[2], 'H')) == [1]
+    players = bots([0, 0, ''])
+    assert list(hells_bridge_bid(['2S', '3C'], players, players[2], 'H')) == [0]
+
+
+def test_ne_bot_only_works_exactly_when_asked():
+    players = bots(['', '', ''])
+    # Against the two highest trumps the player can't win, which only the worked out bid sees
+    arguments = {'current_round_size': 1, 'bots': players, 'trump': 'H', 'cards': ['AH', 'KH'],
+                 'hells_bridge': True, 'my_bot_details': players[0]}
+    assert NE_bot.Bot().exact_cards is None
+    assert NE_bot.Bot().get_bid(**arguments) == 1
+    assert NE_bot.Bot(exact_cards=4).get_bid(**arguments) == 0
@@ -0,0 +1,98 @@
+import random
+import types
+
+import pytest
+
+from bots import basic_bot, basic_bot_v2
+import game_log
+from rikiki import Rikiki
+
+
+def recording_module(module, calls):
+    # A bot of module that records the arguments of every decision
+    class Bot(module.Bot):
+        def get_bid(self, **info_for_bots):
+            calls.append(('get_bid', info_for_bots))
+            return super().get_bid(**info_for_bots)
+
+        def play_card(self, **info_for_bots):
+            calls.append(('play_card', info_for_bots))
+            return super().play_card(**info_for_bots)
+
+    return types.SimpleNamespace(Bot=Bot)
+
+
+def plain(value):
+    # Compare read-only views and tuples like the dicts and lists they hold
+    if isinstance(value, (tuple, list)):
+        return [plain(item) for item in value]
+    if hasattr(value, 'items'):
+        return [(key, plain(item)) for key, item in value.items()]
+    return value
+
+
+def play_logged_games(path, modules, hell_bridge, calls):
+    with game_log.GameLogWriter(str(path), buffer_size=64) as log:
+        game = Rikiki(room=[recording_module(module, calls) for module in modules],
+                      round_movement='both', minmax_size=[1, 4], hell_bridge=hell_bridge,
+                      event_log=log)
+        random.seed(len(modules))
+        game.run_game()
+        game.reset()
+        game.run_game()
+    return game
+
+
+@pytest.mark.parametrize('modules', [[basic_bot, basic_bot_v2, basic_bot_v2],
+                                     [basic_bot_v2] * 4, [basic_bot, basic_bot_v2]])
+@pytest.mark.parametrize('hell_bridge', [True, False])
+def test_replay_rebuilds_every_decision(tmp_path, modules, hell_bridge):
+    calls = []
+    game = play_logged_games(tmp_path / 'games.rkl', modules, hell_bridge, calls)
+    replay = game_log.GameReplay(str(tmp_path / 'games.rkl'))
+    assert len(replay.games()) == 2
+    assert replay.hell_bridge == hell_bridge
+
+    decisions = []
+    for index, event in enumerate(replay.events):
+        if event[0] in (game_log.BID, game_log.CARD):
+            try:
+                decisions.append(replay.decision_at(index))
+            except ValueError:
+                # the only card of a hells bridge round is played for the bot
+                assert hell_bridge and event[0] == game_log.CARD
+    assert len(decisions) == len(calls)
+    for (method, arguments), (called, info_for_bots) in zip(decisions, calls):
+        assert method == called
+        assert plain(arguments) == plain(info_for_bots)
+
+    final = replay.state_at(len(replay.events))
+    assert final.finished
+    scores = {bot['bot_unique_id']: bot['score'] for bot in game.bots}
+    assert final.scores == [scores[unique_id] for unique_id in replay.bot_unique_ids]
+
+
+def test_read_log_round_trips_events(tmp_path):
+    path = str(tmp_path / 'events.rkl')
+    events = [(game_log.GAME_START, 0, game_log.NO_SEAT, 0), (game_log.ROUND_START, 0, game_log.NO_SEAT, 2),
+              (game_log.TRUMP, 0, game_log.NO_SEAT, -1), (game_log.DEAL, 0, 1, 51),
+              (game_log.BID, 0, 0, 2), (game_log.SCORE, 0, 1, -300)]
+    with game_log.GameLogWriter(path, buffer_size=8) as log:
+        log.start_game(['a-1', 'b-2'], False)
+        for event in events[1:]:
+            log.event(*event)
+    assert game_log.read_log(path) == (['a-1', 'b-2'], False, events)
+
+
+def test_every_game_needs_the_same_bots(tmp_path):
+    with game_log.GameLogWriter(str(tmp_path / 'games.rkl')) as log:
+        log.start_game(['a-1', 'b-2'], True)
+        with pytest.raises(ValueError):
+            log.start_game(['b-1', 'a-2'], True)
+
+
+def test_other_files_are_rejected(tmp_path):
+    path = tmp_path / 'other.rkl'
+    path.write_bytes(b'not a log at all')
+    with pytest.raises(ValueError):
+        game_log.read_log(str(path))
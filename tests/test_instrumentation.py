@@ -0,0 +1,77 @@
+import json
+import random
+import tracemalloc
+import types
+
+from bots import basic_bot_v2
+from instrumentation import JsonLinesSink, MemorySink
+from rikiki import Rikiki
+
+
+class CountingBot(basic_bot_v2.Bot):
+    # A basic_bot_v2 that reports counters for its decisions like NE_bot
+    def get_bid(self, **info_for_bots):
+        self.last_stats = {"samples": 3}
+        return super().get_bid(**info_for_bots)
+
+    def play_card(self, **info_for_bots):
+        self.last_stats = {"samples": 1, "margin": 0.5}
+        return super().play_card(**info_for_bots)
+
+
+class BrokenBot(basic_bot_v2.Bot):
+    def play_card(self, **info_for_bots):
+        raise RuntimeError("broken")
+
+
+def play_game(room, sink):
+    game = Rikiki(room=[types.SimpleNamespace(Bot=bot) for bot in room], minmax_size=[1, 3],
+                  instrumentation=sink)
+    random.seed(0)
+    game.run_game()
+    return game
+
+
+def test_every_decision_is_recorded():
+    sink = MemorySink()
+    play_game([CountingBot, basic_bot_v2.Bot, BrokenBot], sink)
+    # three bids a round, and a card for every card in the hands but the hells bridge round's
+    assert len(sink.records) == 3 * 3 + 3 * (2 + 3)
+    assert all(record["seconds"] >= 0 and record["snapshot_seconds"] >= 0 for record in sink.records)
+    assert all("peak_bytes" not in record for record in sink.records)
+
+    counted = [record for record in sink.records if record["bot"] == "basic_bot_v2-1"]
+    assert [record["samples"] for record in counted if record["event"] == "bid"] == [3] * 3
+    assert all(record["margin"] == 0.5 for record in counted if record["event"] == "card")
+    broken = [record for record in sink.records if record["bot"] == "basic_bot_v2-3"]
+    assert [record.get("fallback") for record in broken if record["event"] == "card"] == ["error"] * 5
+    assert all("fallback" not in record for record in broken if record["event"] == "bid")
+
+    totals = sink.summary()
+    assert totals["basic_bot_v2-1", "bid"] == {
+        "decisions": 3, "samples": 9, "seconds": totals["basic_bot_v2-1", "bid"]["seconds"],
+        "snapshot_seconds": totals["basic_bot_v2-1", "bid"]["snapshot_seconds"]}
+    assert totals["basic_bot_v2-1", "card"]["margin"] == 2.5
+
+
+def test_peak_memory_is_recorded_when_tracing():
+    sink = MemorySink()
+    tracemalloc.start()
+    try:
+        play_game([basic_bot_v2.Bot, basic_bot_v2.Bot], sink)
+    finally:
+        tracemalloc.stop()
+    assert all(record["peak_bytes"] > 0 for record in sink.records)
+
+
+def test_json_lines_sink_writes_a_record_per_line(tmp_path):
+    path = str(tmp_path / "metrics.jsonl")
+    memory = MemorySink()
+    with JsonLinesSink(path) as sink:
+        play_game([CountingBot, basic_bot_v2.Bot], sink)
+    play_game([CountingBot, basic_bot_v2.Bot], memory)
+    with open(path) as metrics:
+        records = [json.loads(line) for line in metrics]
+    assert len(records) == len(memory.records)
+    assert [(record["event"], record["bot"]) for record in records] == \
+        [(record["event"], record["bot"]) for record in memory.records]
@@ -0,0 +1,53 @@
+import random
+import time
+
+import particle_belief
+from card_core import mask_to_cards
+from NE_card_bot import deal_setup, solve_deal
+from particle_belief import ParticleBelief
+from test_NE_solver import BOTS, HISTORY, ROOT
+
+
+def test_update_keeps_to_the_deadline(monkeypatch):
+    def solve_deal(*args, **kwargs):
+        time.sleep(0.02)
+        return [1, 1, 0], {'KS': [1, 0, 0], '2D': [0, 1, 0]}
+
+    monkeypatch.setattr(particle_belief, 'solve_deal', solve_deal)
+    belief = ParticleBelief('C', ROOT, n_particles=100)
+    start = time.monotonic()
+    stats = {}
+    scores = belief.action_scores(['KS', '2D'], HISTORY, BOTS[0], BOTS, stats=stats,
+                                  deadline_s=0.2)
+    # Drawing the 100 deals alone takes 2 seconds
+    assert time.monotonic() - start < 0.4
+    assert 0 < stats['samples'] < 100
+    assert scores['KS'] > scores['2D']
+
+
+def test_surviving_particles_reuse_their_search():
+    hand = ['AH', 'KS', '2D', '5C']
+    random.seed(2)
+    belief = ParticleBelief('C', ROOT, n_particles=20, min_ess=0)
+    first = {}
+    belief.action_scores(hand, [{}], BOTS[0], BOTS, stats=first)
+
+    # Follow the first trick of a particle in which the ace of hearts wins it
+    for deal, _ in belief.particles:
+        follow = [next((card for card in mask_to_cards(deal[seat]) if card[-1] == 'H'), None)
+                  for seat in (1, 2)]
+        if None not in follow:
+            break
+    history = [{'NE_bot-1': 'AH', 'basic_bot_v2-2': follow[0], 'basic_bot-3': follow[1]}, {}]
+    survivors = {deal for deal, _ in belief.particles
+                 if belief.consistent(deal, deal_setup(hand[1:], history, BOTS[0], BOTS))}
+    later = {}
+    belief.action_scores(hand[1:], history, BOTS[0], BOTS, stats=later)
+    assert later['particles'] == len(survivors)
+
+    # The same deals solved afresh
+    setup = deal_setup(hand[1:], history, BOTS[0], BOTS)
+    afresh = {}
+    for deal in survivors:
+        solve_deal(list(deal), 'C', ROOT, setup, stats=afresh)
+    assert later['nodes'] * 5 < afresh['nodes']
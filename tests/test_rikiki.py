@@ -0,0 +1,148 @@
+import asyncio
+import random
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from async_rikiki import AsyncRikiki, SyncBotAdapter
+from bots import basic_bot_v2
+from card_core import FULL_DECK_MASK, mask_to_cards
+import rikiki
+from rikiki import Rikiki
+
+DECK = mask_to_cards(FULL_DECK_MASK)
+
+
+def bot_module(play_card):
+    # A basic_bot_v2 that plays the card play_card picks from its hand and valid cards
+    class Bot(basic_bot_v2.Bot):
+        def play_card(self, cards, valid_cards, **info_for_bots):
+            return play_card(cards, valid_cards)
+
+    return types.SimpleNamespace(Bot=Bot)
+
+
+def play_game(engine, room, **settings):
+    game = engine(room=room, minmax_size=[1, 4], **settings)
+    # The game reseeds the random stream when it is made
+    random.seed(0)
+    if engine is AsyncRikiki:
+        asyncio.run(game.run_game())
+    else:
+        game.run_game()
+    return game
+
+
+@pytest.mark.parametrize('engine', [Rikiki, AsyncRikiki])
+@pytest.mark.parametrize('play_card', [
+    lambda cards, valid: 'ZZ',
+    lambda cards, valid: next(card for card in DECK if card not in cards),
+    lambda cards, valid: next((card for card in cards if card not in valid), valid[0])])
+def test_illegal_cards_are_replaced(engine, play_card):
+    # No card, a card not in the hand and, when there is one, a card not following suit
+    game = play_game(engine, [bot_module(play_card), basic_bot_v2, basic_bot_v2])
+    assert game.finished
+    assert game.errors
+    assert all(name == 'basic_bot_v2-1' and stage == 'card' for name, stage, _ in game.errors)
+
+
+class BadBidBot(basic_bot_v2.Bot):
+    # A basic_bot_v2 that bids more tricks than there are cards, or fewer than none
+    def get_bid(self, current_round_size, **info_for_bots):
+        return random.choice([-1, current_round_size + 1])
+
+
+@pytest.mark.parametrize('engine', [Rikiki, AsyncRikiki])
+def test_bids_out_of_range_are_replaced(engine):
+    game = play_game(engine, [types.SimpleNamespace(Bot=BadBidBot), basic_bot_v2, basic_bot_v2])
+    assert game.finished
+    assert [(name, stage) for name, stage, _ in game.errors] == [('basic_bot_v2-1', 'bid')] * 4
+
+
+class SlowBot(basic_bot_v2.Bot):
+    # A basic_bot_v2 that takes longer than the time limit and counts the calls running at once
+    running = 0
+    most_running = 0
+    lock = threading.Lock()
+
+    def slowly(self, method, **info_for_bots):
+        with SlowBot.lock:
+            SlowBot.running += 1
+            SlowBot.most_running = max(SlowBot.most_running, SlowBot.running)
+        time.sleep(0.1)
+        with SlowBot.lock:
+            SlowBot.running -= 1
+        return method(self, **info_for_bots)
+
+    def get_bid(self, **info_for_bots):
+        return self.slowly(basic_bot_v2.Bot.get_bid, **info_for_bots)
+
+    def play_card(self, **info_for_bots):
+        return self.slowly(basic_bot_v2.Bot.play_card, **info_for_bots)
+
+
+@pytest.mark.parametrize('engine', [Rikiki, AsyncRikiki])
+def test_late_bots_are_not_called_again_until_they_finish(engine):
+    SlowBot.most_running = 0
+    game = play_game(engine, [types.SimpleNamespace(Bot=SlowBot), basic_bot_v2, basic_bot_v2],
+                     decision_timeout=0.02)
+    # Let the last late call end before the next test
+    time.sleep(0.2)
+    assert game.finished
+    assert game.timeouts
+    assert SlowBot.most_running == 1
+
+
+def test_bots_get_their_cards_in_the_order_dealt(monkeypatch):
+    hands = []
+    deal = rikiki.Cards.deal
+
+    def recording_deal(cards, n_players, size):
+        deal(cards, n_players, size)
+        hands.append(cards.hands)
+
+    class Bot(basic_bot_v2.Bot):
+        seen = []
+
+        def get_bid(self, cards, hells_bridge, **info_for_bots):
+            if not hells_bridge:
+                Bot.seen.append(cards)
+            return basic_bot_v2.Bot.get_bid(self, cards=cards, hells_bridge=hells_bridge,
+                                            **info_for_bots)
+
+    monkeypatch.setattr(rikiki.Cards, 'deal', recording_deal)
+    play_game(Rikiki, [types.SimpleNamespace(Bot=Bot), basic_bot_v2, basic_bot_v2],
+              hell_bridge=False)
+    assert len(Bot.seen) == len(hands)
+    for seen, dealt in zip(Bot.seen, hands):
+        assert seen in dealt
+
+
+def test_queued_calls_count_as_busy():
+    async def check():
+        executor = ThreadPoolExecutor(max_workers=1)
+        # Keep the only thread taken, so the bot's call waits in the queue
+        release = threading.Event()
+        executor.submit(release.wait)
+        adapter = SyncBotAdapter(basic_bot_v2.Bot(), executor)
+        try:
+            call = asyncio.ensure_future(adapter.play_card(cards=['2H'], valid_cards=['2H']))
+            await asyncio.sleep(0)
+            assert adapter.busy
+            # The game stops waiting, the call is still queued
+            call.cancel()
+            await asyncio.sleep(0.01)
+            assert adapter.busy
+        finally:
+            release.set()
+        for _ in range(100):
+            if not adapter.busy:
+                break
+            await asyncio.sleep(0.01)
+        assert not adapter.busy
+        executor.shutdown()
+
+    asyncio.run(check())
@@ -0,0 +1,72 @@
+import os
+import pickle
+from concurrent.futures import ProcessPoolExecutor
+
+from solve_cache import SolveCache, init_worker, process_cache
+
+
+def test_often_read_solve_survives_eviction(tmp_path):
+    path = str(tmp_path / 'solves.sqlite')
+    with SolveCache(path, max_entries=10, flush_every=1) as cache:
+        cache[('hot',)] = 'hot'
+        for index in range(50):
+            cache[('cold', index)] = index
+            # Read from the in-memory copy
+            assert cache[('hot',)] == 'hot'
+    with SolveCache(path) as cache:
+        assert cache.get(('hot',)) == 'hot'
+        assert cache.get(('cold', 0)) is None
+
+
+def test_checking_for_a_solve_is_not_a_use(tmp_path):
+    path = str(tmp_path / 'solves.sqlite')
+    with SolveCache(path, flush_every=1000) as cache:
+        cache[('solve', 1)] = ((1, 0), {3: (1, 0)})
+        cache.flush()
+        assert ('solve', 1) in cache
+        assert ('solve', 2) not in cache
+        assert (cache.hits, cache.misses) == (0, 0)
+        assert not cache.read_keys
+        assert cache.get(('solve', 1)) == ((1, 0), {3: (1, 0)})
+        assert (cache.hits, cache.read_keys) == (1, {cache.encode_key(('solve', 1))})
+
+
+def test_solves_are_stored_as_data(tmp_path):
+    path = str(tmp_path / 'solves.sqlite')
+    solve = ((2, 1.5, 0), {12: (1, 0.5, 0), 40: (2, 1, 0)})
+    with SolveCache(path) as cache:
+        cache[('solve',)] = solve
+    with SolveCache(path) as cache:
+        assert cache.get(('solve',)) == solve
+        # A pickle is never loaded, the solve is looked for again
+        cache.connection.execute("UPDATE solves SET value = ?", (pickle.dumps(solve),))
+        cache.memory.clear()
+        assert cache.get(('solve',)) is None
+        assert ('solve',) not in cache
+
+
+def worker_cache(cache):
+    cache[('worker', os.getpid())] = 1
+    return os.getpid(), id(cache), cache is process_cache(cache.path)
+
+
+def test_workers_keep_one_cache(tmp_path):
+    path = str(tmp_path / 'solves.sqlite')
+    with SolveCache(path) as cache, ProcessPoolExecutor(max_workers=1, initializer=init_worker,
+                                                        initargs=(path,)) as executor:
+        results = list(executor.map(worker_cache, [cache] * 4))
+    # the cache sent with every task is the one the worker opened
+    assert len(set(results)) == 1
+    assert results[0][2]
+    # and the worker wrote its solves when it ended
+    with SolveCache(path) as cache:
+        assert cache.get(('worker', results[0][0])) == 1
+
+
+def test_pickled_cache_is_the_process_cache(tmp_path):
+    path = str(tmp_path / 'solves.sqlite')
+    with SolveCache(path, flush_every=7) as cache:
+        copy = pickle.loads(pickle.dumps(cache))
+        assert copy is process_cache(path)
+        assert copy.flush_every == 7
+        assert pickle.loads(pickle.dumps(cache)) is copy
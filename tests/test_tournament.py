@@ -0,0 +1,72 @@
+import csv
+import random
+import sys
+
+import pytest
+
+from bots import basic_bot_v2
+from rikiki import Rikiki
+import tournament
+
+ROOM = ['basic_bot', 'basic_bot_v2', 'basic_bot_v2']
+
+
+def test_results_do_not_depend_on_the_workers(tmp_path):
+    path = str(tmp_path / 'results.csv')
+    rows, summary = tournament.run_tournament(ROOM, 12, minmax_size=[1, 3], seed=5, workers=1,
+                                              chunk_size=5, output_csv=path)
+    parallel_rows, parallel_summary = tournament.run_tournament(ROOM, 12, minmax_size=[1, 3], seed=5,
+                                                                workers=2, chunk_size=3)
+    assert parallel_rows == rows
+    assert parallel_summary == summary
+    assert [row['game'] for row in rows] == [game for game in range(12) for _ in ROOM]
+    assert all(summary[bot]['games'] == 12 for bot in summary)
+
+    with open(path, newline='') as results:
+        written = list(csv.DictReader(results))
+    assert [{key: str(value) for key, value in row.items()} for row in rows] == written
+
+
+def test_games_replay_from_their_seed():
+    rows, _ = tournament.run_tournament(ROOM, 3, minmax_size=[1, 3], seed=2, workers=1)
+    game = Rikiki(room=tournament.load_room(ROOM), minmax_size=[1, 3])
+    random.seed(rows[-1]['seed'])
+    game.run_game()
+    scores = {bot['bot_unique_id']: bot['score'] for bot in game.bots}
+    assert [scores[row['bot']] for row in rows[-3:]] == [row['score'] for row in rows[-3:]]
+
+
+def test_wins_are_split_between_winners():
+    rows = [{'bot': 'a', 'score': 10, 'win': 0.5}, {'bot': 'b', 'score': 10, 'win': 0.5},
+            {'bot': 'a', 'score': 4, 'win': 0}, {'bot': 'b', 'score': 12, 'win': 1}]
+    summary = tournament.summarise(rows)
+    assert summary['a']['mean_score'] == 7
+    assert summary['b']['win_rate'] == 0.75
+    assert summary['a']['win_rate_ci'][0] == 0
+    assert summary['b']['win_rate_ci'][1] == 1
+    assert tournament.mean_interval([3]) == (3, 3, 3)
+    mean, low, high = tournament.mean_interval([1, 2, 3, 4])
+    assert mean == 2.5
+    assert low == pytest.approx(2.5 - 1.96 * (5 / 3 / 4) ** 0.5)
+    assert high - mean == pytest.approx(mean - low)
+
+
+def test_reset_starts_a_clean_game():
+    game = Rikiki(room=[basic_bot_v2, basic_bot_v2], minmax_size=[1, 2])
+    game.run_game()
+    game.timeouts.append((0, 'basic_bot_v2-1', 'bid'))
+    game.errors.append(('basic_bot_v2-1', 'card', 'error'))
+    game.reset()
+    assert not game.finished and not game.timeouts and not game.errors and not game.late_calls
+    assert all(bot['score'] == 0 for bot in game.bots)
+
+
+@pytest.mark.parametrize('flags, hell_bridge', [([], True), (['--hell-bridge'], True),
+                                                (['--no-hell-bridge'], False)])
+def test_hells_bridge_is_on_by_default(monkeypatch, flags, hell_bridge):
+    calls = []
+    monkeypatch.setattr(tournament, 'run_tournament',
+                        lambda *args, **settings: calls.append(settings) or ([], {}))
+    monkeypatch.setattr(sys, 'argv', ['tournament.py', 'basic_bot', 'basic_bot_v2'] + flags)
+    tournament.main()
+    assert calls[0]['hell_bridge'] is hell_bridge
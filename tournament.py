@@ -0,0 +1,232 @@
+"""
+Play many games of rikiki between bots, spread over a process pool, and
+summarise how every bot did.
+
+Example:
+    python tournament.py NE_bot basic_bot_v2 --games 200 --minmax-size 1 4 --seed 1
+
+Bots are given by the name of their module in the bots folder. Every game gets
+its own seed drawn from the tournament seed, so the results for a given seed do
+not depend on the number of workers. That does not hold with a solve cache: a
+cached solve skips the random tie-breaks of a fresh one, and what is cached
+depends on the games each worker played before and on earlier runs.
+"""
+import argparse
+import csv
+import importlib
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor
+
+from rikiki import Rikiki
+from solve_cache import process_cache
+
+# z value of a 95% confidence interval
+Z_95 = 1.96
+
+RESULT_FIELDS = ["game", "seed", "bot", "score", "win"]
+
+# Game of the current worker process, reused for every game it plays
+_game = None
+# Persistent solve cache of the current worker process, if any
+_solve_cache = None
+
+
+def load_room(room):
+    """
+    Args:
+    room (list): Names of bot modules, such as 'NE_bot' or 'bots.NE_bot'.
+
+    Returns:
+    list: The bot modules.
+    """
+    return [importlib.import_module(name if "." in name else "bots." + name) for name in room]
+
+
+def _start_worker(room, settings, solve_cache=None):
+    global _game, _solve_cache
+    _game = Rikiki(room=load_room(room), verbose=False, **settings)
+    if solve_cache is not None:
+        # Every bot that caches solves shares the worker's connection to the file
+        _solve_cache = process_cache(solve_cache)
+        for bot in _game.bots:
+            if hasattr(bot["bot_instance"], "solve_cache"):
+                bot["bot_instance"].solve_cache = _solve_cache
+
+
+def _play_games(games):
+    # Play (game number, seed) pairs with the worker's game and return one row per bot per game
+    rows = []
+    for game_number, seed in games:
+        random.seed(seed)
+        _game.reset()
+        _game.run_game()
+
+        scores = [bot["score"] for bot in _game.bots]
+        winners = scores.count(max(scores))
+        for bot in sorted(_game.bots, key=lambda bot: _game.seats[bot["bot_unique_id"]]):
+            rows.append({
+                "game": game_number,
+                "seed": seed,
+                "bot": bot["bot_unique_id"],
+                "score": bot["score"],
+                # A shared win is split between the winners
+                "win": 1 / winners if bot["score"] == max(scores) else 0,
+            })
+    if _solve_cache is not None:
+        _solve_cache.flush()
+    return rows
+
+
+def mean_interval(values):
+    """
+    Args:
+    values (list): Observations, at least one.
+
+    Returns:
+    tuple: The mean and the lower and upper ends of its 95% confidence
+    interval (normal approximation).
+    """
+    n = len(values)
+    mean = sum(values) / n
+    if n < 2:
+        return mean, mean, mean
+    variance = sum((value - mean) ** 2 for value in values) / (n - 1)
+    half_width = Z_95 * (variance / n) ** 0.5
+    return mean, mean - half_width, mean + half_width
+
+
+def summarise(rows):
+    """
+    Args:
+    rows (list): Result rows, see RESULT_FIELDS.
+
+    Returns:
+    dict: For every bot, the number of games, the mean score and win rate, and
+    their 95% confidence intervals.
+    """
+    scores = {}
+    wins = {}
+    for row in rows:
+        scores.setdefault(row["bot"], []).append(row["score"])
+        wins.setdefault(row["bot"], []).append(row["win"])
+
+    summary = {}
+    for bot in scores:
+        mean_score, score_low, score_high = mean_interval(scores[bot])
+        win_rate, win_low, win_high = mean_interval(wins[bot])
+        summary[bot] = {
+            "games": len(scores[bot]),
+            "mean_score": mean_score,
+            "score_ci": (score_low, score_high),
+            "win_rate": win_rate,
+            "win_rate_ci": (max(win_low, 0), min(win_high, 1)),
+        }
+    return summary
+
+
+def run_tournament(room, games, round_movement='up', minmax_size=[1, 10], hell_bridge=True,
+                   seed=None, workers=None, chunk_size=10, output_csv=None, solve_cache=None):
+    """
+    Play a number of games between the same bots.
+
+    Every worker builds the game once and resets it between games, so bot
+    instances are reused. Results are written to the csv file a chunk of games
+    at a time.
+
+    Args:
+    room (list): Names of bot modules, see load_room.
+    games (int): Number of games to play.
+    round_movement (str): up, down or both, see Rikiki.
+    minmax_size (list): Smallest and largest hand sizes.
+    hell_bridge (bool): Whether the round of one card is a hells bridge round.
+    seed (int): Seed of the tournament, or None to draw one.
+    workers (int): Number of worker processes, None for one per cpu, 1 to play
+        every game in this process.
+    chunk_size (int): Number of games sent to a worker at a time.
+    output_csv (str): File to write one row per bot per game to, or None.
+    solve_cache (str): File of a solve_cache.SolveCache shared by the bots of
+        every worker, or None. With a cache the results for a seed may change
+        with the number of workers and between runs.
+
+    Returns:
+    tuple: The result rows (see RESULT_FIELDS) and the summary, see summarise.
+    """
+    if seed is None:
+        seed = random.getrandbits(64)
+    seed_stream = random.Random(seed)
+    all_games = [(game_number, seed_stream.getrandbits(64)) for game_number in range(games)]
+    chunks = [all_games[start:start + chunk_size] for start in range(0, games, chunk_size)]
+
+    settings = {"round_movement": round_movement, "minmax_size": minmax_size,
+                "hell_bridge": hell_bridge}
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    output_file = open(output_csv, "w", newline="") if output_csv else None
+    try:
+        writer = None
+        if output_file is not None:
+            writer = csv.DictWriter(output_file, fieldnames=RESULT_FIELDS)
+            writer.writeheader()
+
+        rows = []
+        if workers == 1:
+            _start_worker(room, settings, solve_cache)
+            results = map(_play_games, chunks)
+            executor = None
+        else:
+            executor = ProcessPoolExecutor(max_workers=workers, initializer=_start_worker,
+                                           initargs=(room, settings, solve_cache))
+            results = executor.map(_play_games, chunks)
+        try:
+            for chunk_rows in results:
+                rows.extend(chunk_rows)
+                if writer is not None:
+                    writer.writerows(chunk_rows)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+    finally:
+        if output_file is not None:
+            output_file.close()
+
+    return rows, summarise(rows)
+
+
+def print_summary(summary):
+    print("{:<20} {:>6} {:>22} {:>22}".format("bot", "games", "mean score (95% CI)",
+                                             "win rate (95% CI)"))
+    for bot, result in summary.items():
+        print("{:<20} {:>6} {:>7.2f} ({:>6.2f}, {:>6.2f}) {:>7.3f} ({:>5.3f}, {:>5.3f})".format(
+            bot, result["games"], result["mean_score"], *result["score_ci"],
+            result["win_rate"], *result["win_rate_ci"]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play a rikiki tournament between bots.")
+    parser.add_argument("room", nargs="+", help="bot modules from the bots folder, e.g. NE_bot basic_bot_v2")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--round-movement", default="up", choices=["up", "down", "both"])
+    parser.add_argument("--minmax-size", type=int, nargs=2, default=[1, 10], metavar=("MIN", "MAX"))
+    parser.add_argument("--hell-bridge", action=argparse.BooleanOptionalAction, default=True,
+                        help="whether the round of one card is a hells bridge round")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=10)
+    parser.add_argument("--output", default=None, help="csv file for the result of every game")
+    parser.add_argument("--solve-cache", default=None,
+                        help="sqlite file of solves shared by the bots, kept between runs "
+                             "(results then depend on the number of workers)")
+    args = parser.parse_args()
+
+    _, summary = run_tournament(args.room, args.games, round_movement=args.round_movement,
+                                minmax_size=args.minmax_size, hell_bridge=args.hell_bridge,
+                                seed=args.seed, workers=args.workers,
+                                chunk_size=args.chunk_size, output_csv=args.output,
+                                solve_cache=args.solve_cache)
+    print_summary(summary)
+
+
+if __name__ == "__main__":
+    main()